@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Script to add the contact_advertiser association table and backfill it from
+the "Contact relationship established: First Last" activity notes that used
+to be the only record of a contact's non-primary advertisers.
+"""
+
+from app import create_app, db
+from app.models import Activity, Contact
+from sqlalchemy import text
+
+RELATIONSHIP_PREFIX = 'Contact relationship established: '
+
+def add_contact_advertiser_table():
+    app = create_app()
+    
+    with app.app_context():
+        print("Adding contact_advertiser table...")
+        
+        try:
+            db.session.execute(text("""
+                CREATE TABLE IF NOT EXISTS contact_advertiser (
+                    contact_id INTEGER NOT NULL,
+                    advertiser_id INTEGER NOT NULL,
+                    created_at DATETIME,
+                    PRIMARY KEY (contact_id, advertiser_id),
+                    FOREIGN KEY (contact_id) REFERENCES contact (id) ON DELETE CASCADE,
+                    FOREIGN KEY (advertiser_id) REFERENCES advertiser (id) ON DELETE CASCADE
+                )
+            """))
+            db.session.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_contact_advertiser_advertiser_id ON contact_advertiser (advertiser_id)"
+            ))
+            db.session.commit()
+            print("✓ Created contact_advertiser table")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error creating table: {e}")
+            return
+        
+        print("Backfilling links from relationship activities...")
+        
+        # "First Last" -> contacts with that name (names aren't unique)
+        contacts_by_name = {}
+        for id, first_name, last_name, advertiser_id in db.session.query(
+            Contact.id, Contact.first_name, Contact.last_name, Contact.advertiser_id
+        ):
+            contacts_by_name.setdefault(f"{first_name} {last_name}", []).append((id, advertiser_id))
+        
+        notes = db.session.query(Activity.advertiser_id, Activity.description, Activity.created_at).filter(
+            Activity.description.like(f"{RELATIONSHIP_PREFIX}%")
+        ).all()
+        
+        links = {}
+        unmatched = set()
+        for advertiser_id, description, created_at in notes:
+            name = description[len(RELATIONSHIP_PREFIX):].strip()
+            matches = contacts_by_name.get(name)
+            if not matches:
+                unmatched.add(name)
+                continue
+            for contact_id, primary_id in matches:
+                if advertiser_id != primary_id:
+                    links.setdefault((contact_id, advertiser_id), created_at)
+        
+        if links:
+            db.session.execute(text(
+                "INSERT OR IGNORE INTO contact_advertiser (contact_id, advertiser_id, created_at) "
+                "VALUES (:contact_id, :advertiser_id, :created_at)"
+            ), [
+                {'contact_id': contact_id, 'advertiser_id': advertiser_id, 'created_at': created_at}
+                for (contact_id, advertiser_id), created_at in links.items()
+            ])
+        db.session.commit()
+        
+        print(f"✓ Linked {len(links)} contact/advertiser pairs from {len(notes)} activities")
+        if unmatched:
+            print(f"⚠️ {len(unmatched)} names in activities match no contact:")
+            for name in sorted(unmatched):
+                print(f"   - {name}")
+
+if __name__ == '__main__':
+    add_contact_advertiser_table()
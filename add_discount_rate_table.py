@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Script to add the discount_rate table. Without rows the standard rates in
+app.models.DEFAULT_NET_RATES apply; rows override a media's rate from a
+spending year on (see the /api/discount-rates endpoint).
+"""
+
+from app import create_app, db
+from sqlalchemy import text
+
+def add_discount_rate_table():
+    app = create_app()
+    
+    with app.app_context():
+        print("Adding discount_rate table...")
+        
+        try:
+            db.session.execute(text("""
+                CREATE TABLE IF NOT EXISTS discount_rate (
+                    id INTEGER PRIMARY KEY,
+                    media VARCHAR(50) NOT NULL,
+                    valid_from_year INTEGER NOT NULL,
+                    rate FLOAT NOT NULL,
+                    updated_at DATETIME,
+                    CONSTRAINT uq_discount_rate UNIQUE (media, valid_from_year)
+                )
+            """))
+            db.session.commit()
+            print("✓ Created discount_rate table")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error creating table: {e}")
+
+if __name__ == '__main__':
+    add_discount_rate_table()
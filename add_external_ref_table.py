@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Script to add the external_ref table that links Agency CRM / TV Planner
+records to the local rows they were synced to. Existing contacts with an
+agency_crm_id are linked right away; other records get linked the next
+time a webhook or sync touches them.
+"""
+
+from app import create_app, db
+from sqlalchemy import text
+
+def add_external_ref_table():
+    app = create_app()
+    
+    with app.app_context():
+        print("Adding external_ref table...")
+        
+        try:
+            db.session.execute(text("""
+                CREATE TABLE IF NOT EXISTS external_ref (
+                    id INTEGER PRIMARY KEY,
+                    source VARCHAR(50) NOT NULL,
+                    entity_type VARCHAR(50) NOT NULL,
+                    external_id VARCHAR(100) NOT NULL,
+                    local_id INTEGER NOT NULL,
+                    created_at DATETIME,
+                    updated_at DATETIME,
+                    CONSTRAINT uq_external_ref UNIQUE (source, entity_type, external_id)
+                )
+            """))
+            db.session.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_external_ref_local ON external_ref (entity_type, local_id)"
+            ))
+            
+            # Contacts already carry their Agency CRM id
+            result = db.session.execute(text("""
+                INSERT OR IGNORE INTO external_ref (source, entity_type, external_id, local_id, created_at, updated_at)
+                SELECT 'agency-crm', 'contact', CAST(agency_crm_id AS TEXT), id, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
+                FROM contact
+                WHERE agency_crm_id IS NOT NULL
+                ORDER BY id
+            """))
+            db.session.commit()
+            print("✓ Created external_ref table")
+            print(f"✓ Linked {result.rowcount} contacts by Agency CRM id")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error creating table: {e}")
+
+if __name__ == '__main__':
+    add_external_ref_table()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Script to add the job table used for background CSV imports.
+"""
+
+from app import create_app, db
+from sqlalchemy import text
+
+def add_jobs_table():
+    app = create_app()
+    
+    with app.app_context():
+        print("Adding job table...")
+        
+        try:
+            db.session.execute(text("""
+                CREATE TABLE IF NOT EXISTS job (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job_type VARCHAR(50) NOT NULL,
+                    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+                    params JSON,
+                    progress JSON,
+                    message TEXT,
+                    created_by_id INTEGER,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    started_at DATETIME,
+                    finished_at DATETIME,
+                    FOREIGN KEY (created_by_id) REFERENCES user (id)
+                )
+            """))
+            db.session.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_job_status ON job (status)
+            """))
+            db.session.commit()
+            print("✓ Created job table")
+            
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error updating database: {e}")
+
+if __name__ == '__main__':
+    add_jobs_table()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Script to add the denormalized last_activity_at column to the advertiser
+table, the indexes behind the stale-leads panel, and backfill the column
+from the activity table.
+"""
+
+from app import create_app, db
+from app.activity_summary import refresh_last_activity
+from sqlalchemy import text
+
+def add_last_activity_column():
+    app = create_app()
+    
+    with app.app_context():
+        print("Adding last_activity_at column to advertiser table...")
+        
+        try:
+            db.session.execute(text("ALTER TABLE advertiser ADD COLUMN last_activity_at DATETIME"))
+            db.session.commit()
+            print("✓ Added last_activity_at column")
+        except Exception as e:
+            db.session.rollback()
+            if "duplicate column name" in str(e).lower():
+                print("Column last_activity_at already exists")
+            else:
+                print(f"Error adding column last_activity_at: {e}")
+                return
+        
+        db.session.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_activity_advertiser_created ON activity (advertiser_id, created_at)"
+        ))
+        db.session.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_advertiser_status_last_activity ON advertiser (lead_status, last_activity_at)"
+        ))
+        # Its leading column makes ix_activity_advertiser_created cover this one
+        db.session.execute(text("DROP INDEX IF EXISTS ix_activity_advertiser_id"))
+        print("✓ Created indexes")
+        
+        print("Backfilling last activity for all advertisers...")
+        refresh_last_activity()
+        db.session.commit()
+        print("✓ Backfill complete")
+
+if __name__ == '__main__':
+    add_last_activity_column()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Script to add denormalized latest-year spending columns to the advertiser table
+and backfill them from spending_data.
+"""
+
+from app import create_app, db
+from app.spending_summary import refresh_latest_spending
+from sqlalchemy import text
+
+def add_latest_spending_columns():
+    app = create_app()
+    
+    with app.app_context():
+        print("Adding latest spending columns to advertiser table...")
+        
+        columns = [
+            ('latest_spending_year', 'INTEGER'),
+            ('latest_gross_spending', 'REAL DEFAULT 0'),
+            ('latest_net_spending', 'REAL DEFAULT 0')
+        ]
+        
+        for name, definition in columns:
+            try:
+                db.session.execute(text(f"ALTER TABLE advertiser ADD COLUMN {name} {definition}"))
+                db.session.commit()
+                print(f"✓ Added {name} column")
+            except Exception as e:
+                db.session.rollback()
+                if "duplicate column name" in str(e).lower():
+                    print(f"Column {name} already exists")
+                else:
+                    print(f"Error adding column {name}: {e}")
+                    return
+        
+        db.session.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_advertiser_latest_gross_spending ON advertiser (latest_gross_spending)"
+        ))
+        db.session.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_advertiser_latest_net_spending ON advertiser (latest_net_spending)"
+        ))
+        print("✓ Created indexes")
+        
+        print("Backfilling latest spending for all advertisers...")
+        refresh_latest_spending()
+        db.session.commit()
+        print("✓ Backfill complete")
+
+if __name__ == '__main__':
+    add_latest_spending_columns()
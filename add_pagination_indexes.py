@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Script to add the indexes used by keyset pagination of the contact list and
+the activity feeds.
+"""
+
+from app import create_app, db
+from sqlalchemy import text
+
+def add_pagination_indexes():
+    app = create_app()
+
+    with app.app_context():
+        print("Adding pagination indexes...")
+
+        indexes = [
+            ('ix_activity_created_at', 'activity (created_at)'),
+            ('ix_contact_name', 'contact (last_name, first_name)')
+        ]
+
+        for name, definition in indexes:
+            try:
+                db.session.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}"))
+                db.session.commit()
+                print(f"✓ Created {name}")
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error creating index {name}: {e}")
+                return
+
+if __name__ == '__main__':
+    add_pagination_indexes()
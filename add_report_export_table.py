@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Script to add the report_export table: one row per background report export
+with its parameter hash (for deduplication), the written file and when its
+download link expires.
+"""
+
+from app import create_app, db
+from sqlalchemy import text
+
+def add_report_export_table():
+    app = create_app()
+    
+    with app.app_context():
+        print("Adding report_export table...")
+        
+        try:
+            db.session.execute(text("""
+                CREATE TABLE IF NOT EXISTS report_export (
+                    id INTEGER PRIMARY KEY,
+                    job_id INTEGER REFERENCES job (id),
+                    created_by_id INTEGER REFERENCES user (id),
+                    report_type VARCHAR(50) NOT NULL,
+                    format VARCHAR(10) NOT NULL,
+                    filters JSON,
+                    compressed BOOLEAN,
+                    params_hash VARCHAR(64) NOT NULL,
+                    filename VARCHAR(255),
+                    file_path VARCHAR(500),
+                    row_count INTEGER,
+                    size_bytes INTEGER,
+                    created_at DATETIME,
+                    expires_at DATETIME
+                )
+            """))
+            db.session.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_report_export_hash_created ON report_export (params_hash, created_at)"
+            ))
+            db.session.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_report_export_expires_at ON report_export (expires_at)"
+            ))
+            db.session.commit()
+            print("✓ Created report_export table")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error creating table: {e}")
+
+if __name__ == '__main__':
+    add_report_export_table()
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Script to create the SQLite FTS5 search index for advertisers, contacts and
+activities, and index the existing rows.
+"""
+
+from app import create_app, db
+from app.search import create_search_index
+from sqlalchemy import text
+
+def add_search_index():
+    app = create_app()
+    
+    with app.app_context():
+        if db.engine.dialect.name != 'sqlite':
+            print("Full-text search index needs SQLite; searches will keep using LIKE")
+            return
+        
+        print("Creating full-text search index...")
+        try:
+            create_search_index()
+            print("✓ Created advertiser_fts, contact_fts and activity_fts with sync triggers")
+            print("✓ Indexed existing rows")
+            
+            # Lets SQLite answer activity searches by advertiser/contact name from indexes
+            # (by advertiser through ix_activity_advertiser_created, see add_last_activity_column.py)
+            db.session.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_activity_contact_id ON activity (contact_id)"
+            ))
+            db.session.commit()
+            print("✓ Created activity indexes")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error creating search index: {e}")
+
+if __name__ == '__main__':
+    add_search_index()
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Script to add the sync_run table: one row per scheduled or queued integration
+sync with its duration, row counts and error. A 'running' row also keeps a
+second process from starting the same source.
+"""
+
+from app import create_app, db
+from sqlalchemy import text
+
+def add_sync_run_table():
+    app = create_app()
+    
+    with app.app_context():
+        print("Adding sync_run table...")
+        
+        try:
+            db.session.execute(text("""
+                CREATE TABLE IF NOT EXISTS sync_run (
+                    id INTEGER PRIMARY KEY,
+                    source VARCHAR(50) NOT NULL,
+                    "trigger" VARCHAR(20) NOT NULL,
+                    status VARCHAR(20) NOT NULL,
+                    started_at DATETIME NOT NULL,
+                    finished_at DATETIME,
+                    duration_ms INTEGER,
+                    counts JSON,
+                    error TEXT
+                )
+            """))
+            db.session.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_sync_run_source_started ON sync_run (source, started_at)"
+            ))
+            db.session.commit()
+            print("✓ Created sync_run table")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error creating table: {e}")
+
+if __name__ == '__main__':
+    add_sync_run_table()
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Script to add the sync_state table (high-water marks of incremental Agency
+CRM pulls) and the content_hash column of external_ref that lets a pull skip
+records that have not changed since they were last applied.
+"""
+
+from app import create_app, db
+from sqlalchemy import text
+
+def add_sync_state_table():
+    app = create_app()
+    
+    with app.app_context():
+        print("Adding sync_state table...")
+        
+        try:
+            db.session.execute(text("""
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    id INTEGER PRIMARY KEY,
+                    source VARCHAR(50) NOT NULL,
+                    resource VARCHAR(50) NOT NULL,
+                    updated_since VARCHAR(64),
+                    etag VARCHAR(200),
+                    last_synced_at DATETIME,
+                    CONSTRAINT uq_sync_state UNIQUE (source, resource)
+                )
+            """))
+            
+            columns = [row[1] for row in db.session.execute(text("PRAGMA table_info(external_ref)"))]
+            if 'content_hash' not in columns:
+                db.session.execute(text("ALTER TABLE external_ref ADD COLUMN content_hash VARCHAR(64)"))
+            db.session.commit()
+            print("✓ Created sync_state table")
+            print("✓ Added external_ref.content_hash column")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error creating table: {e}")
+
+if __name__ == '__main__':
+    add_sync_state_table()
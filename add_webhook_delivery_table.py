@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Script to add the webhook_delivery outbox table used for asynchronous,
+retried webhook delivery.
+"""
+
+from app import create_app, db
+from sqlalchemy import text
+
+def add_webhook_delivery_table():
+    app = create_app()
+    
+    with app.app_context():
+        print("Adding webhook_delivery table...")
+        
+        try:
+            db.session.execute(text("""
+                CREATE TABLE IF NOT EXISTS webhook_delivery (
+                    id INTEGER PRIMARY KEY,
+                    webhook_id INTEGER NOT NULL,
+                    event VARCHAR(100) NOT NULL,
+                    payload JSON,
+                    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at DATETIME,
+                    locked_at DATETIME,
+                    last_status INTEGER,
+                    last_error TEXT,
+                    created_at DATETIME,
+                    delivered_at DATETIME,
+                    FOREIGN KEY (webhook_id) REFERENCES webhook (id)
+                )
+            """))
+            db.session.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_webhook_delivery_due ON webhook_delivery (status, next_attempt_at)"
+            ))
+            db.session.commit()
+            print("✓ Created webhook_delivery table")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error creating table: {e}")
+
+if __name__ == '__main__':
+    add_webhook_delivery_table()
@@ -25,6 +25,30 @@ def create_app(config_class=Config):
     login_manager.login_view = 'auth.login'
     login_manager.login_message = 'Please log in to access this page.'
     
+    from app.jobs import job_queue
+    job_queue.init_app(app)
+    
+    from app.http_client import http_client
+    http_client.init_app(app)
+    
+    from app.webhook_delivery import webhook_dispatcher
+    webhook_dispatcher.init_app(app)
+    
+    from app.integrations.batcher import webhook_ingest_batcher
+    webhook_ingest_batcher.init_app(app)
+    
+    from app.sync_scheduler import sync_scheduler
+    sync_scheduler.init_app(app)
+    
+    from app.aggregate_cache import aggregate_cache
+    aggregate_cache.init_app(app)
+    
+    from app.spending_cube import spending_cube
+    spending_cube.init_app(app)
+    
+    # Keeps Advertiser.last_activity_at current on every flush
+    from app import activity_summary  # noqa: F401
+    
     @login_manager.user_loader
     def load_user(user_id):
         return User.query.get(int(user_id))
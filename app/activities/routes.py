@@ -1,4 +1,4 @@
-from flask import render_template, redirect, url_for, flash, request, current_app, send_file
+from flask import render_template, redirect, url_for, flash, request, current_app, send_file, jsonify
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 import os
@@ -6,7 +6,11 @@ from datetime import datetime
 from app import db
 from app.activities import bp
 from app.activities.forms import ActivityForm
-from app.models import Activity, Advertiser, Attachment, User, Contact
+from app.models import Activity, Advertiser, Attachment, User
+from app.pagination import keyset_paginate
+from app.search import activity_search_filter
+from app.queries import activity_list_query
+from app.utils import wants_json
 
 @bp.route('/add/<int:advertiser_id>', methods=['GET', 'POST'])
 @login_required
@@ -62,13 +66,12 @@ def add_activity(advertiser_id):
 @login_required
 def activity_feed():
     # Get query parameters
-    page = request.args.get('page', 1, type=int)
     search = request.args.get('search', '')
     user_filter = request.args.get('user', type=int)
     per_page = 50
     
     # Base query
-    query = Activity.query.join(Advertiser)
+    query = activity_list_query().join(Advertiser)
     
     # Filter by user if not team lead
     if not current_user.is_team_lead():
@@ -76,24 +79,23 @@ def activity_feed():
     
     # Apply search filter
     if search:
-        query = query.filter(
-            db.or_(
-                Activity.description.contains(search),
-                Activity.outcome.contains(search),
-                Advertiser.name.contains(search),
-                Contact.first_name.contains(search),
-                Contact.last_name.contains(search)
-            )
-        ).outerjoin(Contact, Activity.contact_id == Contact.id)
+        query = query.filter(activity_search_filter(search))
     
     # Apply user filter
     if user_filter:
         query = query.filter(Activity.user_id == user_filter)
     
-    # Paginate results
-    activities = query.order_by(
-        Activity.created_at.desc()
-    ).paginate(page=page, per_page=per_page, error_out=False)
+    # Paginate results (keyset on creation time, newest first)
+    activities = keyset_paginate(
+        query, [Activity.created_at, Activity.id],
+        after=request.args.get('after'),
+        before=request.args.get('before'),
+        per_page=per_page,
+        descending=True
+    )
+    
+    if wants_json():
+        return jsonify(activities.to_dict(Activity.to_dict))
     
     # Get all advertisers for the modal form
     if current_user.is_team_lead():
@@ -0,0 +1,105 @@
+"""
+Maintains the denormalized Advertiser.last_activity_at column.
+Every flush that adds, deletes or moves activities recomputes it for the
+advertisers involved, so the stale-leads panel reads it from the
+(lead_status, last_activity_at) index instead of aggregating every activity.
+Bulk insert()/delete() statements on Activity bypass the flush: call
+refresh_last_activity() for the affected advertisers afterwards.
+check_last_activity.py compares the column with the activity table.
+"""
+
+from sqlalchemy import event, func, inspect, select, update
+from sqlalchemy.orm import Session
+from app.models import db, Activity, Advertiser
+
+# Keep IN (...) lists well under SQLite's bound parameter limit
+REFRESH_BATCH_SIZE = 500
+
+def last_activity_expression():
+    """Correlated subquery for an advertiser's newest activity date."""
+    # Served by the (advertiser_id, created_at) index
+    return select(func.max(Activity.created_at)).where(
+        Activity.advertiser_id == Advertiser.id
+    ).scalar_subquery()
+
+def _refresh_statements(advertiser_ids):
+    stmt = update(Advertiser).values(
+        last_activity_at=last_activity_expression(),
+        updated_at=Advertiser.updated_at  # Not a user-visible change
+    ).execution_options(synchronize_session=False)
+
+    if advertiser_ids is None:
+        yield stmt
+        return
+    advertiser_ids = sorted(advertiser_ids)
+    for start in range(0, len(advertiser_ids), REFRESH_BATCH_SIZE):
+        yield stmt.where(Advertiser.id.in_(advertiser_ids[start:start + REFRESH_BATCH_SIZE]))
+
+def refresh_last_activity(advertiser_ids=None):
+    """Recompute last_activity_at for advertisers; all of them if ``advertiser_ids`` is None.
+
+    Flushes pending changes but does not commit.
+    """
+    db.session.flush()
+    for stmt in _refresh_statements(advertiser_ids):
+        db.session.execute(stmt)
+
+def find_last_activity_mismatches(limit=None):
+    """(advertiser id, stored last_activity_at, actual newest activity) where they differ."""
+    actual = last_activity_expression()
+    query = db.session.query(Advertiser.id, Advertiser.last_activity_at, actual).filter(
+        Advertiser.last_activity_at.is_distinct_from(actual)
+    ).order_by(Advertiser.id)
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
+
+@event.listens_for(Session, 'before_flush')
+def collect_previous_advertisers(session, flush_context, instances):
+    # An activity moved to another advertiser doesn't remember the old one unless
+    # it was loaded; read it before the flush overwrites it
+    moved = []
+    for obj in session.dirty:
+        if isinstance(obj, Activity):
+            state = inspect(obj)
+            history = state.attrs.advertiser_id.history
+            if history.added and not history.deleted and state.identity:
+                moved.append(state.identity[0])
+    if moved:
+        previous = session.connection().execute(
+            select(Activity.advertiser_id).where(Activity.id.in_(moved))
+        ).scalars()
+        session.info.setdefault('last_activity_advertisers', set()).update(previous)
+
+@event.listens_for(Session, 'after_flush')
+def collect_activity_advertisers(session, flush_context):
+    # Attribute history is still available here, and new activities have their advertiser_id
+    advertiser_ids = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Activity):
+            state = inspect(obj)
+            if obj in session.dirty and not (state.attrs.advertiser_id.history.has_changes() or
+                                             state.attrs.created_at.history.has_changes()):
+                continue
+            advertiser_ids.update(state.attrs.advertiser_id.history.sum())
+    advertiser_ids.discard(None)
+    if advertiser_ids:
+        session.info.setdefault('last_activity_advertisers', set()).update(advertiser_ids)
+
+@event.listens_for(Session, 'after_flush_postexec')
+def update_last_activity(session, flush_context):
+    advertiser_ids = session.info.pop('last_activity_advertisers', None)
+    if not advertiser_ids:
+        return
+    # On the flush's connection: no autoflush and no ORM execute events
+    connection = session.connection()
+    for stmt in _refresh_statements(advertiser_ids):
+        connection.execute(stmt)
+    for advertiser_id in advertiser_ids:
+        advertiser = session.identity_map.get(session.identity_key(Advertiser, advertiser_id))
+        if advertiser is not None:
+            session.expire(advertiser, ['last_activity_at'])
+
+@event.listens_for(Session, 'after_rollback')
+def forget_activity_advertisers(session):
+    session.info.pop('last_activity_advertisers', None)
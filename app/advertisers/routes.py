@@ -4,14 +4,16 @@ from app import db
 from app.advertisers import bp
 from app.advertisers.forms import AdvertiserForm, LeadStatusForm, BulkAssignForm, SpendingDataForm
 from app.models import Advertiser, SpendingData, Activity, LeadStatusHistory, User, Contact, Attachment
-from app.utils import get_lead_status_color
-from sqlalchemy import func, or_
+from app.utils import get_lead_status_color, wants_json
+from app.pagination import keyset_paginate
+from app.search import advertiser_search_filter
+from app.queries import activity_list_query, advertiser_list_query, contact_list_query, status_history_query
+from app.spending_summary import refresh_latest_spending
 
 @bp.route('/')
 @login_required
 def list_advertisers():
     # Get query parameters
-    page = request.args.get('page', 1, type=int)
     search = request.args.get('search', '')
     status_filter = request.args.get('status', '')
     agency_filter = request.args.get('agency', '')
@@ -19,52 +21,12 @@ def list_advertisers():
     sort = request.args.get('sort', 'net')  # Default to net spending
     order = request.args.get('order', 'desc')
     
-    # Base query with spending data aggregation
-    # Subquery to get latest year spending for each advertiser
-    latest_year_subq = db.session.query(
-        SpendingData.advertiser_id,
-        func.max(SpendingData.year).label('latest_year')
-    ).group_by(SpendingData.advertiser_id).subquery()
-    
-    # Subquery to get spending data for latest year
-    latest_spending_subq = db.session.query(
-        SpendingData.advertiser_id,
-        SpendingData.grand_total.label('gross_spending'),
-        func.coalesce(SpendingData.net_total, 
-            SpendingData.tv * 0.2 + 
-            SpendingData.cinema * 0.2 + 
-            SpendingData.radio * 0.3 + 
-            SpendingData.outdoor_static * 0.5 + 
-            SpendingData.billboard * 0.5 + 
-            SpendingData.internet * 0.5 + 
-            SpendingData.magazines * 0.5 + 
-            SpendingData.newspapers * 0.5 + 
-            SpendingData.indoor_tv * 0.5
-        ).label('net_spending')
-    ).join(
-        latest_year_subq,
-        (SpendingData.advertiser_id == latest_year_subq.c.advertiser_id) & 
-        (SpendingData.year == latest_year_subq.c.latest_year)
-    ).subquery()
-    
-    # Main query
-    query = db.session.query(
-        Advertiser,
-        func.coalesce(latest_spending_subq.c.gross_spending, 0).label('last_year_gross'),
-        func.coalesce(latest_spending_subq.c.net_spending, 0).label('last_year_net')
-    ).outerjoin(
-        latest_spending_subq,
-        Advertiser.id == latest_spending_subq.c.advertiser_id
-    )
+    # Latest year spending is kept on the advertiser row (see app.spending_summary)
+    query = advertiser_list_query()
     
     # Apply filters
     if search:
-        query = query.filter(
-            or_(
-                Advertiser.name.ilike(f'%{search}%'),
-                Advertiser.current_agency.ilike(f'%{search}%')
-            )
-        )
+        query = query.filter(advertiser_search_filter(search))
     
     if status_filter:
         query = query.filter(Advertiser.lead_status == status_filter)
@@ -82,31 +44,35 @@ def list_advertisers():
     if not current_user.is_team_lead():
         query = query.filter(Advertiser.assigned_user_id == current_user.id)
     
-    # Apply sorting
+    # Apply sorting (both spending columns are indexed); id breaks ties
     if sort == 'gross':
-        if order == 'asc':
-            query = query.order_by('last_year_gross')
-        else:
-            query = query.order_by(db.desc('last_year_gross'))
+        sort_column = Advertiser.latest_gross_spending
     elif sort == 'net':
-        if order == 'asc':
-            query = query.order_by('last_year_net')
-        else:
-            query = query.order_by(db.desc('last_year_net'))
+        sort_column = Advertiser.latest_net_spending
     else:
-        query = query.order_by(Advertiser.name)
+        sort_column = Advertiser.name
+    descending = sort in ('gross', 'net') and order != 'asc'
+    
+    # Keyset pagination: no OFFSET or COUNT(*), so deep pages stay cheap
+    pagination = keyset_paginate(
+        query, [sort_column, Advertiser.id],
+        after=request.args.get('after'),
+        before=request.args.get('before'),
+        per_page=100,
+        descending=descending
+    )
     
-    # Paginate results
-    pagination = query.paginate(page=page, per_page=100, error_out=False)
+    if wants_json():
+        return jsonify(pagination.to_dict(Advertiser.to_dict))
     
     # Process results to create advertiser data with spending
     advertisers = []
-    for advertiser, gross, net in pagination.items:
+    for advertiser in pagination.items:
         # Create a dictionary-like object to hold advertiser and spending data
         advertiser_data = {
             'advertiser': advertiser,
-            'last_year_gross_spending': gross,
-            'last_year_net_spending': net
+            'last_year_gross_spending': advertiser.latest_gross_spending or 0,
+            'last_year_net_spending': advertiser.latest_net_spending or 0
         }
         advertisers.append(advertiser_data)
     
@@ -154,17 +120,17 @@ def view_advertiser(id):
     ).order_by(SpendingData.year.desc()).all()
     
     # Get recent activities
-    activities = Activity.query.filter_by(
+    activities = activity_list_query().filter_by(
         advertiser_id=id
     ).order_by(Activity.created_at.desc()).limit(20).all()
     
     # Get status history
-    status_history = LeadStatusHistory.query.filter_by(
+    status_history = status_history_query().filter_by(
         advertiser_id=id
     ).order_by(LeadStatusHistory.changed_at.desc()).all()
     
     # Get contacts
-    contacts = advertiser.contacts.order_by('last_name', 'first_name').all()
+    contacts = contact_list_query(advertiser.contacts).order_by('last_name', 'first_name').all()
     
     # Get attachments
     attachments = advertiser.attachments.order_by(Attachment.uploaded_at.desc()).all()
@@ -319,6 +285,7 @@ def add_spending(id):
         )
         
         db.session.add(spending)
+        refresh_latest_spending([advertiser.id])
         db.session.commit()
         
         flash('Spending data added successfully!', 'success')
@@ -357,6 +324,7 @@ def edit_spending(id, year):
         spending.grand_total = form.grand_total.data or 0
         spending.net_total = form.net_total.data if form.net_total.data else None
         
+        refresh_latest_spending([advertiser.id])
         db.session.commit()
         
         flash('Spending data updated successfully!', 'success')
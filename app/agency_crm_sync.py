@@ -0,0 +1,94 @@
+"""
+Incremental pulls from Agency CRM.
+Each resource (/companies, /brands, /contacts) keeps a high-water mark in
+sync_state: the newest updated_at it has seen, sent back as ?updated_since=,
+and the ETag of the last response, sent as If-None-Match. Records the CRM
+returns anyway (it may ignore both) are compared with the content hash kept
+on their external_ref and skipped when unchanged, so a run with nothing new
+writes nothing. Records deleted in the CRM are not detected.
+"""
+
+from datetime import datetime
+from app.models import db, SyncState
+from app.http_client import http_client
+from app.external_refs import content_hash, is_unchanged, remember_content_hash
+
+SOURCE = 'agency-crm'
+
+# (resource path, external_ref entity_type), in dependency order: contacts need their brands
+AGENCY_CRM_RESOURCES = [
+    ('companies', 'company'),
+    ('brands', 'brand'),
+    ('contacts', 'contact')
+]
+
+def pull_resource(api_url, headers, resource, entity_type, apply_record, full=False):
+    """Fetch the changed records of one resource, apply them and commit.
+
+    ``apply_record(record)`` adds its changes to the session. The high-water
+    mark only moves once those changes are committed. With ``full=True`` the
+    mark and ETag are not sent, but unchanged records are still skipped.
+    Returns counts of fetched, changed and unchanged records.
+    """
+    state = SyncState.query.filter_by(source=SOURCE, resource=resource).first()
+    if state is None:
+        state = SyncState(source=SOURCE, resource=resource)
+        db.session.add(state)
+
+    params = {}
+    request_headers = dict(headers)
+    if not full:
+        if state.updated_since:
+            params['updated_since'] = state.updated_since
+        if state.etag:
+            request_headers['If-None-Match'] = state.etag
+
+    counts = {'fetched': 0, 'changed': 0, 'unchanged': 0}
+    response = http_client.get(f"{api_url}/{resource}", headers=request_headers, params=params)
+    if response.status_code == 304:
+        state.last_synced_at = datetime.utcnow()
+        db.session.commit()
+        counts['not_modified'] = True
+        return counts
+    response.raise_for_status()
+
+    newest = None if full else state.updated_since
+    for record in response.json():
+        counts['fetched'] += 1
+        updated_at = record.get('updated_at')
+        if updated_at and (newest is None or str(updated_at) > newest):
+            newest = str(updated_at)
+
+        digest = content_hash(record)
+        if is_unchanged(SOURCE, entity_type, record.get('id'), digest):
+            counts['unchanged'] += 1
+            continue
+        apply_record(record)
+        remember_content_hash(SOURCE, entity_type, record.get('id'), digest)
+        counts['changed'] += 1
+
+    state.updated_since = newest
+    state.etag = response.headers.get('ETag')
+    state.last_synced_at = datetime.utcnow()
+    db.session.commit()
+    return counts
+
+def sync_agency_crm(api_url, api_key, full=False, handlers=None):
+    """Incrementally pull companies, brands and contacts. Returns {resource: counts}.
+
+    ``handlers`` maps resource to the function applying one record; the
+    webhook sync functions are used by default.
+    """
+    if handlers is None:
+        from app.integrations.routes import sync_company_to_advertiser, sync_brand_to_advertiser, sync_contact
+        handlers = {
+            'companies': sync_company_to_advertiser,
+            'brands': sync_brand_to_advertiser,
+            'contacts': sync_contact
+        }
+
+    headers = {'X-API-Key': api_key}
+    return {
+        resource: pull_resource(api_url, headers, resource, entity_type, handlers[resource], full)
+        for resource, entity_type in AGENCY_CRM_RESOURCES
+    }
@@ -0,0 +1,236 @@
+"""
+Shared cache for dashboard aggregates (lead status counts, spending by year, ...).
+Entries live in a small SQLite file next to the main database, so every
+gunicorn worker reads what one of them computed. Each entry depends on tags
+('advertiser', 'activity', 'spending') and remembers the generation each
+tag had when it was computed; committing a change to one of those models
+bumps its generation, which makes every entry depending on it stale at once.
+AGGREGATE_CACHE_TTL bounds how stale an entry can get through writes that
+bypass the ORM (raw SQL, other tools). The same file keeps a short log of
+changed row ids (record_changes()), for in-process snapshots such as the
+spending cube to catch up with other workers incrementally.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.models import Activity, Advertiser, SpendingData
+
+# Models whose committed changes invalidate the entries tagged with their name
+MODEL_TAGS = {
+    Advertiser: 'advertiser',
+    Activity: 'activity',
+    SpendingData: 'spending'
+}
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS cache_generation (
+        tag TEXT PRIMARY KEY,
+        generation INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS cache_entry (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL,
+        generations TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS cache_change (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        tag TEXT NOT NULL,
+        entity_id INTEGER
+    );
+"""
+
+# Changes kept in cache_change; readers further behind start over
+CHANGE_LOG_SIZE = 100000
+
+def default_cache_path(app):
+    """``<database>-aggregates.db`` next to a SQLite database file, else None (no cache)."""
+    uri = app.config.get('SQLALCHEMY_DATABASE_URI', '')
+    if not uri.startswith('sqlite:///') or uri == 'sqlite:///:memory:':
+        return None
+    db_path = uri[len('sqlite:///'):].split('?')[0]
+    if not os.path.isabs(db_path):
+        db_path = os.path.join(app.instance_path, db_path)
+    return os.path.splitext(db_path)[0] + '-aggregates.db'
+
+class AggregateCache:
+    """Tag-invalidated, TTL-bounded cache of JSON-serializable query results."""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.path = None
+        self.local = threading.local()  # One sqlite3 connection per thread
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.path = app.config.get('AGGREGATE_CACHE_PATH') or default_cache_path(app)
+        app.extensions['aggregate_cache'] = self
+
+    @property
+    def enabled(self):
+        return self.path is not None and self.app.config.get('AGGREGATE_CACHE_ENABLED', True)
+
+    def _connect(self):
+        connections = self.local.__dict__.setdefault('connections', {})
+        conn = connections.get(self.path)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(SCHEMA)
+            connections[self.path] = conn
+        return conn
+
+    def _generations(self, conn, tags):
+        stored = dict(conn.execute(
+            f"SELECT tag, generation FROM cache_generation WHERE tag IN ({','.join('?' * len(tags))})",
+            list(tags)
+        ).fetchall()) if tags else {}
+        return {tag: stored.get(tag, 0) for tag in sorted(tags)}
+
+    def get_or_compute(self, key, tags, compute, ttl=None):
+        """The cached value of ``key``, or ``compute()`` stored for the next caller.
+
+        ``tags`` name the models the value is derived from. The value must be
+        JSON-serializable. Cache errors fall back to computing the value.
+        """
+        if not self.enabled:
+            return compute()
+
+        try:
+            conn = self._connect()
+            # Read before computing: a write committed meanwhile leaves the entry stale, not wrong
+            generations = self._generations(conn, tags)
+            row = conn.execute(
+                "SELECT value, generations, expires_at FROM cache_entry WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            current_app.logger.warning(f"Aggregate cache unavailable: {e}")
+            return compute()
+
+        if row and row[2] > time.time() and json.loads(row[1]) == generations:
+            self.hits += 1
+            return json.loads(row[0])
+
+        self.misses += 1
+        value = compute()
+        ttl = ttl if ttl is not None else self.app.config.get('AGGREGATE_CACHE_TTL', 300)
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entry (key, value, generations, expires_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), json.dumps(generations), time.time() + ttl)
+            )
+        except sqlite3.Error as e:
+            current_app.logger.warning(f"Could not store aggregate {key}: {e}")
+        return value
+
+    def invalidate(self, tags):
+        """Make every entry depending on any of ``tags`` stale."""
+        if not self.enabled or not tags:
+            return
+        try:
+            self._connect().executemany(
+                "INSERT INTO cache_generation (tag, generation) VALUES (?, 1) "
+                "ON CONFLICT (tag) DO UPDATE SET generation = generation + 1",
+                [(tag,) for tag in sorted(tags)]
+            )
+        except sqlite3.Error as e:
+            # Entries still expire after AGGREGATE_CACHE_TTL
+            self.app.logger.warning(f"Could not invalidate aggregates {sorted(tags)}: {e}")
+
+    def record_changes(self, tag, ids):
+        """Log that the rows ``ids`` of ``tag`` changed; ``ids=None`` means any row may have."""
+        if not self.enabled:
+            return
+        rows = [(tag, None)] if ids is None else [(tag, entity_id) for entity_id in sorted(ids)]
+        try:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany("INSERT INTO cache_change (tag, entity_id) VALUES (?, ?)", rows)
+                conn.execute("DELETE FROM cache_change WHERE seq <= (SELECT MAX(seq) FROM cache_change) - ?",
+                             (CHANGE_LOG_SIZE,))
+                conn.execute("COMMIT")
+            except sqlite3.Error:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            self.app.logger.warning(f"Could not record {tag} changes: {e}")
+
+    def changes_since(self, tag, seq):
+        """(latest seq, ids of ``tag`` changed after ``seq``); ids is None when unknown.
+
+        Pass the returned seq back next time. Raises sqlite3.Error if the log is unavailable.
+        """
+        conn = self._connect()
+        # Separate subqueries: SQLite only reads a bare MIN() or MAX() straight off the rowid
+        latest, oldest = conn.execute(
+            "SELECT (SELECT MAX(seq) FROM cache_change), (SELECT MIN(seq) FROM cache_change)"
+        ).fetchone()
+        if latest == seq or latest is None and seq == 0:
+            return seq, set()
+        if latest is None or latest < seq or oldest > seq + 1:
+            return latest or 0, None  # Pruned past seq, or a new cache file
+        ids = set()
+        for (entity_id,) in conn.execute(
+            "SELECT entity_id FROM cache_change WHERE seq > ? AND seq <= ? AND tag = ?", (seq, latest, tag)
+        ):
+            if entity_id is None:
+                return latest, None
+            ids.add(entity_id)
+        return latest, ids
+
+    def clear(self):
+        if self.enabled:
+            self._connect().execute("DELETE FROM cache_entry")
+
+    def stats(self):
+        entries = self._connect().execute("SELECT COUNT(*) FROM cache_entry").fetchone()[0] if self.enabled else 0
+        return {
+            'enabled': self.enabled,
+            'path': self.path,
+            'entries': entries,
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+aggregate_cache = AggregateCache()
+
+def _tag_changes(session, tags):
+    session.info.setdefault('aggregate_tags', set()).update(tags)
+
+@event.listens_for(Session, 'after_flush')
+def collect_aggregate_tags(session, flush_context):
+    tags = {MODEL_TAGS[type(obj)] for obj in (*session.new, *session.dirty, *session.deleted)
+            if type(obj) in MODEL_TAGS}
+    if tags:
+        _tag_changes(session, tags)
+
+@event.listens_for(Session, 'do_orm_execute')
+def collect_bulk_aggregate_tags(orm_execute_state):
+    # insert()/update()/delete() statements (spending imports) bypass the flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and mapper.class_ in MODEL_TAGS:
+            _tag_changes(orm_execute_state.session, {MODEL_TAGS[mapper.class_]})
+
+@event.listens_for(Session, 'after_commit')
+def invalidate_committed_aggregates(session):
+    # Only once the change is visible to other workers
+    tags = session.info.pop('aggregate_tags', None)
+    if tags and aggregate_cache.app is not None:
+        aggregate_cache.invalidate(tags)
+
+@event.listens_for(Session, 'after_rollback')
+def forget_aggregate_tags(session):
+    session.info.pop('aggregate_tags', None)
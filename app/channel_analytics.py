@@ -0,0 +1,80 @@
+"""
+Per-channel spending analytics for the spending analysis report.
+One statement sums every channel per advertiser in a single pass over
+spending_data, then reads each channel's total and its top spenders from
+that (materialized) per-advertiser result, instead of one scan of
+spending_data per channel and figure. Results go through the aggregate cache.
+"""
+
+from sqlalchemy import func, literal, null, select, union_all
+from app.aggregate_cache import aggregate_cache
+from app.models import db, Advertiser, SpendingData
+
+# SpendingData media columns, in report order
+CHANNELS = ['cinema', 'billboard', 'indoor_tv', 'internet', 'magazines',
+            'newspapers', 'outdoor_static', 'radio', 'tv']
+
+def channel_analytics_query(year=None, top_n=5):
+    """Rows of (channel, advertiser id, name, total): each channel's top ``top_n``
+    advertisers, plus one row per channel without an advertiser for its total."""
+    per_advertiser = select(
+        SpendingData.advertiser_id,
+        *[func.sum(getattr(SpendingData, channel)).label(channel) for channel in CHANNELS]
+    ).group_by(SpendingData.advertiser_id)
+    if year is not None:
+        per_advertiser = per_advertiser.where(SpendingData.year == year)
+    # Referenced by every branch below, so SQLite materializes it: spending_data is scanned once
+    per_advertiser = per_advertiser.cte('per_advertiser')
+
+    branches = []
+    for channel in CHANNELS:
+        total = per_advertiser.c[channel]
+        # ORDER BY ... LIMIT is a top-N sort over one row per advertiser
+        top = select(
+            literal(channel).label('channel'),
+            per_advertiser.c.advertiser_id,
+            total.label('total')
+        ).where(total > 0).order_by(total.desc(), per_advertiser.c.advertiser_id).limit(top_n).subquery()
+        branches.append(select(top))
+        branches.append(select(literal(channel), null(), func.sum(total)))
+    by_channel = union_all(*branches).subquery('by_channel')
+
+    return select(
+        by_channel.c.channel,
+        by_channel.c.advertiser_id,
+        Advertiser.name,
+        by_channel.c.total
+    ).outerjoin(Advertiser, Advertiser.id == by_channel.c.advertiser_id)
+
+def compute_channel_analytics(year=None, top_n=5):
+    """channel_analytics() without the cache."""
+    totals = {channel: 0 for channel in CHANNELS}
+    ranked = {channel: [] for channel in CHANNELS}
+    for channel, advertiser_id, name, total in db.session.execute(channel_analytics_query(year, top_n)):
+        if advertiser_id is None:
+            totals[channel] = total or 0
+        else:
+            ranked[channel].append((-total, advertiser_id, name))
+    # UNION ALL doesn't promise to keep each branch's order
+    top = {channel: [[name, -total] for total, _, name in sorted(rows)] for channel, rows in ranked.items()}
+    return {'totals': totals, 'top': top}
+
+def channel_analytics(year=None, top_n=5, cache=True):
+    """Total spending per channel and each channel's top ``top_n`` advertisers.
+
+    Returns {'totals': {channel: total}, 'top': {channel: [[name, total], ...]}},
+    for one spending year or all of them. Channels nobody spends on have a
+    total of 0 and no top list.
+    """
+    if not cache:
+        return compute_channel_analytics(year, top_n)
+    return aggregate_cache.get_or_compute(
+        f"reports:channels:{year or 'all'}:{top_n}", ['advertiser', 'spending'],
+        lambda: compute_channel_analytics(year, top_n)
+    )
+
+def spending_years():
+    """Years that have spending data, newest first."""
+    return aggregate_cache.get_or_compute('reports:spending_years', ['spending'], lambda: [
+        year for (year,) in db.session.query(SpendingData.year).distinct().order_by(SpendingData.year.desc())
+    ])
@@ -1,22 +1,24 @@
-from flask import render_template, redirect, url_for, flash, request
+from flask import render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required, current_user
 from app import db
 from app.contacts import bp
 from app.contacts.forms import ContactForm
 from app.models import Contact, Advertiser
+from app.pagination import keyset_paginate
+from app.search import contact_search_filter
+from app.queries import contact_list_query
+from app.utils import wants_json
 from sqlalchemy import or_
-from datetime import datetime
 
 @bp.route('/')
 @login_required
 def list_contacts():
     # Get query parameters
-    page = request.args.get('page', 1, type=int)
     search = request.args.get('search', '')
     advertiser_id = request.args.get('advertiser', type=int)
     
     # Base query - use LEFT JOIN to include contacts without advertisers
-    query = Contact.query.outerjoin(Advertiser)
+    query = contact_list_query().outerjoin(Advertiser)
     
     # Filter by user permissions
     if not current_user.is_team_lead():
@@ -29,19 +31,23 @@ def list_contacts():
     
     # Apply search filter
     if search:
-        query = query.filter(
-            or_(
-                Contact.first_name.contains(search),
-                Contact.last_name.contains(search),
-                Contact.email.contains(search),
-                Advertiser.name.contains(search)
-            )
-        )
+        query = query.filter(contact_search_filter(search))
     
     # Filter by advertiser
     if advertiser_id:
         query = query.filter(Contact.advertiser_id == advertiser_id)
     
+    # Paginate results (keyset on name, id breaks ties)
+    contacts = keyset_paginate(
+        query, [Contact.last_name, Contact.first_name, Contact.id],
+        after=request.args.get('after'),
+        before=request.args.get('before'),
+        per_page=100
+    )
+    
+    if wants_json():
+        return jsonify(contacts.to_dict(Contact.to_dict))
+    
     # Get advertisers for filter dropdown
     if current_user.is_team_lead():
         advertisers = Advertiser.query.order_by(Advertiser.name).all()
@@ -50,11 +56,6 @@ def list_contacts():
             assigned_user_id=current_user.id
         ).order_by(Advertiser.name).all()
     
-    # Paginate results
-    contacts = query.order_by(Contact.last_name, Contact.first_name).paginate(
-        page=page, per_page=100, error_out=False
-    )
-    
     return render_template('contacts/list.html',
                          contacts=contacts,
                          search=search,
@@ -64,8 +65,6 @@ def list_contacts():
 @bp.route('/add/<int:advertiser_id>', methods=['GET', 'POST'])
 @login_required
 def add_contact(advertiser_id):
-    from app.models import Activity
-    
     advertiser = Advertiser.query.get_or_404(advertiser_id)
     
     # Check permissions
@@ -97,20 +96,9 @@ def add_contact(advertiser_id):
             added_by_id=current_user.id
         )
         db.session.add(contact)
-        db.session.flush()  # Get contact ID
         
-        # Create relationship activities for other selected advertisers
-        for advertiser_id_sel in selected_advertiser_ids:
-            if advertiser_id_sel != contact.advertiser_id:
-                activity = Activity(
-                    advertiser_id=advertiser_id_sel,
-                    user_id=current_user.id,
-                    activity_type='note',
-                    description=f"Contact relationship established: {contact.first_name} {contact.last_name}",
-                    outcome=f"Contact: {contact.email} | Phone: {contact.phone or 'N/A'}",
-                    created_at=datetime.utcnow()
-                )
-                db.session.add(activity)
+        # Link the other selected advertisers
+        contact.set_related_advertisers(selected_advertiser_ids, current_user.id)
         
         db.session.commit()
         flash('Contact added successfully!', 'success')
@@ -124,8 +112,6 @@ def add_contact(advertiser_id):
 @bp.route('/<int:id>/edit', methods=['GET', 'POST'])
 @login_required
 def edit_contact(id):
-    from app.models import Activity
-    
     contact = Contact.query.get_or_404(id)
     primary_advertiser = contact.advertiser
     
@@ -160,41 +146,27 @@ def edit_contact(id):
         # Handle advertiser relationships
         selected_advertiser_ids = form.advertisers.data or []
         
-        # Always clear old relationship activities for this contact
-        old_activities = Activity.query.filter(
-            Activity.description.contains(f"Contact relationship established: {contact.first_name} {contact.last_name}")
-        ).all()
-        for activity in old_activities:
-            db.session.delete(activity)
-        
         if selected_advertiser_ids:
             # Set first selected advertiser as primary
             contact.advertiser_id = selected_advertiser_ids[0]
-            
-            # Create activities for all selected advertisers except the primary one
-            for advertiser_id in selected_advertiser_ids:
-                if advertiser_id != contact.advertiser_id:
-                    # Create relationship activity for non-primary advertisers
-                    activity = Activity(
-                        advertiser_id=advertiser_id,
-                        user_id=current_user.id,
-                        activity_type='note',
-                        description=f"Contact relationship established: {contact.first_name} {contact.last_name}",
-                        outcome=f"Contact: {contact.email} | Phone: {contact.phone or 'N/A'}",
-                        created_at=datetime.utcnow()
-                    )
-                    db.session.add(activity)
         else:
             # No advertisers selected - set primary advertiser to None
             contact.advertiser_id = None
         
-        db.session.commit()
+        # Link the other selected advertisers (logs a note for new links)
+        contact.set_related_advertisers(selected_advertiser_ids, current_user.id)
+        
+        # contact.advertiser was loaded above and still points to the old primary
+        db.session.flush()
+        db.session.expire(contact, ['advertiser'])
         
-        # Trigger webhook to notify Agency CRM of the update
+        # Queue a webhook to notify Agency CRM of the update, in the same transaction
         # We'll trigger for all contacts, but Agency CRM will need to handle the mapping
         from app.webhook_helper import notify_contact_updated
         notify_contact_updated(contact)
         
+        db.session.commit()
+        
         flash('Contact updated successfully!', 'success')
         return redirect(url_for('contacts.list_contacts'))
     
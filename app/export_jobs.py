@@ -0,0 +1,153 @@
+"""
+Report exports as background jobs, for results too big to stream from a request.
+request_export() queues a report_export job; the job writes the file (gzip
+optional) under UPLOAD_FOLDER/exports and fires an 'export.completed'
+webhook. Files are downloaded through signed links and deleted after
+EXPORT_TTL_HOURS. An identical request by the same user (same report, format
+and filters) within EXPORT_DEDUP_MINUTES gets their existing export instead
+of a new job, and each user may have EXPORT_MAX_CONCURRENT exports queued or
+running.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import secrets
+from datetime import datetime, timedelta
+from flask import current_app
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from app.models import db, Job, ReportExport
+from app.exports import EXPORT_FORMATS, export_filename, export_query, iter_csv, iter_export_rows, write_xlsx
+from app.jobs import job_queue
+
+SIGNING_SALT = 'report-export'
+
+def export_params_hash(report_type, format_type, filters, compressed):
+    """sha256 identifying the file an export request would produce."""
+    params = {'type': report_type, 'format': format_type, 'filters': filters, 'compressed': compressed}
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+def exports_folder():
+    folder = os.path.join(current_app.config['UPLOAD_FOLDER'], 'exports')
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+def _serializer():
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt=SIGNING_SALT)
+
+def download_token(export):
+    """Signed token naming ``export``, for download links."""
+    return _serializer().dumps(export.id)
+
+def download_path(export):
+    """Path of the signed download link of ``export``; works outside requests too (webhooks)."""
+    adapter = current_app.url_map.bind(current_app.config.get('SERVER_NAME') or 'localhost',
+                                       script_name=current_app.config.get('APPLICATION_ROOT', '/'))
+    return adapter.build('reports.download_export', {'token': download_token(export)})
+
+def export_from_token(token):
+    """The downloadable export a token names, or None if it is invalid, expired or not written."""
+    try:
+        export_id = _serializer().loads(token, max_age=current_app.config.get('EXPORT_TTL_HOURS', 24) * 3600)
+    except BadSignature:  # Includes SignatureExpired
+        return None
+    export = db.session.get(ReportExport, export_id)
+    if export is None or export.file_path is None or not os.path.exists(export.file_path):
+        return None
+    if export.expires_at is not None and export.expires_at <= datetime.utcnow():
+        return None
+    return export
+
+def purge_expired_exports():
+    """Delete the files and rows of expired exports. Does not commit; returns the number purged."""
+    expired = ReportExport.query.filter(ReportExport.expires_at <= datetime.utcnow()).all()
+    for export in expired:
+        if export.file_path and os.path.exists(export.file_path):
+            os.remove(export.file_path)
+        db.session.delete(export)
+    return len(expired)
+
+def request_export(report_type, format_type, filters, user_id, compress=False):
+    """Queue an export, or return a recent identical one of the user. Returns (export, created).
+
+    ``filters`` come from app.exports.export_filters(). XLSX files are zip
+    archives already, so ``compress`` only applies to CSV. Returns
+    (None, False) when the user already has EXPORT_MAX_CONCURRENT exports
+    queued or running. Raises ValueError for an unknown type or format.
+    """
+    if format_type not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {format_type}")
+    export_query(report_type, filters)  # Validates the type and filters
+    compress = bool(compress) and format_type == 'csv'
+    config = current_app.config
+
+    purge_expired_exports()
+    db.session.commit()
+
+    params_hash = export_params_hash(report_type, format_type, filters, compress)
+    recent = ReportExport.query.outerjoin(Job, ReportExport.job_id == Job.id).filter(
+        ReportExport.params_hash == params_hash,
+        ReportExport.created_by_id == user_id,  # Other users can't view it
+        ReportExport.created_at >= datetime.utcnow() - timedelta(minutes=config.get('EXPORT_DEDUP_MINUTES', 10)),
+        db.or_(Job.status.is_(None), Job.status != 'failed')
+    ).order_by(ReportExport.created_at.desc()).first()
+    if recent is not None:
+        return recent, False
+
+    running = ReportExport.query.join(Job, ReportExport.job_id == Job.id).filter(
+        ReportExport.created_by_id == user_id,
+        Job.status.in_(['queued', 'running'])
+    ).count()
+    if running >= config.get('EXPORT_MAX_CONCURRENT', 2):
+        return None, False
+
+    filename = export_filename(report_type, format_type) + ('.gz' if compress else '')
+    export = ReportExport(report_type=report_type, format=format_type, filters=filters,
+                          compressed=compress, params_hash=params_hash, filename=filename,
+                          created_by_id=user_id)
+    db.session.add(export)
+    db.session.flush()
+
+    # enqueue() commits the export together with its job
+    job = job_queue.enqueue('report_export', {'export_id': export.id}, user_id=user_id)
+    export.job_id = job.id
+    db.session.commit()
+    return export, True
+
+def write_export(export):
+    """Write the file of ``export`` and record its size. Does not commit.
+
+    The file is written under a temporary name and renamed when complete,
+    so a failed job never leaves a partial download behind.
+    """
+    stmt = export_query(export.report_type, export.filters or {})
+    path = os.path.join(exports_folder(), f"{export.id}_{secrets.token_hex(8)}_{export.filename}")
+    partial = path + '.part'
+    row_count = 0
+
+    def counted(rows):
+        nonlocal row_count
+        for row in rows:
+            row_count += 1
+            yield row
+
+    rows = counted(iter_export_rows(stmt))
+    try:
+        if export.format == 'csv':
+            with (gzip.open(partial, 'wb') if export.compressed else open(partial, 'wb')) as f:
+                for chunk in iter_csv(rows):
+                    f.write(chunk)
+        else:
+            with open(partial, 'wb') as f:
+                write_xlsx(rows, f)
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+
+    export.file_path = path
+    export.row_count = max(row_count - 1, 0)  # Without the header
+    export.size_bytes = os.path.getsize(path)
+    export.expires_at = datetime.utcnow() + timedelta(hours=current_app.config.get('EXPORT_TTL_HOURS', 24))
+    return export
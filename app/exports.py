@@ -0,0 +1,170 @@
+"""
+Streaming report exports (advertisers with spending, activities).
+Rows are read with a server-side cursor (yield_per) and written as they
+arrive: CSV as a generator of chunks for a streamed response, XLSX through
+a write-only openpyxl workbook, which spools rows to a temporary file
+instead of keeping cells in memory. Exports are uncapped; memory stays
+bounded by EXPORT_BATCH_SIZE rows whatever their size.
+"""
+
+import csv
+import io
+import tempfile
+from datetime import date, datetime, timedelta
+from openpyxl import Workbook
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from sqlalchemy import and_, func, select
+from app.models import db, Activity, Advertiser, SpendingData, User
+from app.search import activity_search_filter, advertiser_search_filter
+
+# Rows fetched from the cursor, and written to CSV, at a time
+EXPORT_BATCH_SIZE = 1000
+# Bytes per chunk when streaming a finished file
+CHUNK_SIZE = 64 * 1024
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+}
+
+# Query string filters each export accepts, and how their values are read
+EXPORT_FILTERS = {
+    'advertisers': {'search': str, 'status': str, 'agency': str, 'assigned': str, 'year': int},
+    'activities': {'search': str, 'user': int, 'advertiser': int, 'activity_type': str,
+                   'since': date.fromisoformat, 'until': date.fromisoformat}
+}
+
+def export_filters(report_type, args):
+    """The filters of ``report_type`` present in ``args`` (e.g. request.args), as JSON-friendly values.
+
+    Raises ValueError for an unknown report type or a malformed value.
+    """
+    if report_type not in EXPORT_FILTERS:
+        raise ValueError(f"Unknown export type: {report_type}")
+    filters = {}
+    for name, parse in EXPORT_FILTERS[report_type].items():
+        value = args.get(name)
+        if value in (None, ''):
+            continue
+        try:
+            parse(value)
+        except ValueError:
+            raise ValueError(f"Invalid {name}: {value}")
+        filters[name] = value
+    return filters
+
+def advertisers_export_query(filters):
+    """Advertisers with their agency, status, assignee and summed gross and net spending."""
+    spending_join = SpendingData.advertiser_id == Advertiser.id
+    if 'year' in filters:
+        spending_join = and_(spending_join, SpendingData.year == int(filters['year']))
+
+    stmt = select(
+        Advertiser.name,
+        Advertiser.current_agency,
+        Advertiser.lead_status,
+        User.username.label('assigned_to'),
+        func.sum(SpendingData.grand_total).label('total_spending'),
+        func.sum(SpendingData.calculated_net_total).label('total_net_spending')
+    ).outerjoin(User, Advertiser.assigned_user_id == User.id
+    ).outerjoin(SpendingData, spending_join
+    ).group_by(Advertiser.id).order_by(Advertiser.id)
+
+    if 'search' in filters:
+        stmt = stmt.where(advertiser_search_filter(filters['search']))
+    if 'status' in filters:
+        stmt = stmt.where(Advertiser.lead_status == filters['status'])
+    if 'agency' in filters:
+        stmt = stmt.where(Advertiser.current_agency == filters['agency'])
+    if filters.get('assigned') == 'unassigned':
+        stmt = stmt.where(Advertiser.assigned_user_id.is_(None))
+    elif 'assigned' in filters:
+        stmt = stmt.where(Advertiser.assigned_user_id == int(filters['assigned']))
+    return stmt
+
+def activities_export_query(filters):
+    """Activities, newest first, with the user and advertiser names."""
+    stmt = select(
+        Activity.created_at,
+        User.username,
+        Advertiser.name.label('advertiser'),
+        Activity.activity_type,
+        Activity.description,
+        Activity.outcome
+    ).join(User, Activity.user_id == User.id
+    ).join(Advertiser, Activity.advertiser_id == Advertiser.id
+    ).order_by(Activity.created_at.desc(), Activity.id.desc())
+
+    if 'search' in filters:
+        stmt = stmt.where(activity_search_filter(filters['search']))
+    if 'user' in filters:
+        stmt = stmt.where(Activity.user_id == int(filters['user']))
+    if 'advertiser' in filters:
+        stmt = stmt.where(Activity.advertiser_id == int(filters['advertiser']))
+    if 'activity_type' in filters:
+        stmt = stmt.where(Activity.activity_type == filters['activity_type'])
+    if 'since' in filters:
+        stmt = stmt.where(Activity.created_at >= date.fromisoformat(filters['since']))
+    if 'until' in filters:
+        # Inclusive: everything before the next day
+        stmt = stmt.where(Activity.created_at < date.fromisoformat(filters['until']) + timedelta(days=1))
+    return stmt
+
+EXPORT_QUERIES = {
+    'advertisers': advertisers_export_query,
+    'activities': activities_export_query
+}
+
+def export_query(report_type, filters):
+    """SELECT statement of ``report_type`` with ``filters`` (from export_filters()) applied."""
+    if report_type not in EXPORT_QUERIES:
+        raise ValueError(f"Unknown export type: {report_type}")
+    return EXPORT_QUERIES[report_type](filters)
+
+def export_filename(report_type, format_type):
+    return f'{report_type}_export_{datetime.now().strftime("%Y%m%d")}.{format_type}'
+
+def iter_export_rows(stmt):
+    """Header row, then the result rows of ``stmt``, fetched EXPORT_BATCH_SIZE at a time."""
+    result = db.session.execute(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    yield list(result.keys())
+    for partition in result.partitions():
+        yield from partition
+
+def iter_csv(rows):
+    """Encoded CSV chunks of ``rows`` (header first), one per EXPORT_BATCH_SIZE rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+def write_xlsx(rows, fileobj):
+    """Write ``rows`` (header first) as a single-sheet workbook to ``fileobj``."""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Export')
+    for row in rows:
+        # Control characters aren't allowed in XLSX cells
+        sheet.append([ILLEGAL_CHARACTERS_RE.sub('', value) if isinstance(value, str) else value
+                      for value in row])
+    workbook.save(fileobj)
+
+def iter_xlsx(rows):
+    """Chunks of an XLSX file of ``rows``, built in a temporary file first."""
+    with tempfile.TemporaryFile() as spool:
+        write_xlsx(rows, spool)
+        spool.seek(0)
+        while chunk := spool.read(CHUNK_SIZE):
+            yield chunk
+
+def iter_export(stmt, format_type):
+    """Chunks of the ``format_type`` ('csv' or 'xlsx') file of ``stmt``'s rows."""
+    if format_type not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {format_type}")
+    rows = iter_export_rows(stmt)
+    return iter_csv(rows) if format_type == 'csv' else iter_xlsx(rows)
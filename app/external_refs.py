@@ -0,0 +1,82 @@
+"""
+External-ID mapping for the integrations.
+Every record synced from Agency CRM or TV Planner is linked to the local row
+it produced through external_ref (source, entity_type, external_id), so a
+repeated webhook or sync finds and updates that row with one indexed lookup
+instead of matching by name or creating a duplicate.
+"""
+
+import hashlib
+import json
+from app.models import db, Activity, Advertiser, Contact, ExternalRef
+
+# entity_type -> model of the local row
+ENTITY_MODELS = {
+    'company': Advertiser,
+    'brand': Advertiser,
+    'contact': Contact,
+    'invoice': Activity,
+    'status_update': Activity,
+    'campaign': Activity,
+    'wave': Activity
+}
+
+def find_local(source, entity_type, external_id):
+    """The local row linked to an external record, or None (also if that row was deleted)."""
+    if external_id is None:
+        return None
+    model = ENTITY_MODELS[entity_type]
+    return model.query.join(ExternalRef, ExternalRef.local_id == model.id).filter(
+        ExternalRef.source == source,
+        ExternalRef.entity_type == entity_type,
+        ExternalRef.external_id == str(external_id)
+    ).first()
+
+def link_external(source, entity_type, external_id, local):
+    """Point an external record at the local row ``local`` (insert or update the mapping)."""
+    if external_id is None:
+        return
+    if local.id is None:
+        db.session.flush()
+
+    ref = ExternalRef.query.filter_by(
+        source=source,
+        entity_type=entity_type,
+        external_id=str(external_id)
+    ).first()
+    if ref is None:
+        db.session.add(ExternalRef(
+            source=source,
+            entity_type=entity_type,
+            external_id=str(external_id),
+            local_id=local.id
+        ))
+    elif ref.local_id != local.id:
+        # The previously linked row was deleted or merged
+        ref.local_id = local.id
+
+def content_hash(record):
+    """Stable digest of an external record's JSON."""
+    return hashlib.sha256(json.dumps(record, sort_keys=True, default=str).encode()).hexdigest()
+
+def is_unchanged(source, entity_type, external_id, digest):
+    """True if the record was applied before with this content and its local row still exists."""
+    if external_id is None:
+        return False
+    model = ENTITY_MODELS[entity_type]
+    stored = db.session.query(ExternalRef.content_hash).join(model, model.id == ExternalRef.local_id).filter(
+        ExternalRef.source == source,
+        ExternalRef.entity_type == entity_type,
+        ExternalRef.external_id == str(external_id)
+    ).scalar()
+    return stored == digest
+
+def remember_content_hash(source, entity_type, external_id, digest):
+    """Store the content hash on the record's mapping (if the handler linked it)."""
+    if external_id is None:
+        return
+    ExternalRef.query.filter_by(
+        source=source,
+        entity_type=entity_type,
+        external_id=str(external_id)
+    ).update({'content_hash': digest}, synchronize_session=False)
@@ -0,0 +1,132 @@
+"""
+Shared HTTP client for the integrations and webhook delivery.
+Keeps one requests.Session per host, each with its own keep-alive connection
+pool, so repeated calls (one per TV Planner campaign, one per webhook) reuse
+TCP connections instead of opening a new one each time. Records per-host
+latency histograms and connection reuse.
+"""
+
+import threading
+import time
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float('inf'))
+
+class HostMetrics:
+    """Request counters and latency histogram for one host."""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+
+    def record(self, seconds, error=False):
+        self.requests += 1
+        self.errors += int(error)
+        self.total_seconds += seconds
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+
+    def as_dict(self, connections):
+        reuse_ratio = 1 - connections / self.requests if self.requests else 0
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'connections_opened': connections,
+            'reuse_ratio': round(max(reuse_ratio, 0), 3),
+            'avg_latency_ms': round(self.total_seconds / self.requests * 1000, 1) if self.requests else 0,
+            'latency_histogram': {
+                ('+Inf' if bound == float('inf') else f'{bound:g}'): count
+                for bound, count in zip(LATENCY_BUCKETS, self.buckets)
+            }
+        }
+
+class HttpClient:
+    """Pooled HTTP client. Configure with init_app (HTTP_* settings)."""
+
+    def __init__(self, app=None):
+        self.pool_maxsize = 10
+        self.pool_block = False
+        self.timeout = (5, 30)
+        self.sessions = {}
+        self.metrics = {}
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.pool_maxsize = app.config.get('HTTP_POOL_MAXSIZE', 10)
+        self.pool_block = app.config.get('HTTP_POOL_BLOCK', False)
+        self.timeout = (app.config.get('HTTP_CONNECT_TIMEOUT', 5), app.config.get('HTTP_READ_TIMEOUT', 30))
+        app.extensions['http_client'] = self
+
+    def _host(self, url):
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def session_for(self, url):
+        """The keep-alive session for the host of ``url``."""
+        host = self._host(url)
+        with self.lock:
+            session = self.sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize,
+                                      pool_block=self.pool_block)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self.sessions[host] = session
+                self.metrics[host] = HostMetrics()
+        return session
+
+    def request(self, method, url, **kwargs):
+        """Send a request on the host's pooled session. Raises requests exceptions."""
+        session = self.session_for(url)
+        kwargs.setdefault('timeout', self.timeout)
+
+        start = time.perf_counter()
+        try:
+            response = session.request(method, url, **kwargs)
+        except requests.RequestException:
+            self._record(url, time.perf_counter() - start, error=True)
+            raise
+        self._record(url, time.perf_counter() - start, error=response.status_code >= 500)
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def _record(self, url, seconds, error):
+        with self.lock:
+            self.metrics[self._host(url)].record(seconds, error)
+
+    def _connections_opened(self, host):
+        # urllib3 counts the connections each pool has created
+        adapter = self.sessions[host].get_adapter(host + '/')
+        pools = adapter.poolmanager.pools
+        return sum(pools[key].num_connections for key in pools.keys())
+
+    def get_metrics(self):
+        """Per-host request counts, connection reuse ratio and latency histogram."""
+        with self.lock:
+            hosts = list(self.metrics.items())
+        return {host: metrics.as_dict(self._connections_opened(host)) for host, metrics in hosts}
+
+    def close(self):
+        """Close all pooled connections."""
+        with self.lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions.clear()
+            self.metrics.clear()
+
+http_client = HttpClient()
@@ -0,0 +1,114 @@
+"""
+Micro-batching for incoming single-event webhooks.
+Each webhook request queues its event and waits; a flusher thread applies
+whatever has queued up in one transaction once WEBHOOK_INGEST_BATCH_SIZE
+events are waiting or WEBHOOK_INGEST_MAX_WAIT_MS has passed since the first
+one. A burst of CRM changes then costs a few SQLite write transactions
+instead of one per event. Only concurrent requests can be coalesced, so it
+helps with a threaded server; set WEBHOOK_INGEST_BATCHING = False to apply
+each event inline. A request gives up after WEBHOOK_INGEST_TIMEOUT seconds.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+
+class WebhookIngestBatcher:
+    """Coalesce webhook events from concurrent requests into shared transactions."""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.queue = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['webhook_ingest_batcher'] = self
+
+    def start(self):
+        """Run the flusher loop on a daemon thread (once per process)."""
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.work, name='webhook-ingest', daemon=True)
+                self.thread.start()
+
+    def submit(self, source, event, data):
+        """Apply one event with the next batch and return its result dict.
+
+        Raises if the batch's transaction could not be committed, and
+        TimeoutError after WEBHOOK_INGEST_TIMEOUT seconds; the event is then
+        dropped unless its batch is already being applied.
+        """
+        from app.integrations.routes import apply_webhook_events
+
+        if not self.app.config.get('WEBHOOK_INGEST_BATCHING', True):
+            return apply_webhook_events([(source, event, data)])[0]
+
+        future = Future()
+        self.queue.put(((source, event, data), future))
+        self.start()
+        try:
+            return future.result(timeout=self.app.config.get('WEBHOOK_INGEST_TIMEOUT', 30))
+        except TimeoutError:
+            future.cancel()  # Only succeeds while the batch hasn't started
+            raise
+
+    def work(self):
+        """Flusher loop: collect a batch until it is full or the wait is over, then apply it."""
+        while True:
+            items = []
+            try:
+                self.collect(items)
+                self.flush(items)
+            except Exception as e:
+                # Fail the requests waiting on this batch, and keep the flusher running
+                self.app.logger.error(f"Webhook ingest batch failed: {e}")
+                for event, future in items:
+                    try:
+                        future.set_exception(e)
+                    except InvalidStateError:
+                        pass  # Already answered, or cancelled after a timeout
+
+    def collect(self, items):
+        """Add queued events to ``items`` until the batch is full or the wait is over."""
+        batch_size = self.app.config.get('WEBHOOK_INGEST_BATCH_SIZE', 100)
+        max_wait = self.app.config.get('WEBHOOK_INGEST_MAX_WAIT_MS', 20) / 1000
+
+        items.append(self.queue.get())
+        deadline = time.monotonic() + max_wait
+        while len(items) < batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                items.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+    def flush(self, items):
+        """Apply a batch in one transaction and hand each waiting request its result."""
+        from app.integrations.routes import apply_webhook_events
+        from app.models import db
+
+        # Drop the events whose requests timed out; the rest can no longer be cancelled
+        items[:] = [(event, future) for event, future in items if future.set_running_or_notify_cancel()]
+        if not items:
+            return
+
+        with self.app.app_context():
+            try:
+                results = apply_webhook_events([event for event, future in items])
+            except Exception as e:
+                db.session.rollback()
+                for event, future in items:
+                    future.set_exception(e)
+                return
+
+        for (event, future), result in zip(items, results):
+            future.set_result(result)
+
+webhook_ingest_batcher = WebhookIngestBatcher()
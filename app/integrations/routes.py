@@ -3,6 +3,11 @@ from flask_login import login_required
 from app.integrations import integrations_bp
 from functools import wraps
 from app.models import Advertiser, SpendingData, Contact, Activity, db
+from app.spending_summary import refresh_latest_spending
+from app.integrations.batcher import webhook_ingest_batcher
+from app.name_resolver import resolve_advertiser
+from app.external_refs import find_local, link_external
+from app.sync_scheduler import run_sync
 from datetime import datetime
 import hashlib
 import secrets
@@ -37,84 +42,132 @@ def verify_api_key():
     return True
 
 # Webhook receiver endpoints
-@integrations_bp.route('/webhook/agency-crm', methods=['POST'])
-def webhook_agency_crm():
-    """Receive webhooks from agency-crm"""
+def receive_webhook(source):
+    """Apply one webhook event; coalesced with concurrent ones by the ingest batcher."""
     
     # Verify signature if configured
     signature = request.headers.get('X-Webhook-Signature')
-    if 'agency-crm' in WEBHOOK_SECRETS and signature:
-        if not verify_webhook_signature(request.data.decode(), signature, WEBHOOK_SECRETS['agency-crm']):
+    if source in WEBHOOK_SECRETS and signature:
+        if not verify_webhook_signature(request.data.decode(), signature, WEBHOOK_SECRETS[source]):
             return jsonify({'error': 'Invalid signature'}), 401
     
     event = request.headers.get('X-Webhook-Event')
     data = request.json
     
     try:
-        if event == 'company.created' or event == 'company.updated':
-            # Sync company as advertiser
-            sync_company_to_advertiser(data)
-            
-        elif event == 'brand.created' or event == 'brand.updated':
-            # Sync brand as advertiser
-            sync_brand_to_advertiser(data)
-            
-        elif event == 'contact.created':
-            # Sync contact
-            sync_contact(data)
-            
-        elif event == 'contact.updated':
-            # Update existing contact
-            update_contact(data)
-            
-        elif event == 'invoice.created':
-            # Create activity for invoice
-            create_invoice_activity(data)
-            
-        elif event == 'status_update.created':
-            # Create activity for status update
-            create_status_update_activity(data)
-        
-        return jsonify({'status': 'received'}), 200
-        
+        result = webhook_ingest_batcher.submit(source, event, data)
+    except TimeoutError:
+        current_app.logger.error(f"Webhook processing timed out ({source} {event})")
+        return jsonify({'error': 'Timed out waiting for the webhook to be applied; retry later'}), 503
     except Exception as e:
         current_app.logger.error(f"Webhook processing error: {str(e)}")
         return jsonify({'error': str(e)}), 500
+    
+    if result['status'] == 'error':
+        return jsonify({'error': result['error']}), 500
+    return jsonify({'status': 'received'}), 200
+
+@integrations_bp.route('/webhook/agency-crm', methods=['POST'])
+def webhook_agency_crm():
+    """Receive webhooks from agency-crm"""
+    return receive_webhook('agency-crm')
 
 @integrations_bp.route('/webhook/tv-planner', methods=['POST'])
 def webhook_tv_planner():
     """Receive webhooks from tv-planner"""
+    return receive_webhook('tv-planner')
+
+@integrations_bp.route('/webhook/<any("agency-crm", "tv-planner"):source>/batch', methods=['POST'])
+def webhook_batch(source):
+    """Receive an array of webhook events and apply them in one transaction.
+    
+    Body: [{"event": "contact.updated", "data": {...}}, ...] (or {"events": [...]}),
+    signed as a whole. Returns one result per event, in order.
+    """
     
-    # Verify signature if configured
     signature = request.headers.get('X-Webhook-Signature')
-    if 'tv-planner' in WEBHOOK_SECRETS and signature:
-        if not verify_webhook_signature(request.data.decode(), signature, WEBHOOK_SECRETS['tv-planner']):
+    if source in WEBHOOK_SECRETS and signature:
+        if not verify_webhook_signature(request.data.decode(), signature, WEBHOOK_SECRETS[source]):
             return jsonify({'error': 'Invalid signature'}), 401
     
-    event = request.headers.get('X-Webhook-Event')
-    data = request.json
+    payload = request.get_json(silent=True)
+    events = payload.get('events') if isinstance(payload, dict) else payload
+    if not isinstance(events, list) or not all(isinstance(e, dict) for e in events):
+        return jsonify({'error': 'Expected a JSON array of {"event", "data"} objects'}), 400
+    
+    max_events = current_app.config.get('WEBHOOK_INGEST_MAX_BATCH', 1000)
+    if len(events) > max_events:
+        return jsonify({'error': f'At most {max_events} events per batch'}), 413
     
     try:
-        if event == 'campaign.created' or event == 'campaign.updated':
-            # Sync campaign spending data
-            sync_campaign_spending(data)
-            
-        elif event == 'wave.created' or event == 'wave.updated':
-            # Update spending data from wave
-            update_spending_from_wave(data)
-        
-        return jsonify({'status': 'received'}), 200
-        
+        results = apply_webhook_events([(source, e.get('event'), e.get('data')) for e in events])
     except Exception as e:
-        current_app.logger.error(f"Webhook processing error: {str(e)}")
+        db.session.rollback()
+        current_app.logger.error(f"Webhook batch processing error: {str(e)}")
         return jsonify({'error': str(e)}), 500
+    
+    return jsonify({
+        'status': 'processed',
+        'applied': sum(1 for r in results if r['status'] == 'applied'),
+        'failed': sum(1 for r in results if r['status'] == 'error'),
+        'results': results
+    }), 200
+
+def apply_webhook_events(events):
+    """Apply (source, event, data) webhook events in one transaction.
+    
+    Each event runs in a SAVEPOINT: one that raises is rolled back on its
+    own and reported, the others are kept. Returns one result dict per
+    event, in order.
+    """
+    
+    # pysqlite only opens its transaction at the first write, and a SAVEPOINT
+    # outside one is committed by its RELEASE; open the batch's transaction first
+    connection = db.session.connection()
+    if connection.dialect.name == 'sqlite' and not connection.connection.dbapi_connection.in_transaction:
+        connection.exec_driver_sql('BEGIN IMMEDIATE')
+    
+    results = []
+    for source, event, data in events:
+        handler = WEBHOOK_HANDLERS.get(source, {}).get(event)
+        if handler is None:
+            results.append({'event': event, 'status': 'ignored'})
+            continue
+        
+        savepoint = db.session.begin_nested()
+        try:
+            handler(data)
+            savepoint.commit()  # Flushes, so constraint errors surface on the event that caused them
+            results.append({'event': event, 'status': 'applied'})
+        except Exception as e:
+            savepoint.rollback()
+            current_app.logger.error(f"Webhook processing error ({source} {event}): {str(e)}")
+            results.append({'event': event, 'status': 'error', 'error': str(e)})
+    
+    db.session.commit()
+    return results
 
 # Data synchronization functions
+# These add their changes to the session; the caller commits. Synced records
+# are linked to their local rows by source id (see app.external_refs).
+def rename_advertiser(advertiser, name):
+    """Follow a rename in the source system unless another advertiser has the name"""
+    if name and advertiser.name != name and not Advertiser.query.filter_by(name=name).first():
+        advertiser.name = name
+
+def brand_advertiser(brand_id, brand_name):
+    """Advertiser of an Agency CRM brand: by synced brand id, else by name"""
+    return find_local('agency-crm', 'brand', brand_id) or resolve_advertiser(brand_name or '')
+
 def sync_company_to_advertiser(company_data):
     """Sync company from agency-crm to advertiser in newbusiness"""
     
-    # Check if advertiser exists by name
-    advertiser = Advertiser.query.filter_by(name=company_data['name']).first()
+    # Previously synced companies are found by id, others by (normalized) name
+    advertiser = find_local('agency-crm', 'company', company_data.get('id'))
+    if advertiser:
+        rename_advertiser(advertiser, company_data.get('name'))
+    else:
+        advertiser = resolve_advertiser(company_data['name'], partial=False)
     
     if not advertiser:
         advertiser = Advertiser(
@@ -123,9 +176,11 @@ def sync_company_to_advertiser(company_data):
             lead_status='ours'
         )
         db.session.add(advertiser)
+        db.session.flush()  # Get the advertiser ID
     else:
         # Update existing advertiser
         advertiser.lead_status = 'ours'
+    link_external('agency-crm', 'company', company_data.get('id'), advertiser)
     
     # Add activity
     activity = Activity(
@@ -136,7 +191,6 @@ def sync_company_to_advertiser(company_data):
         created_at=datetime.utcnow()
     )
     db.session.add(activity)
-    db.session.commit()
 
 def sync_brand_to_advertiser(brand_data):
     """Sync brand from agency-crm to advertiser in newbusiness"""
@@ -144,7 +198,11 @@ def sync_brand_to_advertiser(brand_data):
     # Use format: "Company - Brand" for the advertiser name
     advertiser_name = f"{brand_data.get('company_name', 'Unknown')} - {brand_data['name']}"
     
-    advertiser = Advertiser.query.filter_by(name=advertiser_name).first()
+    advertiser = find_local('agency-crm', 'brand', brand_data.get('id'))
+    if advertiser:
+        rename_advertiser(advertiser, advertiser_name)
+    else:
+        advertiser = resolve_advertiser(advertiser_name, partial=False)
     
     if not advertiser:
         advertiser = Advertiser(
@@ -153,6 +211,8 @@ def sync_brand_to_advertiser(brand_data):
             lead_status='ours'
         )
         db.session.add(advertiser)
+        db.session.flush()  # Get the advertiser ID
+    link_external('agency-crm', 'brand', brand_data.get('id'), advertiser)
     
     # Add activity
     activity = Activity(
@@ -163,7 +223,6 @@ def sync_brand_to_advertiser(brand_data):
         created_at=datetime.utcnow()
     )
     db.session.add(activity)
-    db.session.commit()
 
 def sync_contact(contact_data):
     """Sync contact from agency-crm - one contact with multiple advertiser relationships"""
@@ -177,7 +236,7 @@ def sync_contact(contact_data):
     # Safety check: ensure we're not creating a duplicate
     agency_crm_id = contact_data.get('id')
     if agency_crm_id:
-        existing_contact = Contact.query.filter_by(agency_crm_id=agency_crm_id).first()
+        existing_contact = find_local('agency-crm', 'contact', agency_crm_id)
         if existing_contact:
             print(f"⚠️ WARNING: Contact with Agency CRM ID {agency_crm_id} already exists!")
             print(f"🔄 Redirecting to update instead of create")
@@ -191,9 +250,7 @@ def sync_contact(contact_data):
     if brands:
         # Find primary advertiser (first brand)
         primary_brand = brands[0]
-        primary_advertiser = Advertiser.query.filter(
-            Advertiser.name.contains(primary_brand['name'])
-        ).first()
+        primary_advertiser = brand_advertiser(primary_brand.get('id'), primary_brand['name'])
         
         if not primary_advertiser:
             print(f"⚠️ Primary advertiser not found for brand: {primary_brand['name']}")
@@ -215,31 +272,20 @@ def sync_contact(contact_data):
     )
     db.session.add(contact)
     db.session.flush()  # Get the contact ID
+    link_external('agency-crm', 'contact', agency_crm_id, contact)
     
     primary_name = primary_advertiser.name if primary_advertiser else "None"
     print(f"✅ Created contact: {contact.first_name} {contact.last_name} (Primary: {primary_name})")
     
-    # Create activities for all advertisers to show the relationship
+    # Link all brand advertisers; the primary one gets a sync note instead
+    related_ids = []
     for brand in brands:
-        advertiser = Advertiser.query.filter(
-            Advertiser.name.contains(brand['name'])
-        ).first()
+        advertiser = brand_advertiser(brand.get('id'), brand['name'])
         
         if advertiser:
-            # If no primary advertiser, create activities for all found advertisers
-            # If there is a primary advertiser, create activities only for non-primary ones
             if not primary_advertiser or advertiser.id != primary_advertiser.id:
-                # Create relationship activity for other advertisers
-                activity = Activity(
-                    advertiser_id=advertiser.id,
-                    user_id=1,  # System user
-                    activity_type='note',
-                    description=f"Contact relationship established: {contact.first_name} {contact.last_name}",
-                    outcome=f"Contact: {contact.email} | Phone: {contact.phone or 'N/A'}",
-                    created_at=datetime.utcnow()
-                )
-                db.session.add(activity)
-                print(f"🔗 Created relationship activity for: {advertiser.name}")
+                related_ids.append(advertiser.id)
+                print(f"🔗 Linked advertiser: {advertiser.name}")
             
             # Create sync activity for primary advertiser
             else:
@@ -253,7 +299,7 @@ def sync_contact(contact_data):
                 )
                 db.session.add(activity)
     
-    db.session.commit()
+    contact.set_related_advertisers(related_ids, user_id=1)  # System user
 
 def update_contact(contact_data):
     """Update existing contact from agency-crm - maintaining single contact with multiple relationships"""
@@ -269,7 +315,7 @@ def update_contact(contact_data):
     
     # First try: Agency CRM ID match (most reliable)
     if agency_crm_id:
-        existing_contact = Contact.query.filter_by(agency_crm_id=agency_crm_id).first()
+        existing_contact = find_local('agency-crm', 'contact', agency_crm_id)
         if existing_contact:
             print(f"🎯 Found contact by Agency CRM ID {agency_crm_id}: {existing_contact.first_name} {existing_contact.last_name}")
     
@@ -297,6 +343,7 @@ def update_contact(contact_data):
         print(f"📧 Found existing contact: {existing_contact.first_name} {existing_contact.last_name}")
         current_primary = existing_contact.advertiser.name if existing_contact.advertiser else "None"
         print(f"   Current primary advertiser: {current_primary}")
+        link_external('agency-crm', 'contact', agency_crm_id, existing_contact)
         
         # Update the contact information
         existing_contact.first_name = contact_data.get('first_name', existing_contact.first_name)
@@ -308,24 +355,14 @@ def update_contact(contact_data):
         
         print(f"🔄 Updated contact information")
         
-        # Clear old relationship activities for this contact
-        old_activities = Activity.query.filter(
-            Activity.description.contains(f"Contact relationship established: {existing_contact.first_name} {existing_contact.last_name}")
-        ).all()
-        for activity in old_activities:
-            db.session.delete(activity)
-        
-        print(f"🧹 Cleared old relationship activities")
-        
-        # Handle brand relationships - update primary advertiser and create activities
+        # Handle brand relationships - update primary advertiser and linked advertisers
         brands = contact_data.get('brands', [])
+        related_ids = []
         
         if brands:
             # Find primary advertiser (first brand)
             primary_brand = brands[0]
-            primary_advertiser = Advertiser.query.filter(
-                Advertiser.name.contains(primary_brand['name'])
-            ).first()
+            primary_advertiser = brand_advertiser(primary_brand.get('id'), primary_brand['name'])
             
             if primary_advertiser:
                 # Update primary advertiser
@@ -335,29 +372,19 @@ def update_contact(contact_data):
                 print(f"⚠️ Primary advertiser not found for brand: {primary_brand['name']}")
                 existing_contact.advertiser_id = None
             
-            # Create activities for all related advertisers
             for brand in brands:
-                advertiser = Advertiser.query.filter(
-                    Advertiser.name.contains(brand['name'])
-                ).first()
-                
-                if advertiser and (not existing_contact.advertiser_id or advertiser.id != existing_contact.advertiser_id):
-                    # Create relationship activity for non-primary advertisers
-                    activity = Activity(
-                        advertiser_id=advertiser.id,
-                        user_id=1,  # System user
-                        activity_type='note',
-                        description=f"Contact relationship established: {existing_contact.first_name} {existing_contact.last_name}",
-                        outcome=f"Contact: {existing_contact.email} | Phone: {existing_contact.phone or 'N/A'}",
-                        created_at=datetime.utcnow()
-                    )
-                    db.session.add(activity)
-                    print(f"🔗 Added relationship: {advertiser.name}")
+                advertiser = brand_advertiser(brand.get('id'), brand['name'])
+                if advertiser:
+                    related_ids.append(advertiser.id)
         else:
             # No brands provided - remove primary advertiser
             existing_contact.advertiser_id = None
             print(f"🚫 No brands provided - removed primary advertiser")
         
+        # Replace the linked advertisers (new links get a relationship note)
+        added = existing_contact.set_related_advertisers(related_ids, user_id=1)  # System user
+        print(f"🔗 Added {len(added)} new advertiser links")
+        
         print(f"✅ Contact update completed with updated brand relationships")
         
     else:
@@ -367,62 +394,74 @@ def update_contact(contact_data):
         print(f"   Email: {contact_data.get('email')}")  
         print(f"   Name: {contact_data.get('first_name')} {contact_data.get('last_name')}")
         print(f"🚨 This indicates a sync issue - contact should exist for updates")
-        return
-    
-    db.session.commit()
 
 def create_invoice_activity(invoice_data):
-    """Create activity for invoice from agency-crm"""
+    """Create (or update the already synced) activity for invoice from agency-crm"""
+    
+    description = (f"Invoice created: {invoice_data.get('invoice_date')} - "
+                   f"Amount: {invoice_data.get('total_amount')} EUR")
+    activity = find_local('agency-crm', 'invoice', invoice_data.get('id'))
+    if activity:
+        activity.description = description
+        return
     
-    # Find advertiser by brand name
-    advertiser = Advertiser.query.filter(
-        Advertiser.name.contains(invoice_data.get('brand_name', ''))
-    ).first()
+    # Find advertiser by brand
+    advertiser = brand_advertiser(invoice_data.get('brand_id'), invoice_data.get('brand_name', ''))
     
     if advertiser:
         activity = Activity(
             advertiser_id=advertiser.id,
             user_id=1,  # System user
             activity_type='note',
-            description=f"Invoice created: {invoice_data.get('invoice_date')} - "
-                       f"Amount: {invoice_data.get('total_amount')} EUR",
+            description=description,
             outcome='Invoice logged',
             created_at=datetime.utcnow()
         )
         db.session.add(activity)
-        db.session.commit()
+        link_external('agency-crm', 'invoice', invoice_data.get('id'), activity)
 
 def create_status_update_activity(update_data):
-    """Create activity for status update from agency-crm"""
+    """Create (or update the already synced) activity for status update from agency-crm"""
     
-    # Find advertiser by brand name
-    advertiser = Advertiser.query.filter(
-        Advertiser.name.contains(update_data.get('brand_name', ''))
-    ).first()
+    description = f"Status Update: {update_data.get('update_text', '')}"
+    activity = find_local('agency-crm', 'status_update', update_data.get('id'))
+    if activity:
+        activity.description = description
+        return
+    
+    # Find advertiser by brand
+    advertiser = brand_advertiser(update_data.get('brand_id'), update_data.get('brand_name', ''))
     
     if advertiser:
         activity = Activity(
             advertiser_id=advertiser.id,
             user_id=1,  # System user
             activity_type='note',
-            description=f"Status Update: {update_data.get('update_text', '')}",
+            description=description,
             outcome=f"By: {update_data.get('created_by', 'Unknown')}",
             created_at=datetime.utcnow()
         )
         db.session.add(activity)
-        db.session.commit()
+        link_external('agency-crm', 'status_update', update_data.get('id'), activity)
 
 def sync_campaign_spending(campaign_data):
     """Sync campaign spending from tv-planner"""
     
-    # This would need proper mapping between campaign names and advertisers
-    # For now, we'll use a simple name matching
+    advertiser_id = apply_campaign_spending(campaign_data)
+    if advertiser_id is not None:
+        refresh_latest_spending([advertiser_id])
+
+def apply_campaign_spending(campaign_data):
+    """Add a campaign's TV spending and activity to the session without committing.
+    Returns the matched advertiser id, or None."""
+    
+    # A synced campaign keeps the advertiser of its activity; new campaigns
+    # are matched by the name part through the advertiser name resolver
+    activity = find_local('tv-planner', 'campaign', campaign_data.get('id'))
     advertiser_name = campaign_data.get('name', '').split('-')[0].strip()
     
-    if advertiser_name:
-        advertiser = Advertiser.query.filter(
-            Advertiser.name.contains(advertiser_name)
-        ).first()
+    if activity or advertiser_name:
+        advertiser = activity.advertiser if activity else resolve_advertiser(advertiser_name)
         
         if advertiser:
             # Get or create spending data for current year
@@ -442,17 +481,24 @@ def sync_campaign_spending(campaign_data):
             # Update TV spending (assuming campaign is TV)
             spending.tv = campaign_data.get('total_spending', 0)
             
-            # Create activity
-            activity = Activity(
-                advertiser_id=advertiser.id,
-                user_id=1,
-                activity_type='note',
-                description=f"TV Campaign synced: {campaign_data.get('name')}",
-                outcome=f"Spending: {campaign_data.get('total_spending', 0)} EUR",
-                created_at=datetime.utcnow()
-            )
-            db.session.add(activity)
-            db.session.commit()
+            # Create activity, or update the one from the last sync
+            outcome = f"Spending: {campaign_data.get('total_spending', 0)} EUR"
+            if activity:
+                activity.outcome = outcome
+            else:
+                activity = Activity(
+                    advertiser_id=advertiser.id,
+                    user_id=1,
+                    activity_type='note',
+                    description=f"TV Campaign synced: {campaign_data.get('name')}",
+                    outcome=outcome,
+                    created_at=datetime.utcnow()
+                )
+                db.session.add(activity)
+                link_external('tv-planner', 'campaign', campaign_data.get('id'), activity)
+            return advertiser.id
+    
+    return None
 
 def update_spending_from_wave(wave_data):
     """Update spending data from tv-planner wave"""
@@ -461,10 +507,13 @@ def update_spending_from_wave(wave_data):
     campaign_name = wave_data.get('campaign_name', '')
     advertiser_name = campaign_name.split('-')[0].strip()
     
+    activity = find_local('tv-planner', 'wave', wave_data.get('id'))
+    if activity:
+        activity.description = f"TV Wave updated: {wave_data.get('name')}"
+        return
+    
     if advertiser_name:
-        advertiser = Advertiser.query.filter(
-            Advertiser.name.contains(advertiser_name)
-        ).first()
+        advertiser = resolve_advertiser(advertiser_name)
         
         if advertiser:
             activity = Activity(
@@ -475,7 +524,27 @@ def update_spending_from_wave(wave_data):
                 created_at=datetime.utcnow()
             )
             db.session.add(activity)
-            db.session.commit()
+            link_external('tv-planner', 'wave', wave_data.get('id'), activity)
+
+# Webhook event -> handler, per source
+WEBHOOK_HANDLERS = {
+    'agency-crm': {
+        'company.created': sync_company_to_advertiser,
+        'company.updated': sync_company_to_advertiser,
+        'brand.created': sync_brand_to_advertiser,
+        'brand.updated': sync_brand_to_advertiser,
+        'contact.created': sync_contact,
+        'contact.updated': update_contact,
+        'invoice.created': create_invoice_activity,
+        'status_update.created': create_status_update_activity
+    },
+    'tv-planner': {
+        'campaign.created': sync_campaign_spending,
+        'campaign.updated': sync_campaign_spending,
+        'wave.created': update_spending_from_wave,
+        'wave.updated': update_spending_from_wave
+    }
+}
 
 # API endpoints for pulling data
 @integrations_bp.route('/sync/agency-crm', methods=['POST'])
@@ -483,8 +552,6 @@ def update_spending_from_wave(wave_data):
 def sync_from_agency_crm():
     """Manually trigger sync from agency-crm"""
     
-    import requests
-    
     # Get configuration from request or use defaults
     api_url = request.json.get('api_url', 'http://localhost:5000/api')
     api_key = request.json.get('api_key', '')
@@ -492,45 +559,26 @@ def sync_from_agency_crm():
     if not api_key:
         return jsonify({'error': 'API key required'}), 400
     
-    try:
-        headers = {'X-API-Key': api_key}
-        
-        # Sync companies
-        response = requests.get(f"{api_url}/companies", headers=headers)
-        if response.status_code == 200:
-            companies = response.json()
-            for company in companies:
-                sync_company_to_advertiser(company)
-        
-        # Sync brands
-        response = requests.get(f"{api_url}/brands", headers=headers)
-        if response.status_code == 200:
-            brands = response.json()
-            for brand in brands:
-                sync_brand_to_advertiser(brand)
-        
-        # Sync contacts
-        response = requests.get(f"{api_url}/contacts", headers=headers)
-        if response.status_code == 200:
-            contacts = response.json()
-            for contact in contacts:
-                sync_contact(contact)
-        
-        return jsonify({
-            'status': 'success',
-            'message': 'Data synced from agency-crm'
-        }), 200
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    # Recorded in sync_run like scheduled syncs, and refused while one is running
+    # Only records changed since the last pull are fetched and written
+    run = run_sync('agency-crm', 'manual', api_url=api_url, api_key=api_key,
+                   full=request.json.get('full', False))
+    if run is None:
+        return jsonify({'error': 'An agency-crm sync is already running'}), 409
+    if run.status == 'failed':
+        return jsonify({'error': run.error}), 500
+    
+    return jsonify({
+        'status': 'success',
+        'message': 'Data synced from agency-crm',
+        'resources': run.counts
+    }), 200
 
 @integrations_bp.route('/sync/tv-planner', methods=['POST'])
 @login_required
 def sync_from_tv_planner():
     """Manually trigger sync from tv-planner"""
     
-    import requests
-    
     # Get configuration from request or use defaults
     api_url = request.json.get('api_url', 'http://localhost:5004/api')
     api_key = request.json.get('api_key', '')
@@ -538,27 +586,17 @@ def sync_from_tv_planner():
     if not api_key:
         return jsonify({'error': 'API key required'}), 400
     
-    try:
-        headers = {'X-API-Key': api_key}
-        
-        # Sync campaigns
-        response = requests.get(f"{api_url}/campaigns", headers=headers)
-        if response.status_code == 200:
-            campaigns = response.json()
-            for campaign in campaigns:
-                # Get spending data for each campaign
-                spending_response = requests.get(
-                    f"{api_url}/campaigns/{campaign['id']}/spending",
-                    headers=headers
-                )
-                if spending_response.status_code == 200:
-                    campaign['total_spending'] = spending_response.json().get('total_spending', 0)
-                sync_campaign_spending(campaign)
-        
-        return jsonify({
-            'status': 'success',
-            'message': 'Data synced from tv-planner'
-        }), 200
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+    # Campaigns, fetching their spending concurrently; recorded in sync_run like scheduled syncs
+    run = run_sync('tv-planner', 'manual', api_url=api_url, api_key=api_key)
+    if run is None:
+        return jsonify({'error': 'A tv-planner sync is already running'}), 409
+    if run.status == 'failed':
+        return jsonify({'error': run.error}), 500
+    
+    counts = run.counts['campaigns']
+    return jsonify({
+        'status': 'success',
+        'message': 'Data synced from tv-planner',
+        'campaigns_synced': counts['synced'],
+        'spending_fetch_failures': counts['spending_failures']
+    }), 200
\ No newline at end of file
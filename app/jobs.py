@@ -0,0 +1,195 @@
+"""
+Background job queue for work that shouldn't block a request worker.
+Jobs are persisted in the job table and run either on a small in-process
+thread pool or by the run_worker.py sidecar (JOB_EXECUTOR setting).
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from app.models import db, Job
+
+# job_type -> handler(job) returning (success, message)
+JOB_HANDLERS = {}
+
+def job_handler(job_type):
+    """Register a function as the handler for a job type."""
+    def decorator(f):
+        JOB_HANDLERS[job_type] = f
+        return f
+    return decorator
+
+class JobQueue:
+    """Enqueue jobs and run them with the app context of the owning app."""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.executor = None
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['job_queue'] = self
+
+    def start(self):
+        """Create the thread pool, once per process, resuming the jobs the last one left. Returns the pool."""
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(
+                    max_workers=self.app.config.get('JOB_WORKERS', 2),
+                    thread_name_prefix='job-worker'
+                )
+                # Jobs a previous process was running when it died, or never got to
+                with self.app.app_context():
+                    requeue_stale_jobs(self.app.config.get('JOB_STALE_MINUTES', 60))
+                    job_ids = [job_id for (job_id,) in db.session.query(Job.id)
+                               .filter_by(status='queued').order_by(Job.id)]
+                for job_id in job_ids:
+                    self.executor.submit(self.run_job, job_id)
+            return self.executor
+
+    def enqueue(self, job_type, params=None, user_id=None):
+        """Persist a new job and hand it to the thread pool. Returns the job."""
+        if job_type not in JOB_HANDLERS:
+            raise ValueError(f"Unknown job type: {job_type}")
+
+        job = Job(job_type=job_type, params=params or {}, progress={},
+                  status='queued', created_by_id=user_id)
+        db.session.add(job)
+        db.session.commit()
+
+        # With JOB_EXECUTOR = 'worker' the run_worker.py process picks it up instead
+        if self.app.config.get('JOB_EXECUTOR', 'thread') == 'thread':
+            # The first call may submit it twice; run_job() only runs a job it can claim
+            self.start().submit(self.run_job, job.id)
+        return job
+
+    def run_job(self, job_id):
+        """Claim and run a single job. Safe to call from any thread or process."""
+        with self.app.app_context():
+            if not claim_job(job_id):
+                return  # Someone else got it first
+
+            job = db.session.get(Job, job_id)
+            handler = JOB_HANDLERS.get(job.job_type)
+            try:
+                if handler is None:
+                    raise ValueError(f"No handler for job type: {job.job_type}")
+                success, message = handler(job)
+                job.status = 'completed' if success else 'failed'
+                job.message = message
+            except Exception as e:
+                db.session.rollback()
+                job = db.session.get(Job, job_id)
+                job.status = 'failed'
+                job.message = f"Error: {str(e)}"
+                current_app.logger.error(f"Job {job_id} failed: {str(e)}")
+
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+
+    def work(self, poll_interval=2, once=False):
+        """Sidecar loop: run queued jobs one at a time as they appear."""
+        with self.app.app_context():
+            requeue_stale_jobs(self.app.config.get('JOB_STALE_MINUTES', 60))
+
+        while True:
+            with self.app.app_context():
+                job = Job.query.filter_by(status='queued').order_by(Job.id).first()
+                job_id = job.id if job else None
+
+            if job_id:
+                self.run_job(job_id)
+            elif once:
+                return
+            else:
+                time.sleep(poll_interval)
+
+def claim_job(job_id):
+    """Atomically move a job from queued to running. Returns True if we got it."""
+    claimed = Job.query.filter_by(id=job_id, status='queued').update(
+        {'status': 'running', 'started_at': datetime.utcnow()},
+        synchronize_session=False
+    )
+    db.session.commit()
+    return claimed == 1
+
+def requeue_stale_jobs(max_age_minutes):
+    """Put jobs left running by a crashed process back on the queue."""
+    cutoff = datetime.utcnow() - timedelta(minutes=max_age_minutes)
+    count = Job.query.filter(
+        Job.status == 'running',
+        Job.started_at < cutoff
+    ).update({'status': 'queued', 'started_at': None}, synchronize_session=False)
+    db.session.commit()
+    return count
+
+job_queue = JobQueue()
+
+@job_handler('csv_import')
+def run_csv_import(job):
+    """Import an uploaded spending CSV, reporting progress after every chunk."""
+    from app.utils import process_csv_upload
+    from app.spending_import import ImportProgress
+
+    file_path = job.params['file_path']
+    progress = ImportProgress()
+
+    def report_progress(progress):
+        job.progress = progress.as_dict()
+        db.session.commit()
+
+    try:
+        result = process_csv_upload(
+            file_path,
+            chunksize=current_app.config.get('CSV_IMPORT_CHUNKSIZE'),
+            progress=progress,
+            on_chunk=report_progress,
+            mode=job.params.get('mode', 'replace'),
+            delete_missing=job.params.get('delete_missing', False)
+        )
+        job.progress = progress.as_dict()
+        return result
+    finally:
+        # Delete the uploaded file after processing
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+@job_handler('agency_crm_sync')
+def run_agency_crm_sync(job):
+    """Incremental pull from Agency CRM, recorded in sync_run like scheduled runs."""
+    from app.sync_scheduler import run_sync
+
+    run = run_sync('agency-crm', trigger='job', full=job.params.get('full', False))
+    if run is None:
+        return False, 'An Agency CRM sync is already running'
+    job.progress = run.counts or {}
+    if run.status == 'failed':
+        return False, run.error
+
+    changed = sum(c['changed'] for c in run.counts.values())
+    unchanged = sum(c['unchanged'] for c in run.counts.values())
+    return True, f"{changed} records changed, {unchanged} unchanged"
+
+@job_handler('report_export')
+def run_report_export(job):
+    """Write a requested report export and notify 'export.completed' webhook subscribers."""
+    from app.export_jobs import write_export, download_path
+    from app.models import ReportExport
+    from app.webhook_helper import trigger_webhooks
+
+    export = db.session.get(ReportExport, job.params['export_id'])
+    if export is None:
+        return False, 'The export was deleted before it ran'
+    write_export(export)
+    job.progress = {'rows': export.row_count, 'bytes': export.size_bytes}
+
+    # Queued in this transaction, delivered once the export is committed
+    trigger_webhooks('export.completed', dict(export.to_dict(), status='completed',
+                                              download_path=download_path(export)))
+    return True, f"Exported {export.row_count} rows"
@@ -0,0 +1,84 @@
+"""
+Automatic lead status rules for non-qualified advertisers.
+Advertisers with our IPG agencies become 'ours', public sector organizations
+become 'non_market'. Statuses are applied with bulk UPDATE statements.
+"""
+
+import re
+from app.models import db, Advertiser
+
+# Define our agencies
+OUR_AGENCIES = [
+    'BPN (US) - IPG',
+    'Initiate (Open agency) IPG',
+    'Media brands digital - IPG',
+    'UM (Inspired) IPG'
+]
+
+# Define public sector keywords for non-market detection
+PUBLIC_SECTOR_KEYWORDS = [
+    'ministerija', 'ministeri', 'ministry',
+    'savivaldyb', 'municipality',
+    'departament', 'department',
+    'tarnyba', 'taryba', 'service', 'council',
+    'agentūra', 'agency',
+    'fondas', 'fund',
+    'centras', 'center', 'centre',
+    'inspekcija', 'inspection',
+    'direkcija', 'directorate',
+    'komisija', 'commission',
+    'valstybinė', 'valstybinis', 'state',
+    'nacionalinis', 'national',
+    'lietuvos respublikos', 'republic of lithuania',
+    'vyriausybė', 'government',
+    'seimas', 'parliament'
+]
+
+# One alternation over all keywords: a single pass over each name
+PUBLIC_SECTOR_PATTERN = re.compile('|'.join(re.escape(keyword) for keyword in PUBLIC_SECTOR_KEYWORDS))
+
+# Keep IN (...) lists well under SQLite's bound parameter limit
+UPDATE_BATCH_SIZE = 500
+
+def is_public_sector(name):
+    """True if an advertiser name looks like a public sector organization."""
+    return bool(name) and PUBLIC_SECTOR_PATTERN.search(name.lower()) is not None
+
+def classify_lead_statuses(advertiser_ids=None):
+    """Apply the automatic status rules to non-qualified advertisers.
+
+    Limited to ``advertiser_ids`` if given (e.g. the advertisers of the latest
+    import), otherwise all advertisers are checked. Commits and returns the
+    number of advertisers updated.
+    """
+    if advertiser_ids is not None:
+        advertiser_ids = list(advertiser_ids)
+        if not advertiser_ids:
+            return 0
+        batches = [advertiser_ids[i:i + UPDATE_BATCH_SIZE]
+                   for i in range(0, len(advertiser_ids), UPDATE_BATCH_SIZE)]
+    else:
+        batches = [None]
+
+    advertisers_updated = 0
+
+    for batch in batches:
+        scope = [Advertiser.lead_status == 'non_qualified']
+        if batch is not None:
+            scope.append(Advertiser.id.in_(batch))
+
+        # Set 'ours' status for our agencies
+        advertisers_updated += Advertiser.query.filter(
+            *scope, Advertiser.current_agency.in_(OUR_AGENCIES)
+        ).update({'lead_status': 'ours'}, synchronize_session=False)
+
+        # Set 'non_market' status for public sector
+        candidates = db.session.query(Advertiser.id, Advertiser.name).filter(*scope).all()
+        public_ids = [id for id, name in candidates if is_public_sector(name)]
+        for start in range(0, len(public_ids), UPDATE_BATCH_SIZE):
+            advertisers_updated += Advertiser.query.filter(
+                Advertiser.id.in_(public_ids[start:start + UPDATE_BATCH_SIZE])
+            ).update({'lead_status': 'non_market'}, synchronize_session=False)
+
+    db.session.commit()
+    return advertisers_updated
@@ -1,13 +1,22 @@
-from flask import render_template, redirect, url_for, flash, request, current_app
+from flask import render_template, redirect, url_for, flash, request, current_app, jsonify
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 import os
 from datetime import datetime
 from app import db
 from app.main import bp
-from app.models import Advertiser, User, Activity, LeadStatusHistory, SpendingData
-from app.utils import process_csv_upload
-from sqlalchemy import func, desc, case
+from app.models import Advertiser, User, Activity, LeadStatusHistory, SpendingData, Job, Contact, SyncRun, DiscountRate, DEFAULT_NET_RATES
+from app.spending_summary import set_discount_rate
+from app.jobs import job_queue
+from app.http_client import http_client
+from app.name_resolver import advertiser_name_resolver
+from app.sync_scheduler import sync_scheduler
+from app.aggregate_cache import aggregate_cache
+from app.utils import wants_json
+from app.pagination import keyset_paginate
+from app.search import ranked_search
+from app.queries import activity_list_query, open_leads_query
+from sqlalchemy import func, desc, case, or_
 
 @bp.route('/')
 @bp.route('/index')
@@ -15,55 +24,36 @@ from sqlalchemy import func, desc, case
 def index():
     # Get pagination parameters
     leads_page = request.args.get('leads_page', 1, type=int)
-    activities_page = request.args.get('activities_page', 1, type=int)
     
-    # Get dashboard statistics
-    total_advertisers = Advertiser.query.count()
+    # Dashboard statistics, cached until an advertiser changes
+    stats = aggregate_cache.get_or_compute('index:stats', ['advertiser'], lambda: {
+        'total_advertisers': Advertiser.query.count(),
+        'lead_status_counts': [list(row) for row in db.session.query(
+            Advertiser.lead_status,
+            func.count(Advertiser.id)
+        ).group_by(Advertiser.lead_status)]
+    })
+    total_advertisers = stats['total_advertisers']
+    lead_status_counts = stats['lead_status_counts']
     
-    # Lead status counts
-    lead_status_counts = db.session.query(
-        Advertiser.lead_status, 
-        func.count(Advertiser.id)
-    ).group_by(Advertiser.lead_status).all()
-    
-    # Recent activities with pagination
-    recent_activities_query = Activity.query.order_by(
-        Activity.created_at.desc()
-    )
-    recent_activities = recent_activities_query.paginate(
-        page=activities_page, per_page=50, error_out=False
-    )
-    
-    # Get leads needing attention (hot, warm, cold) with their last activity date
-    # Subquery to get last activity date for each advertiser
-    last_activity_subq = db.session.query(
-        Activity.advertiser_id,
-        func.max(Activity.created_at).label('last_activity_date')
-    ).group_by(Activity.advertiser_id).subquery()
-    
-    # Get hot, warm, and cold leads with their details
-    leads_query = db.session.query(
-        Advertiser,
-        last_activity_subq.c.last_activity_date
-    ).outerjoin(
-        last_activity_subq,
-        Advertiser.id == last_activity_subq.c.advertiser_id
-    ).filter(
-        Advertiser.lead_status.in_(['hot', 'warm', 'cold', 'get_info'])
-    ).order_by(
-        # Sort by oldest activity first (nulls first)
-        func.coalesce(last_activity_subq.c.last_activity_date, func.datetime('1900-01-01')).asc()
+    # Recent activities with keyset pagination (the feed can grow without bound)
+    recent_activities = keyset_paginate(
+        activity_list_query(), [Activity.created_at, Activity.id],
+        after=request.args.get('activities_after'),
+        before=request.args.get('activities_before'),
+        per_page=50,
+        descending=True
     )
     
-    # Paginate the leads
-    leads_paginated = leads_query.paginate(
-        page=leads_page, per_page=50, error_out=False
-    )
+    # Get leads needing attention (hot, warm, cold) with their last activity date,
+    # an index-ordered scan on the denormalized Advertiser.last_activity_at
+    leads_paginated = open_leads_query().paginate(page=max(leads_page, 1), per_page=50, error_out=False)
     
     # Calculate days ago for each lead
     leads_with_days_ago = []
     today = datetime.utcnow()
-    for advertiser, last_activity_date in leads_paginated.items:
+    for advertiser in leads_paginated.items:
+        last_activity_date = advertiser.last_activity_at
         if last_activity_date:
             days_ago = (today - last_activity_date).days
             days_ago_str = f"{days_ago} days ago" if days_ago != 1 else "1 day ago"
@@ -79,6 +69,18 @@ def index():
             'days_ago_num': days_ago
         })
     
+    if wants_json():
+        return jsonify({
+            'recent_activities': recent_activities.to_dict(Activity.to_dict),
+            'leads': {
+                'items': [dict(lead['advertiser'].to_dict(), last_activity=lead['last_activity'])
+                          for lead in leads_with_days_ago],
+                'page': leads_paginated.page,
+                'pages': leads_paginated.pages,
+                'total': leads_paginated.total
+            }
+        })
+    
     return render_template('main/index.html',
                          total_advertisers=total_advertisers,
                          lead_status_counts=dict(lead_status_counts),
@@ -104,22 +106,149 @@ def upload_csv():
             return redirect(request.url)
         
         if file and file.filename.endswith('.csv'):
-            filename = secure_filename(file.filename)
+            # Add timestamp to filename so concurrent uploads don't clash
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+            filename = f"{timestamp}_{secure_filename(file.filename)}"
             filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
             file.save(filepath)
             
-            success, message = process_csv_upload(filepath)
+            # Import runs in the background; the file is deleted when it's done
+            mode = request.form.get('mode', 'replace')
+            if mode not in ('replace', 'upsert'):
+                mode = 'replace'
             
-            # Delete the uploaded file after processing
-            os.remove(filepath)
+            job = job_queue.enqueue('csv_import', {
+                'file_path': filepath,
+                'filename': file.filename,
+                'mode': mode,
+                'delete_missing': mode == 'upsert' and bool(request.form.get('delete_missing'))
+            }, user_id=current_user.id)
             
-            if success:
-                flash(message, 'success')
-            else:
-                flash(message, 'danger')
+            if wants_json():
+                return jsonify({
+                    'job_id': job.id,
+                    'status': job.status,
+                    'status_url': url_for('main.api_job_status', id=job.id)
+                }), 202
             
-            return redirect(url_for('main.index'))
+            flash(f'Import started for {file.filename}.', 'info')
+            return redirect(url_for('main.import_job', id=job.id))
         else:
             flash('Please upload a CSV file', 'danger')
     
-    return render_template('main/upload.html')
\ No newline at end of file
+    recent_jobs = Job.query.filter_by(job_type='csv_import').order_by(
+        Job.created_at.desc()
+    ).limit(10).all()
+    
+    return render_template('main/upload.html', recent_jobs=recent_jobs)
+
+@bp.route('/upload/jobs/<int:id>')
+@login_required
+def import_job(id):
+    if not current_user.is_admin():
+        flash('Only administrators can view imports.', 'warning')
+        return redirect(url_for('main.index'))
+    
+    job = Job.query.get_or_404(id)
+    return render_template('main/import_job.html', job=job)
+
+@bp.route('/api/jobs/<int:id>')
+@login_required
+def api_job_status(id):
+    """API endpoint to poll the status and progress of a background job."""
+    if not current_user.is_admin():
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    job = Job.query.get_or_404(id)
+    return jsonify(job.to_dict())
+
+@bp.route('/api/http-metrics')
+@login_required
+def api_http_metrics():
+    """Per-host request counts, connection reuse and latency of outgoing HTTP calls."""
+    if not current_user.is_admin():
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    return jsonify(http_client.get_metrics())
+
+@bp.route('/api/name-resolver')
+@login_required
+def api_name_resolver():
+    """Size of the integration advertiser name index and recent ambiguous names."""
+    if not current_user.is_admin():
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    return jsonify(advertiser_name_resolver.stats())
+
+@bp.route('/api/aggregate-cache')
+@login_required
+def api_aggregate_cache():
+    """Entry count and this worker's hit rate of the dashboard aggregate cache."""
+    if not current_user.is_admin():
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    return jsonify(aggregate_cache.stats())
+
+@bp.route('/api/discount-rates', methods=['GET', 'POST'])
+@login_required
+def api_discount_rates():
+    """Net discount rates by media and year; POST {media, valid_from_year, rate} to change one."""
+    if not current_user.is_admin():
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        try:
+            discount_rate = set_discount_rate(data.get('media'), int(data['valid_from_year']), float(data['rate']))
+            db.session.commit()
+        except (KeyError, TypeError, ValueError) as e:
+            db.session.rollback()
+            return jsonify({'error': str(e)}), 400
+        return jsonify(discount_rate.to_dict())
+    
+    rates = DiscountRate.query.order_by(DiscountRate.media, DiscountRate.valid_from_year).all()
+    return jsonify({
+        'defaults': DEFAULT_NET_RATES,
+        'rates': [rate.to_dict() for rate in rates]
+    })
+
+@bp.route('/api/sync-runs')
+@login_required
+def api_sync_runs():
+    """Recent integration sync runs and the next scheduled run per source."""
+    if not current_user.is_admin():
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    runs = SyncRun.query.order_by(SyncRun.started_at.desc()).limit(50).all()
+    return jsonify({
+        'next_runs': sync_scheduler.stats(),
+        'runs': [run.to_dict() for run in runs]
+    })
+
+
+@bp.route('/api/search')
+@login_required
+def api_search():
+    """Ranked full-text search across advertisers, contacts and activities."""
+    search = request.args.get('q', '')
+    limit = min(request.args.get('limit', 20, type=int), 100)
+    
+    advertisers = Advertiser.query
+    contacts = Contact.query.outerjoin(Advertiser)
+    activities = Activity.query.join(Advertiser)
+    
+    # Account executives only see their own advertisers
+    if not current_user.is_team_lead():
+        advertisers = advertisers.filter(Advertiser.assigned_user_id == current_user.id)
+        contacts = contacts.filter(or_(
+            Advertiser.assigned_user_id == current_user.id,
+            Contact.advertiser_id.is_(None)
+        ))
+        activities = activities.filter(Advertiser.assigned_user_id == current_user.id)
+    
+    return jsonify({
+        'query': search,
+        'advertisers': [a.to_dict() for a in ranked_search(Advertiser, search, limit, advertisers)],
+        'contacts': [c.to_dict() for c in ranked_search(Contact, search, limit, contacts)],
+        'activities': [a.to_dict() for a in ranked_search(Activity, search, limit, activities)]
+    })
@@ -1,5 +1,8 @@
+import time
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import func, select
+from sqlalchemy.ext.hybrid import hybrid_property
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 
@@ -39,6 +42,16 @@ class Advertiser(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Latest year spending, denormalized for the advertiser list (see app.spending_summary)
+    latest_spending_year = db.Column(db.Integer)
+    latest_gross_spending = db.Column(db.Float, default=0, index=True)
+    latest_net_spending = db.Column(db.Float, default=0, index=True)
+    
+    # Newest activity, maintained on flush (see app.activity_summary)
+    last_activity_at = db.Column(db.DateTime)
+    
+    __table_args__ = (db.Index('ix_advertiser_status_last_activity', 'lead_status', 'last_activity_at'),)
+    
     # Relationships
     spending_data = db.relationship('SpendingData', backref='advertiser', lazy='dynamic', cascade='all, delete-orphan')
     activities = db.relationship('Activity', backref='advertiser', lazy='dynamic', cascade='all, delete-orphan')
@@ -62,6 +75,19 @@ class Advertiser(db.Model):
         """Get net spending for the most recent year."""
         latest = self.latest_spending_data
         return latest.calculated_net_total if latest else 0
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'current_agency': self.current_agency,
+            'lead_status': self.lead_status,
+            'assigned_user_id': self.assigned_user_id,
+            'latest_spending_year': self.latest_spending_year,
+            'latest_gross_spending': self.latest_gross_spending or 0,
+            'latest_net_spending': self.latest_net_spending or 0,
+            'last_activity_at': self.last_activity_at.isoformat() if self.last_activity_at else None
+        }
 
 class SpendingData(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -81,25 +107,98 @@ class SpendingData(db.Model):
     
     __table_args__ = (db.UniqueConstraint('advertiser_id', 'year', name='_advertiser_year_uc'),)
     
-    @property
+    @hybrid_property
     def calculated_net_total(self):
-        """Calculate net total if not manually set, using industry discounts."""
+        """Manual net total, else each media's gross times its discount rate for the year."""
         if self.net_total is not None:
             return self.net_total
         
-        # Apply standard industry discounts
-        net = 0
-        net += self.tv * 0.2  # TV: -80%
-        net += self.cinema * 0.2  # Cinema: -80%
-        net += self.radio * 0.3  # Radio: -70%
-        net += self.outdoor_static * 0.5  # Outdoor: -50%
-        net += self.billboard * 0.5  # Billboard (outdoor): -50%
-        net += self.internet * 0.5  # Internet: assume -50%
-        net += self.magazines * 0.5  # Magazines: assume -50%
-        net += self.newspapers * 0.5  # Newspapers: assume -50%
-        net += self.indoor_tv * 0.5  # Indoor TV: assume -50%
+        rates = DiscountRate.rates_for_year(self.year)
+        return sum((getattr(self, media) or 0) * rate for media, rate in rates.items())
+    
+    @calculated_net_total.expression
+    def calculated_net_total(cls):
+        # Same rates in SQL, so net spending can be summed without loading rows
+        return func.coalesce(cls.net_total, sum(
+            func.coalesce(getattr(cls, media), 0) * DiscountRate.rate_expression(media, cls.year)
+            for media in DEFAULT_NET_RATES
+        ))
+
+# Share of gross spending kept as net after the standard industry discounts,
+# per SpendingData media column. DiscountRate rows override them from a year on.
+DEFAULT_NET_RATES = {
+    'tv': 0.2,  # TV: -80%
+    'cinema': 0.2,  # Cinema: -80%
+    'radio': 0.3,  # Radio: -70%
+    'outdoor_static': 0.5,  # Outdoor: -50%
+    'billboard': 0.5,  # Billboard (outdoor): -50%
+    'internet': 0.5,  # Internet: assume -50%
+    'magazines': 0.5,  # Magazines: assume -50%
+    'newspapers': 0.5,  # Newspapers: assume -50%
+    'indoor_tv': 0.5  # Indoor TV: assume -50%
+}
+
+class DiscountRate(db.Model):
+    """Net rate of one media channel for spending years from valid_from_year on"""
+    id = db.Column(db.Integer, primary_key=True)
+    media = db.Column(db.String(50), nullable=False)  # A DEFAULT_NET_RATES key (SpendingData column)
+    valid_from_year = db.Column(db.Integer, nullable=False)
+    rate = db.Column(db.Float, nullable=False)  # Share of gross kept, e.g. 0.2 for an 80% discount
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (db.UniqueConstraint('media', 'valid_from_year', name='uq_discount_rate'),)
+    
+    # Rows cached per process for calculated_net_total on loaded objects
+    CACHE_SECONDS = 60
+    _cache = None
+    _cached_at = 0
+    
+    @classmethod
+    def rate_expression(cls, media, year):
+        """SQL for the rate of ``media`` in ``year`` (a column or value)."""
+        # Served by the (media, valid_from_year) unique index
+        return func.coalesce(
+            select(cls.rate).where(
+                cls.media == media,
+                cls.valid_from_year <= year
+            ).order_by(cls.valid_from_year.desc()).limit(1).scalar_subquery(),
+            DEFAULT_NET_RATES[media]
+        )
+    
+    @classmethod
+    def rates_for_year(cls, year):
+        """{media: rate} in effect for spending of ``year``."""
+        if cls._cache is None or time.monotonic() - cls._cached_at > cls.CACHE_SECONDS:
+            cls._cache = db.session.execute(
+                select(cls.media, cls.valid_from_year, cls.rate).order_by(cls.valid_from_year)
+            ).all()
+            cls._cached_at = time.monotonic()
         
-        return net
+        rates = dict(DEFAULT_NET_RATES)
+        for media, valid_from_year, rate in cls._cache:
+            if media in rates and valid_from_year <= year:
+                rates[media] = rate
+        return rates
+    
+    @classmethod
+    def clear_cache(cls):
+        cls._cache = None
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'media': self.media,
+            'valid_from_year': self.valid_from_year,
+            'rate': self.rate
+        }
+
+# Many-to-many link between contacts and their non-primary advertisers
+contact_advertiser = db.Table(
+    'contact_advertiser',
+    db.Column('contact_id', db.Integer, db.ForeignKey('contact.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('advertiser_id', db.Integer, db.ForeignKey('advertiser.id', ondelete='CASCADE'), primary_key=True, index=True),
+    db.Column('created_at', db.DateTime, default=datetime.utcnow)
+)
 
 class Contact(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -114,50 +213,93 @@ class Contact(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (db.Index('ix_contact_name', 'last_name', 'first_name'),)
+    
     # Relationships
     added_by = db.relationship('User', backref='added_contacts')
     activities = db.relationship('Activity', backref='contact', lazy='dynamic')
+    # Advertisers the contact also works with, besides the primary one
+    linked_advertisers = db.relationship('Advertiser', secondary='contact_advertiser',
+                                         order_by='Advertiser.name',
+                                         backref=db.backref('linked_contacts', lazy='dynamic'))
     
     @property
     def full_name(self):
         return f"{self.first_name} {self.last_name}"
     
     def get_related_advertisers(self):
-        """Get all advertisers related to this contact (primary + relationships via activities)"""
-        # Start with primary advertiser if it exists
+        """Get all advertisers related to this contact (primary first, then linked ones)"""
         related_advertisers = []
         if self.advertiser:
             related_advertisers.append(self.advertiser)
         
-        # Find other advertisers mentioned in contact relationship activities
-        filter_conditions = [
-            Activity.description.contains(f"Contact relationship established: {self.first_name} {self.last_name}")
-        ]
+        for advertiser in self.linked_advertisers:
+            if advertiser.id != self.advertiser_id:
+                related_advertisers.append(advertiser)
         
-        # Only exclude primary advertiser if it exists
-        if self.advertiser_id:
-            filter_conditions.append(Activity.advertiser_id != self.advertiser_id)
+        return related_advertisers
+    
+    def set_related_advertisers(self, advertiser_ids, user_id):
+        """Link the contact to ``advertiser_ids`` besides its primary advertiser.
         
-        contact_activities = Activity.query.filter(*filter_conditions).all()
+        Logs a relationship note on each newly linked advertiser and returns
+        the list of new advertiser ids.
+        """
+        wanted = [id for id in dict.fromkeys(advertiser_ids) if id != self.advertiser_id]
+        current = {advertiser.id for advertiser in self.linked_advertisers}
         
-        for activity in contact_activities:
-            if activity.advertiser not in related_advertisers:
-                related_advertisers.append(activity.advertiser)
+        self.linked_advertisers = Advertiser.query.filter(Advertiser.id.in_(wanted)).all() if wanted else []
         
-        return related_advertisers
+        added = [id for id in wanted if id not in current]
+        for advertiser_id in added:
+            db.session.add(Activity(
+                advertiser_id=advertiser_id,
+                user_id=user_id,
+                activity_type='note',
+                description=f"Contact relationship established: {self.first_name} {self.last_name}",
+                outcome=f"Contact: {self.email} | Phone: {self.phone or 'N/A'}",
+                created_at=datetime.utcnow()
+            ))
+        return added
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'advertiser_id': self.advertiser_id,
+            'first_name': self.first_name,
+            'last_name': self.last_name,
+            'email': self.email,
+            'phone': self.phone,
+            'linkedin_url': self.linkedin_url
+        }
 
 class Activity(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     advertiser_id = db.Column(db.Integer, db.ForeignKey('advertiser.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    contact_id = db.Column(db.Integer, db.ForeignKey('contact.id'), nullable=True)  # Optional contact reference
+    contact_id = db.Column(db.Integer, db.ForeignKey('contact.id'), nullable=True, index=True)  # Optional contact reference
     activity_type = db.Column(db.String(50), nullable=False)  # call, email, meeting, note
     description = db.Column(db.Text)
     outcome = db.Column(db.String(200))
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     
     # Relationships
-    attachments = db.relationship('Attachment', backref='activity', lazy='dynamic')
+    attachments = db.relationship('Attachment', backref='activity', order_by='Attachment.id')
+    
+    # Newest activity per advertiser (Advertiser.last_activity_at) in one index seek
+    __table_args__ = (db.Index('ix_activity_advertiser_created', 'advertiser_id', 'created_at'),)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'advertiser_id': self.advertiser_id,
+            'user_id': self.user_id,
+            'contact_id': self.contact_id,
+            'activity_type': self.activity_type,
+            'description': self.description,
+            'outcome': self.outcome,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
 
 class LeadStatusHistory(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -198,4 +340,150 @@ class WebhookLog(db.Model):
     payload = db.Column(db.JSON)
     response_status = db.Column(db.Integer)
     response_body = db.Column(db.Text)
-    triggered_at = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    triggered_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class WebhookDelivery(db.Model):
+    """Outbox entry: one webhook event waiting to be delivered to one subscriber"""
+    id = db.Column(db.Integer, primary_key=True)
+    webhook_id = db.Column(db.Integer, db.ForeignKey('webhook.id'), nullable=False)
+    event = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.JSON)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, delivering, delivered, dead
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime)  # When a dispatcher claimed it
+    last_status = db.Column(db.Integer)  # HTTP status of the last attempt (0 = no response)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    delivered_at = db.Column(db.DateTime)
+    
+    __table_args__ = (db.Index('ix_webhook_delivery_due', 'status', 'next_attempt_at'),)
+    
+    webhook = db.relationship('Webhook', backref=db.backref('deliveries', lazy='dynamic'))
+
+class ExternalRef(db.Model):
+    """Links a record in an integrated system to the local row it was synced to (see app.external_refs)"""
+    id = db.Column(db.Integer, primary_key=True)
+    source = db.Column(db.String(50), nullable=False)  # agency-crm, tv-planner
+    entity_type = db.Column(db.String(50), nullable=False)  # company, brand, contact, invoice, status_update, campaign, wave
+    external_id = db.Column(db.String(100), nullable=False)
+    local_id = db.Column(db.Integer, nullable=False)  # Row id in the table for entity_type
+    content_hash = db.Column(db.String(64))  # Of the record as last applied; unchanged records are skipped
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('source', 'entity_type', 'external_id', name='uq_external_ref'),
+        db.Index('ix_external_ref_local', 'entity_type', 'local_id'),
+    )
+
+class SyncState(db.Model):
+    """High-water mark of incremental pulls of one resource from an integrated system"""
+    id = db.Column(db.Integer, primary_key=True)
+    source = db.Column(db.String(50), nullable=False)  # agency-crm
+    resource = db.Column(db.String(50), nullable=False)  # companies, brands, contacts
+    updated_since = db.Column(db.String(64))  # Newest updated_at seen, sent back as ?updated_since=
+    etag = db.Column(db.String(200))  # ETag of the last response, sent as If-None-Match
+    last_synced_at = db.Column(db.DateTime)
+    
+    __table_args__ = (db.UniqueConstraint('source', 'resource', name='uq_sync_state'),)
+
+class SyncRun(db.Model):
+    """One run of an integration sync (scheduled or queued), also used as the per-source lock"""
+    id = db.Column(db.Integer, primary_key=True)
+    source = db.Column(db.String(50), nullable=False)  # agency-crm, tv-planner
+    trigger = db.Column(db.String(20), nullable=False, default='scheduled')  # scheduled, job, manual
+    status = db.Column(db.String(20), nullable=False, default='running')  # running, completed, failed
+    started_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    duration_ms = db.Column(db.Integer)
+    counts = db.Column(db.JSON)  # Rows fetched/changed per resource
+    error = db.Column(db.Text)
+    
+    __table_args__ = (db.Index('ix_sync_run_source_started', 'source', 'started_at'),)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'source': self.source,
+            'trigger': self.trigger,
+            'status': self.status,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'duration_ms': self.duration_ms,
+            'counts': self.counts or {},
+            'error': self.error
+        }
+
+class Job(db.Model):
+    """Background job (CSV imports etc.) processed outside the request"""
+    id = db.Column(db.Integer, primary_key=True)
+    job_type = db.Column(db.String(50), nullable=False)  # csv_import
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)  # queued, running, completed, failed
+    params = db.Column(db.JSON)  # Handler arguments, e.g. the uploaded file path
+    progress = db.Column(db.JSON)  # Live counters reported by the handler
+    message = db.Column(db.Text)  # Result or error message
+    created_by_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    created_by = db.relationship('User', backref='jobs')
+    
+    @property
+    def is_finished(self):
+        return self.status in ('completed', 'failed')
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'job_type': self.job_type,
+            'status': self.status,
+            'progress': self.progress or {},
+            'message': self.message,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+class ReportExport(db.Model):
+    """Report file written by a report_export job, downloadable until expires_at"""
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.Integer, db.ForeignKey('job.id'), nullable=True)  # Set once the job is queued
+    created_by_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    report_type = db.Column(db.String(50), nullable=False)  # advertisers, activities
+    format = db.Column(db.String(10), nullable=False)  # csv, xlsx
+    filters = db.Column(db.JSON)  # As returned by app.exports.export_filters
+    compressed = db.Column(db.Boolean, default=False)  # gzip
+    params_hash = db.Column(db.String(64), nullable=False)  # Identical requests share an export
+    filename = db.Column(db.String(255))  # Download name
+    file_path = db.Column(db.String(500))  # Under UPLOAD_FOLDER, once written
+    row_count = db.Column(db.Integer)
+    size_bytes = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, index=True)
+    
+    job = db.relationship('Job')
+    
+    __table_args__ = (db.Index('ix_report_export_hash_created', 'params_hash', 'created_at'),)
+    
+    @property
+    def status(self):
+        return self.job.status if self.job else 'queued'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'job_id': self.job_id,
+            'status': self.status,
+            'message': self.job.message if self.job else None,
+            'report_type': self.report_type,
+            'format': self.format,
+            'filters': self.filters or {},
+            'compressed': self.compressed,
+            'filename': self.filename,
+            'row_count': self.row_count,
+            'size_bytes': self.size_bytes,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None
+        }
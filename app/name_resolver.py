@@ -0,0 +1,337 @@
+"""
+In-memory advertiser name resolution for the integrations.
+Brand, company and campaign names coming from Agency CRM and TV Planner are
+matched against an index of normalized advertiser names (casefolded,
+diacritics, punctuation and legal suffixes such as UAB/SIA/AB removed), the
+" - " and "(...)" parts of names, and their words, instead of one
+LIKE '%name%' scan per lookup. Names that match several advertisers are
+reported as ambiguous rather than resolved to whichever row comes first.
+
+The shared index follows advertiser changes made through the ORM in this
+process once they are committed; until then a session sees its own flushed
+changes layered on top (PendingNameIndex), and other threads don't see them.
+Bulk statements drop the index, and ADVERTISER_RESOLVER_TTL bounds how stale
+it can get when other processes add advertisers.
+"""
+
+import difflib
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, defaultdict, deque
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+from app.models import db, Advertiser
+
+# Company-form words ignored when comparing names (Baltic forms plus common foreign ones)
+LEGAL_SUFFIXES = {'uab', 'ab', 'mb', 'ii', 'vsi', 'zub', 'sia', 'as', 'ou', 'ltd', 'llc', 'inc', 'gmbh', 'oy'}
+
+FUZZY_CUTOFF = 0.85  # Minimum difflib ratio for a fuzzy match
+FUZZY_CANDIDATES = 50  # Advertisers sharing the most words that are compared
+
+def normalize_name(name):
+    """Casefolded words of ``name`` without diacritics, punctuation or legal suffixes."""
+    text = unicodedata.normalize('NFKD', name or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch)).casefold()
+    words = re.findall(r'\w+', text)
+    # "AB" alone is a name, not a suffix
+    return ' '.join([word for word in words if word not in LEGAL_SUFFIXES] or words)
+
+def name_segments(name):
+    """Normalized parts of a "Company - Brand" or "Brand (Company)" name."""
+    parts = (normalize_name(part) for part in re.split(r'\s+-\s+|[()]', name or ''))
+    return {part for part in parts if part}
+
+class NameMatch:
+    """Outcome of resolving one name: zero, one or several advertiser ids."""
+
+    def __init__(self, name, advertiser_ids=(), method=None):
+        self.name = name
+        self.advertiser_ids = sorted(advertiser_ids)
+        self.method = method  # 'exact', 'segment', 'contains' or 'fuzzy'
+
+    @property
+    def advertiser_id(self):
+        return self.advertiser_ids[0] if len(self.advertiser_ids) == 1 else None
+
+    @property
+    def ambiguous(self):
+        return len(self.advertiser_ids) > 1
+
+class NameIndex:
+    """Lookup tables over (id, name) of all advertisers."""
+
+    def __init__(self, rows):
+        self.names = {}
+        self.normalized = {}
+        self.by_name = defaultdict(set)
+        self.by_segment = defaultdict(set)
+        self.by_word = defaultdict(set)
+        self.built_at = time.monotonic()
+        for advertiser_id, name in rows:
+            self.add(advertiser_id, name)
+
+    def add(self, advertiser_id, name):
+        key = normalize_name(name)
+        self.names[advertiser_id] = name
+        self.normalized[advertiser_id] = key
+        self.by_name[key].add(advertiser_id)
+        for segment in name_segments(name):
+            self.by_segment[segment].add(advertiser_id)
+        for word in key.split():
+            self.by_word[word].add(advertiser_id)
+
+    def apply(self, changes):
+        """Apply (advertiser_id, name) changes; a name of None removes the advertiser."""
+        for advertiser_id, name in changes:
+            self.remove(advertiser_id)
+            if name is not None:
+                self.add(advertiser_id, name)
+
+    def ids(self, table, key):
+        """Ids under ``key`` in the by_name, by_segment or by_word table."""
+        return getattr(self, table).get(key, set())
+
+    def name_of(self, advertiser_id):
+        return self.names[advertiser_id]
+
+    def normalized_of(self, advertiser_id):
+        return self.normalized[advertiser_id]
+
+    def remove(self, advertiser_id):
+        name = self.names.pop(advertiser_id, None)
+        if name is None:
+            return
+        key = self.normalized.pop(advertiser_id)
+        self.by_name[key].discard(advertiser_id)
+        for segment in name_segments(name):
+            self.by_segment[segment].discard(advertiser_id)
+        for word in key.split():
+            self.by_word[word].discard(advertiser_id)
+
+    def resolve(self, name, partial=True):
+        key = normalize_name(name)
+        if not key:
+            return NameMatch(name)
+
+        ids = self.ids('by_name', key)
+        if ids:
+            return self._pick(name, ids, 'exact')
+        if not partial:
+            return NameMatch(name)
+
+        # One part of a "Company - Brand" name
+        ids = self.ids('by_segment', key)
+        if ids:
+            return self._pick(name, ids, 'segment')
+
+        # All words, in order, somewhere in the name (the old LIKE '%name%')
+        words = key.split()
+        ids = set.intersection(*(self.ids('by_word', word) for word in words))
+        ids = {i for i in ids if f' {key} ' in f' {self.normalized_of(i)} '}
+        if ids:
+            return self._pick(name, ids, 'contains')
+
+        # Near misses (typos, spacing) among advertisers sharing the most words
+        shared = Counter(i for word in set(words) for i in self.ids('by_word', word))
+        scores = {
+            i: difflib.SequenceMatcher(None, key, self.normalized_of(i)).ratio()
+            for i, _ in shared.most_common(FUZZY_CANDIDATES)
+        }
+        best = max(scores.values(), default=0)
+        if best >= FUZZY_CUTOFF:
+            return self._pick(name, {i for i, score in scores.items() if score == best}, 'fuzzy')
+
+        return NameMatch(name)
+
+    def _pick(self, name, ids, method):
+        if len(ids) > 1:
+            # An advertiser with exactly this name wins over normalized look-alikes
+            exact = [i for i in ids if self.name_of(i) == name]
+            if len(exact) == 1:
+                ids = exact
+        return NameMatch(name, ids, method)
+
+class PendingNameIndex(NameIndex):
+    """The shared index with one session's flushed, uncommitted changes on top."""
+
+    def __init__(self, base):
+        super().__init__(())
+        self.base = base
+        self.changed = set()  # Ids whose base entry is replaced or removed
+        self.applied = 0  # Changes of the session applied so far
+
+    def apply(self, changes):
+        for advertiser_id, name in changes:
+            self.changed.add(advertiser_id)
+        super().apply(changes)
+        self.applied += len(changes)
+
+    def ids(self, table, key):
+        return (self.base.ids(table, key) - self.changed) | super().ids(table, key)
+
+    def name_of(self, advertiser_id):
+        return self.names[advertiser_id] if advertiser_id in self.names else self.base.name_of(advertiser_id)
+
+    def normalized_of(self, advertiser_id):
+        if advertiser_id in self.normalized:
+            return self.normalized[advertiser_id]
+        return self.base.normalized_of(advertiser_id)
+
+class AdvertiserNameResolver:
+    """Process-wide advertiser name index, built lazily from the database."""
+
+    def __init__(self):
+        self.index = None
+        self.lock = threading.Lock()
+        self.recent_ambiguous = deque(maxlen=100)
+
+    def invalidate(self):
+        with self.lock:
+            self.index = None
+
+    def _get_index(self):
+        ttl = current_app.config.get('ADVERTISER_RESOLVER_TTL', 300)
+        if self.index is None or time.monotonic() - self.index.built_at > ttl:
+            # On its own connection: the session may hold advertisers it hasn't committed
+            with db.engine.connect() as connection:
+                self.index = NameIndex(connection.execute(select(Advertiser.id, Advertiser.name)).all())
+        return self.index
+
+    def _session_index(self, session):
+        """The index as ``session`` sees it: the shared one plus its uncommitted changes."""
+        if session.info.get('advertiser_names_bulk'):
+            # Bulk statements bypass the flush; read this session's names from the database
+            index = session.info.get('advertiser_name_base')
+            if index is None:
+                index = session.info['advertiser_name_base'] = NameIndex(
+                    session.execute(select(Advertiser.id, Advertiser.name)).all()
+                )
+        else:
+            index = self._get_index()
+        changes = [change for transaction, change in session.info.get('advertiser_name_changes', ())]
+        if not changes:
+            return index
+        pending = session.info.get('advertiser_name_index')
+        if pending is None or pending.base is not index or pending.applied > len(changes):
+            pending = session.info['advertiser_name_index'] = PendingNameIndex(index)
+        pending.apply(changes[pending.applied:])
+        return pending
+
+    def resolve(self, name, partial=True):
+        """Match ``name`` to advertisers. Returns a NameMatch.
+
+        With ``partial=False`` only the whole normalized name is compared,
+        for callers that create the advertiser when there is no match.
+        """
+        session = db.session()
+        if session.autoflush:
+            session.flush()  # As a query would, so advertisers added in this session are seen
+        with self.lock:
+            index = self._session_index(session)
+            match = index.resolve(name, partial)
+            names = [index.name_of(i) for i in match.advertiser_ids]
+
+        if match.ambiguous:
+            current_app.logger.warning(f"Ambiguous advertiser name {name!r} ({match.method}): {names}")
+            self.recent_ambiguous.append({
+                'name': name,
+                'method': match.method,
+                'candidates': names,
+                'at': datetime.utcnow().isoformat()
+            })
+        return match
+
+    def apply_committed(self, changes):
+        with self.lock:
+            if self.index is not None:
+                self.index.apply(changes)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'advertisers': len(self.index.names) if self.index else None,
+                'age_seconds': round(time.monotonic() - self.index.built_at) if self.index else None,
+                'recent_ambiguous': list(self.recent_ambiguous)
+            }
+
+advertiser_name_resolver = AdvertiserNameResolver()
+
+def resolve_advertiser(name, partial=True):
+    """The advertiser ``name`` refers to, or None if there is no single match."""
+    advertiser_id = advertiser_name_resolver.resolve(name, partial).advertiser_id
+    return db.session.get(Advertiser, advertiser_id) if advertiser_id else None
+
+def flushed_name_changes(session):
+    """(advertiser_id, name or None) of the advertisers added, renamed or deleted by a flush."""
+    changes = [(obj.id, None) for obj in session.deleted if isinstance(obj, Advertiser)]
+    changes += [(obj.id, obj.name) for obj in session.new if isinstance(obj, Advertiser)]
+    changes += [(obj.id, obj.name) for obj in session.dirty
+                if isinstance(obj, Advertiser) and inspect(obj).attrs.name.history.has_changes()]
+    return changes
+
+@event.listens_for(Session, 'after_flush')
+def queue_name_changes(session, flush_context):
+    # Runs while the advertiser objects still know what changed; the shared
+    # index only gets them once they are committed
+    changes = flushed_name_changes(session)
+    if changes:
+        transaction = session.get_nested_transaction() or session.get_transaction()
+        session.info.setdefault('advertiser_name_changes', []).extend(
+            (transaction, change) for change in changes
+        )
+
+@event.listens_for(Session, 'after_commit')
+def apply_committed_name_changes(session):
+    if session.get_nested_transaction() is not None:
+        return  # A SAVEPOINT released; the changes wait for the real commit
+    changes = session.info.get('advertiser_name_changes')
+    if session.info.get('advertiser_names_bulk'):
+        advertiser_name_resolver.invalidate()
+    elif changes:
+        advertiser_name_resolver.apply_committed([change for transaction, change in changes])
+    forget_session_names(session)
+
+@event.listens_for(Session, 'after_soft_rollback')
+def discard_rolled_back_name_changes(session, previous_transaction):
+    # A rollback (of the transaction or a SAVEPOINT) discards what was flushed inside it
+    changes = session.info.get('advertiser_name_changes', [])
+    kept = [(transaction, change) for transaction, change in changes
+            if not within(transaction, previous_transaction)]
+    if len(kept) < len(changes):
+        session.info['advertiser_name_changes'] = kept
+        session.info.pop('advertiser_name_index', None)
+    session.info.pop('advertiser_name_base', None)
+
+@event.listens_for(Session, 'after_transaction_end')
+def forget_session_names_at_end(session, transaction):
+    # Nothing survives the end of the outermost transaction (e.g. Session.close())
+    if transaction.parent is None:
+        forget_session_names(session)
+
+def forget_session_names(session):
+    for key in ('advertiser_name_changes', 'advertiser_name_index', 'advertiser_name_base', 'advertiser_names_bulk'):
+        session.info.pop(key, None)
+
+def within(transaction, ancestor):
+    """Whether ``transaction`` is ``ancestor`` or nested in it."""
+    while transaction is not None:
+        if transaction is ancestor:
+            return True
+        transaction = transaction.parent
+    return False
+
+@event.listens_for(Session, 'do_orm_execute')
+def drop_name_index_on_bulk_change(orm_execute_state):
+    # insert(Advertiser) / delete(Advertiser) bypass the flush: the shared index
+    # is rebuilt once they are committed. Renames in bulk updates must call
+    # advertiser_name_resolver.invalidate() themselves
+    if (orm_execute_state.is_insert or orm_execute_state.is_delete) and \
+            orm_execute_state.bind_mapper is inspect(Advertiser):
+        session = orm_execute_state.session
+        session.info['advertiser_names_bulk'] = True
+        session.info.pop('advertiser_name_base', None)
+        session.info.pop('advertiser_name_index', None)
@@ -0,0 +1,107 @@
+"""
+Keyset (cursor) pagination for list views.
+Seeks on (sort columns..., id) instead of using OFFSET and never runs a
+COUNT(*), so a deep page costs the same as the first one.
+"""
+
+import base64
+import binascii
+import json
+from datetime import datetime
+from sqlalchemy import DateTime, tuple_
+
+class KeysetPage:
+    """One page of results plus opaque cursors for the neighbouring pages."""
+
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def to_dict(self, serialize):
+        return {
+            'items': [serialize(item) for item in self.items],
+            'per_page': self.per_page,
+            'next_cursor': self.next_cursor,
+            'prev_cursor': self.prev_cursor
+        }
+
+def encode_cursor(values):
+    """Encode sort key values as a URL-safe cursor string."""
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, columns):
+    """Decode a cursor back into sort key values. Returns None if it's invalid."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, binascii.Error):
+        return None
+
+    if not isinstance(values, list) or len(values) != len(columns):
+        return None
+
+    decoded = []
+    for column, value in zip(columns, values):
+        if value is not None and isinstance(column.type, DateTime):
+            try:
+                value = datetime.fromisoformat(value)
+            except (TypeError, ValueError):
+                return None
+        decoded.append(value)
+    return decoded
+
+def keyset_paginate(query, columns, after=None, before=None, per_page=50, descending=False, key=None):
+    """Return a KeysetPage of ``query`` ordered by ``columns``.
+
+    ``columns`` must end with a unique column (the id) and must not be NULL.
+    ``after``/``before`` are cursors from a previous page. ``key(item)``
+    returns the sort values of a result row; by default they are read from
+    the row's attributes named like the columns. The query must not have an
+    ORDER BY of its own.
+    """
+    if key is None:
+        key = lambda item: tuple(getattr(item, column.key) for column in columns)
+
+    cursor = after or before
+    values = decode_cursor(cursor, columns) if cursor else None
+    backwards = values is not None and not after
+
+    if values is not None:
+        # Moving forward in a descending list means smaller keys
+        if descending != backwards:
+            query = query.filter(tuple_(*columns) < tuple_(*values))
+        else:
+            query = query.filter(tuple_(*columns) > tuple_(*values))
+
+    if descending != backwards:
+        query = query.order_by(*[column.desc() for column in columns])
+    else:
+        query = query.order_by(*[column.asc() for column in columns])
+
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if backwards:
+            next_cursor = encode_cursor(key(rows[-1]))
+            prev_cursor = encode_cursor(key(rows[0])) if has_more else None
+        else:
+            next_cursor = encode_cursor(key(rows[-1])) if has_more else None
+            prev_cursor = encode_cursor(key(rows[0])) if values is not None else None
+
+    return KeysetPage(rows, per_page, next_cursor=next_cursor, prev_cursor=prev_cursor)
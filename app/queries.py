@@ -0,0 +1,55 @@
+"""
+Eager-loading queries for list views.
+Each builder loads the relationships its templates render, so a page costs
+a fixed number of statements instead of one lazy load per row.
+check_query_budgets.py keeps the pages honest.
+"""
+
+from sqlalchemy.orm import joinedload, selectinload
+from app.models import Activity, Advertiser, Contact, LeadStatusHistory
+
+# Lead statuses shown as "needing attention" on the home page
+OPEN_LEAD_STATUSES = ['hot', 'warm', 'cold', 'get_info']
+
+def activity_list_query(query=None):
+    """Activities with their advertiser, user, contact and attachments."""
+    if query is None:
+        query = Activity.query
+    return query.options(
+        joinedload(Activity.advertiser),
+        joinedload(Activity.user),
+        joinedload(Activity.contact),
+        selectinload(Activity.attachments)
+    )
+
+def advertiser_list_query(query=None):
+    """Advertisers with their assigned user."""
+    if query is None:
+        query = Advertiser.query
+    return query.options(joinedload(Advertiser.assigned_user))
+
+def contact_list_query(query=None):
+    """Contacts with their primary and linked advertisers and who added them."""
+    if query is None:
+        query = Contact.query
+    return query.options(
+        joinedload(Contact.advertiser),
+        joinedload(Contact.added_by),
+        selectinload(Contact.linked_advertisers)
+    )
+
+def status_history_query(query=None):
+    """Lead status changes with the user who made them."""
+    if query is None:
+        query = LeadStatusHistory.query
+    return query.options(joinedload(LeadStatusHistory.changed_by_user))
+
+def open_leads_query():
+    """Open leads with their assigned user, longest without activity first."""
+    # Never-contacted leads (NULL) sort first; served by the (lead_status, last_activity_at) index
+    return advertiser_list_query().filter(
+        Advertiser.lead_status.in_(OPEN_LEAD_STATUSES)
+    ).order_by(
+        Advertiser.last_activity_at.asc(),
+        Advertiser.id
+    )
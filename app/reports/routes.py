@@ -1,19 +1,22 @@
-from flask import render_template, request, make_response
+from flask import render_template, redirect, url_for, flash, request, jsonify, Response, stream_with_context, send_file, abort
 from flask_login import login_required, current_user
 import plotly.graph_objs as go
 import plotly.utils
 import json
-import pandas as pd
-from io import BytesIO
 from app import db
 from app.reports import bp
-from app.models import Advertiser, SpendingData, Activity, User, LeadStatusHistory
+from app.models import Advertiser, Activity, User, LeadStatusHistory, ReportExport
+from app.aggregate_cache import aggregate_cache
+from app.channel_analytics import channel_analytics, spending_years
+from app.spending_cube import spending_cube, DIMENSIONS
+from app.exports import EXPORT_FORMATS, export_filename, export_filters, export_query, iter_export
+from app.export_jobs import request_export, download_token, export_from_token
+from app.utils import wants_json
 from sqlalchemy import func, desc
-from datetime import datetime, timedelta
+from datetime import timedelta
 
-@bp.route('/dashboard')
-@login_required
-def dashboard():
+def dashboard_charts():
+    """Plotly JSON of the lead pipeline and yearly spending charts."""
     # Lead pipeline data
     lead_pipeline = db.session.query(
         Advertiser.lead_status,
@@ -38,24 +41,12 @@ def dashboard():
         showlegend=False
     )
     
-    # Team performance data
-    if current_user.is_team_lead():
-        team_performance = db.session.query(
-            User.username,
-            func.count(Activity.id).label('activity_count')
-        ).join(Activity).group_by(User.id).order_by(desc('activity_count')).limit(10).all()
-    else:
-        team_performance = []
-    
-    # Spending trends by year
-    spending_trends = db.session.query(
-        SpendingData.year,
-        func.sum(SpendingData.grand_total).label('total')
-    ).group_by(SpendingData.year).order_by(SpendingData.year).all()
+    # Spending trends by year, from the in-memory spending cube
+    spending_trends = spending_cube.query(group_by=['year'], measures=['grand_total'])
     
     if spending_trends:
-        years = [str(item[0]) for item in spending_trends]
-        totals = [item[1] for item in spending_trends]
+        years = [str(item['year']) for item in spending_trends]
+        totals = [item['grand_total'] for item in spending_trends]
         
         spending_chart = go.Figure(data=[
             go.Scatter(
@@ -76,12 +67,31 @@ def dashboard():
         spending_chart = None
     
     # Convert charts to JSON
-    pipeline_json = json.dumps(pipeline_chart, cls=plotly.utils.PlotlyJSONEncoder)
-    spending_json = json.dumps(spending_chart, cls=plotly.utils.PlotlyJSONEncoder) if spending_chart else None
+    return {
+        'pipeline_json': json.dumps(pipeline_chart, cls=plotly.utils.PlotlyJSONEncoder),
+        'spending_json': json.dumps(spending_chart, cls=plotly.utils.PlotlyJSONEncoder) if spending_chart else None
+    }
+
+@bp.route('/dashboard')
+@login_required
+def dashboard():
+    # Charts and team figures are cached until the underlying rows change
+    charts = aggregate_cache.get_or_compute('reports:dashboard:charts', ['advertiser', 'spending'], dashboard_charts)
+    
+    # Team performance data
+    if current_user.is_team_lead():
+        team_performance = aggregate_cache.get_or_compute('reports:dashboard:team', ['activity'], lambda: [
+            list(row) for row in db.session.query(
+                User.username,
+                func.count(Activity.id).label('activity_count')
+            ).join(Activity).group_by(User.id).order_by(desc('activity_count')).limit(10)
+        ])
+    else:
+        team_performance = []
     
     return render_template('reports/dashboard.html',
-                         pipeline_json=pipeline_json,
-                         spending_json=spending_json,
+                         pipeline_json=charts['pipeline_json'],
+                         spending_json=charts['spending_json'],
                          team_performance=team_performance)
 
 @bp.route('/export')
@@ -91,83 +101,101 @@ def export_data():
         flash('Only team leads and admins can export data.', 'warning')
         return redirect(url_for('main.index'))
     
-    # Get filter parameters
-    format_type = request.args.get('format', 'csv')
+    # Get filter parameters; anything but CSV is Excel
+    format_type = 'csv' if request.args.get('format', 'csv') == 'csv' else 'xlsx'
     report_type = request.args.get('type', 'advertisers')
     
-    if report_type == 'advertisers':
-        # Export advertisers with spending data
-        advertisers = db.session.query(
-            Advertiser.name,
-            Advertiser.current_agency,
-            Advertiser.lead_status,
-            User.username.label('assigned_to'),
-            func.sum(SpendingData.grand_total).label('total_spending')
-        ).outerjoin(User, Advertiser.assigned_user_id == User.id
-        ).outerjoin(SpendingData
-        ).group_by(Advertiser.id).all()
-        
-        df = pd.DataFrame(advertisers)
-        
-    elif report_type == 'activities':
-        # Export recent activities
-        activities = db.session.query(
-            Activity.created_at,
-            User.username,
-            Advertiser.name.label('advertiser'),
-            Activity.activity_type,
-            Activity.description,
-            Activity.outcome
-        ).join(User).join(Advertiser).order_by(
-            Activity.created_at.desc()
-        ).limit(1000).all()
-        
-        df = pd.DataFrame(activities)
-    
-    # Generate file
-    output = BytesIO()
-    if format_type == 'csv':
-        df.to_csv(output, index=False)
-        mimetype = 'text/csv'
-        filename = f'{report_type}_export_{datetime.now().strftime("%Y%m%d")}.csv'
-    else:  # Excel
-        df.to_excel(output, index=False)
-        mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        filename = f'{report_type}_export_{datetime.now().strftime("%Y%m%d")}.xlsx'
-    
-    output.seek(0)
-    response = make_response(output.read())
-    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
-    response.headers['Content-Type'] = mimetype
+    try:
+        stmt = export_query(report_type, export_filters(report_type, request.args))
+    except ValueError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('reports.dashboard'))
+    
+    # Rows are fetched and written while the response is sent (see app.exports)
+    response = Response(stream_with_context(iter_export(stmt, format_type)),
+                        mimetype=EXPORT_FORMATS[format_type])
+    response.headers['Content-Disposition'] = f'attachment; filename={export_filename(report_type, format_type)}'
     
     return response
 
+def export_status_dict(export):
+    data = export.to_dict()
+    data['status_url'] = url_for('reports.export_status', id=export.id)
+    if export.status == 'completed' and export.file_path:
+        data['download_url'] = url_for('reports.download_export', token=download_token(export))
+    return data
+
+@bp.route('/exports', methods=['POST'])
+@login_required
+def request_export_job():
+    """Export in the background: same type/format/filters as /export, plus compress=1 for gzip."""
+    if not current_user.is_team_lead():
+        if wants_json():
+            return jsonify({'error': 'Unauthorized'}), 403
+        flash('Only team leads and admins can export data.', 'warning')
+        return redirect(url_for('main.index'))
+    
+    report_type = request.values.get('type', 'advertisers')
+    format_type = request.values.get('format', 'csv')
+    try:
+        export, created = request_export(report_type, format_type, export_filters(report_type, request.values),
+                                         current_user.id, compress=request.values.get('compress') in ('1', 'true', 'on'))
+    except ValueError as e:
+        if wants_json():
+            return jsonify({'error': str(e)}), 400
+        flash(str(e), 'danger')
+        return redirect(url_for('reports.dashboard'))
+    
+    if export is None:
+        message = 'You already have exports running; wait for one to finish.'
+        if wants_json():
+            return jsonify({'error': message}), 429
+        flash(message, 'warning')
+        return redirect(url_for('reports.dashboard'))
+    
+    if wants_json():
+        return jsonify(export_status_dict(export)), 202 if created else 200
+    
+    flash('Export started.' if created else 'An identical export was requested recently; here it is.', 'info')
+    return redirect(url_for('reports.export_status', id=export.id))
+
+@bp.route('/exports/<int:id>')
+@login_required
+def export_status(id):
+    """Status of a background export and, once written, its download link."""
+    export = ReportExport.query.get_or_404(id)
+    if export.created_by_id != current_user.id and not current_user.is_admin():
+        if wants_json():
+            return jsonify({'error': 'Unauthorized'}), 403
+        flash('You can only view your own exports.', 'warning')
+        return redirect(url_for('reports.dashboard'))
+    
+    if wants_json():
+        return jsonify(export_status_dict(export))
+    return render_template('reports/export_job.html', export=export, export_data=export_status_dict(export))
+
+@bp.route('/exports/download/<token>')
+def download_export(token):
+    """Download an export file. The signed token is the credential, so links can be shared until they expire."""
+    export = export_from_token(token)
+    if export is None:
+        abort(404)
+    
+    mimetype = 'application/gzip' if export.compressed else EXPORT_FORMATS[export.format]
+    return send_file(export.file_path, mimetype=mimetype, as_attachment=True, download_name=export.filename)
+
 @bp.route('/spending_analysis')
 @login_required
 def spending_analysis():
-    # Get top advertisers by channel
-    channels = ['cinema', 'billboard', 'indoor_tv', 'internet', 'magazines', 
-                'newspapers', 'outdoor_static', 'radio', 'tv']
-    
-    channel_data = {}
-    for channel in channels:
-        query = db.session.query(
-            Advertiser.name,
-            func.sum(getattr(SpendingData, channel)).label('total')
-        ).join(SpendingData).group_by(
-            Advertiser.id
-        ).order_by(desc('total')).limit(5).all()
-        
-        channel_data[channel] = query
+    year = request.args.get('year', type=int)
     
-    # Create channel comparison chart
-    channel_totals = []
-    for channel in channels:
-        total = db.session.query(
-            func.sum(getattr(SpendingData, channel))
-        ).scalar() or 0
-        channel_totals.append((channel.replace('_', ' ').title(), total))
+    # Totals and top 5 advertisers of every channel in one query
+    analytics = channel_analytics(year=year, top_n=5)
+    channel_data = analytics['top']
     
+    # Create channel comparison chart
+    channel_totals = [(channel.replace('_', ' ').title(), total)
+                      for channel, total in analytics['totals'].items()]
     channel_totals.sort(key=lambda x: x[1], reverse=True)
     
     channel_chart = go.Figure(data=[
@@ -188,4 +216,42 @@ def spending_analysis():
     
     return render_template('reports/spending_analysis.html',
                          channel_data=channel_data,
-                         channel_json=channel_json)
\ No newline at end of file
+                         channel_json=channel_json,
+                         years=spending_years(),
+                         selected_year=year)
+
+@bp.route('/api/cube')
+@login_required
+def api_spending_cube():
+    """Spending summed by any of year, advertiser_id, agency, lead_status, assigned_user_id and channel.
+    
+    e.g. ?group_by=year,lead_status&measures=tv,grand_total&lead_status=hot,warm&sort=grand_total&limit=20
+    """
+    if not current_user.is_team_lead():
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    def names(arg, default=''):
+        return [name for name in request.args.get(arg, default).split(',') if name]
+    
+    filters = {dimension: names(dimension) for dimension in DIMENSIONS if request.args.get(dimension)}
+    try:
+        rows = spending_cube.query(
+            group_by=names('group_by'),
+            measures=names('measures', 'grand_total'),
+            filters=filters,
+            sort=request.args.get('sort') or None,
+            limit=request.args.get('limit', type=int)
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({'rows': rows, 'cube': spending_cube.stats()})
+
+@bp.route('/api/cube/dimensions')
+@login_required
+def api_spending_cube_dimensions():
+    """Values of the spending cube dimensions, for building filters."""
+    if not current_user.is_team_lead():
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    return jsonify(spending_cube.dimensions())
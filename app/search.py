@@ -0,0 +1,160 @@
+"""
+Full-text search over advertisers, contacts and activities using SQLite FTS5.
+Each *_fts table is an external-content index over its source table, kept in
+sync by triggers so bulk inserts and raw SQL updates are indexed as well.
+When the index doesn't exist (another database, or add_search_index.py hasn't
+been run yet) the filters fall back to the old LIKE queries.
+"""
+
+import re
+from sqlalchemy import column, or_, select, table, text
+from app.models import db, Advertiser, Contact, Activity
+
+# model -> (fts table, indexed columns)
+SEARCH_INDEXES = {
+    Advertiser: ('advertiser_fts', ['name', 'current_agency']),
+    Contact: ('contact_fts', ['first_name', 'last_name', 'email']),
+    Activity: ('activity_fts', ['description', 'outcome'])
+}
+
+# Fold case and Lithuanian diacritics, so "zalgiris" finds "Žalgiris"
+TOKENIZER = 'unicode61 remove_diacritics 2'
+
+# Database URLs where the index is known to exist
+_available = set()
+
+def _index_ddl(source, fts, columns):
+    cols = ', '.join(columns)
+    new = ', '.join(f'new.{c}' for c in columns)
+    old = ', '.join(f'old.{c}' for c in columns)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, content='{source}', "
+        f"content_rowid='id', tokenize='{TOKENIZER}', prefix='2 3')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {source} BEGIN "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {source} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {source} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END"
+    ]
+
+def create_search_index(rebuild=True):
+    """Create the FTS tables and sync triggers, and (re)index existing rows."""
+    for model, (fts, columns) in SEARCH_INDEXES.items():
+        for statement in _index_ddl(model.__tablename__, fts, columns):
+            db.session.execute(text(statement))
+        if rebuild:
+            db.session.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+    db.session.commit()
+    _available.add(str(db.engine.url))
+
+def search_available():
+    """True if the FTS index exists in the current database."""
+    url = str(db.engine.url)
+    if url in _available:
+        return True
+    if db.engine.dialect.name != 'sqlite':
+        return False
+
+    exists = db.session.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'activity_fts'"
+    )).first()
+    if exists:
+        _available.add(url)
+    return exists is not None
+
+def build_match_query(search, columns=None):
+    """Turn free text into an FTS5 query: every word must match as a prefix.
+
+    Returns None if the text contains no searchable words.
+    """
+    words = re.findall(r'\w+', search or '')
+    if not words:
+        return None
+    query = ' '.join(f'"{word}"*' for word in words)
+    if columns:
+        query = '{%s} : (%s)' % (' '.join(columns), query)
+    return query
+
+# Lightweight table objects for querying the indexes
+FTS_TABLES = {
+    model: table(fts, column('rowid'), column('rank'), column(fts))
+    for model, (fts, _) in SEARCH_INDEXES.items()
+}
+
+def matching_ids(model, search, columns=None):
+    """SELECT of the ids of ``model`` rows matching ``search``."""
+    fts = FTS_TABLES[model]
+    match = build_match_query(search, columns)
+    return select(fts.c.rowid).where(fts.c[fts.name].op('MATCH')(match))
+
+def advertiser_search_filter(search):
+    """Filter condition for advertisers matching by name or agency."""
+    if search_available() and build_match_query(search):
+        return Advertiser.id.in_(matching_ids(Advertiser, search))
+
+    return or_(
+        Advertiser.name.ilike(f'%{search}%'),
+        Advertiser.current_agency.ilike(f'%{search}%')
+    )
+
+def contact_search_filter(search):
+    """Filter condition for contacts matching by name, email or advertiser name."""
+    if search_available() and build_match_query(search):
+        return or_(
+            Contact.id.in_(matching_ids(Contact, search)),
+            Contact.advertiser_id.in_(matching_ids(Advertiser, search, ['name']))
+        )
+
+    return or_(
+        Contact.first_name.contains(search),
+        Contact.last_name.contains(search),
+        Contact.email.contains(search),
+        Contact.advertiser_id.in_(select(Advertiser.id).where(Advertiser.name.contains(search)))
+    )
+
+def activity_search_filter(search):
+    """Filter condition for activities matching by text, advertiser or contact name."""
+    if search_available() and build_match_query(search):
+        return or_(
+            Activity.id.in_(matching_ids(Activity, search)),
+            Activity.advertiser_id.in_(matching_ids(Advertiser, search, ['name'])),
+            Activity.contact_id.in_(matching_ids(Contact, search, ['first_name', 'last_name']))
+        )
+
+    return or_(
+        Activity.description.contains(search),
+        Activity.outcome.contains(search),
+        Activity.advertiser_id.in_(select(Advertiser.id).where(Advertiser.name.contains(search))),
+        Activity.contact_id.in_(select(Contact.id).where(or_(
+            Contact.first_name.contains(search),
+            Contact.last_name.contains(search)
+        )))
+    )
+
+def ranked_search(model, search, limit=20, query=None):
+    """Return up to ``limit`` rows of ``model`` matching ``search``, best match first.
+
+    ``query`` narrows the candidates (e.g. to the user's own advertisers).
+    Ranked by FTS5's bm25 score; without the index results come back unranked.
+    """
+    if query is None:
+        query = model.query
+
+    if not build_match_query(search):
+        return []
+
+    if not search_available():
+        filters = {
+            Advertiser: advertiser_search_filter,
+            Contact: contact_search_filter,
+            Activity: activity_search_filter
+        }
+        return query.filter(filters[model](search)).limit(limit).all()
+
+    fts = FTS_TABLES[model]
+    ranked = matching_ids(model, search).add_columns(fts.c.rank).subquery()
+    return query.join(ranked, model.id == ranked.c.rowid).order_by(
+        ranked.c.rank, model.id
+    ).limit(limit).all()
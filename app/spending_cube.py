@@ -0,0 +1,447 @@
+"""
+In-process columnar snapshot of spending for ad-hoc reports.
+One row per SpendingData row, held as NumPy arrays: year, advertiser, the
+advertiser's agency, lead status and assigned user (dimensions) and every
+channel, grand_total and calculated_net_total (measures). query() filters
+and groups them without going back to SQLite.
+
+Committed changes to spending rows, and to the advertiser columns used as
+dimensions, are logged by advertiser id in the aggregate cache file; each
+worker's cube reloads just those advertisers on its next query. Without an
+aggregate cache (in-memory database, AGGREGATE_CACHE_ENABLED = False) the
+cube is rebuilt after SPENDING_CUBE_TTL seconds instead. Writes outside
+the ORM session (raw SQL, other tools) should call invalidate_spending_cube().
+"""
+
+import sqlite3
+import threading
+import time
+from datetime import datetime
+import numpy as np
+from flask import current_app
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+from app.aggregate_cache import aggregate_cache
+from app.channel_analytics import CHANNELS
+from app.models import db, Advertiser, DiscountRate, SpendingData, User
+
+CHANGE_TAG = 'spending_cube'
+
+MEASURES = CHANNELS + ['grand_total', 'calculated_net_total']
+
+# Numeric dimensions are stored as is, text ones as codes into a category list
+NUMERIC_DIMENSIONS = ['year', 'advertiser_id', 'assigned_user_id']
+TEXT_DIMENSIONS = {'agency': Advertiser.current_agency, 'lead_status': Advertiser.lead_status}
+# 'channel' turns the channel measures into one 'total' per channel
+DIMENSIONS = NUMERIC_DIMENSIONS + list(TEXT_DIMENSIONS) + ['channel']
+
+# Advertiser columns the cube copies; changing them changes the cube
+ADVERTISER_COLUMNS = ['current_agency', 'lead_status', 'assigned_user_id']
+
+# Reload everything when more advertisers than this share changed
+FULL_REFRESH_SHARE = 0.25
+
+# Group by bincount over all key combinations up to this many, else by sorting
+DENSE_GROUPS = 1 << 22
+
+# Keep IN (...) lists well under SQLite's bound parameter limit
+LOAD_BATCH_SIZE = 500
+
+def _rows_query():
+    return select(
+        SpendingData.year,
+        SpendingData.advertiser_id,
+        Advertiser.assigned_user_id,
+        *TEXT_DIMENSIONS.values(),
+        *[getattr(SpendingData, measure) for measure in MEASURES]
+    ).join(Advertiser, Advertiser.id == SpendingData.advertiser_id)
+
+class SpendingCube:
+    """Columnar spending × advertiser attributes, refreshed per changed advertiser."""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.lock = threading.Lock()  # One refresh at a time; queries read the current arrays
+        self.columns = None
+        self.advertiser_count = 0
+        self.categories = {dimension: [None] for dimension in TEXT_DIMENSIONS}
+        self.codes = {dimension: {None: 0} for dimension in TEXT_DIMENSIONS}
+        self.seq = 0
+        self.built_at = None
+        self.refreshed_at = None
+        self._built_monotonic = 0
+        self.full_refreshes = 0
+        self.incremental_refreshes = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['spending_cube'] = self
+
+    def _encode(self, dimension, values):
+        codes = self.codes[dimension]
+        categories = self.categories[dimension]
+        encoded = np.empty(len(values), dtype=np.int32)
+        for i, value in enumerate(values):
+            code = codes.get(value)
+            if code is None:
+                code = codes[value] = len(categories)
+                categories.append(value)
+            encoded[i] = code
+        return encoded
+
+    def _load(self, advertiser_ids=None):
+        """Columns of the spending rows of ``advertiser_ids``, or of all of them."""
+        if advertiser_ids is None:
+            rows = db.session.execute(_rows_query()).all()
+        else:
+            advertiser_ids = sorted(advertiser_ids)
+            rows = []
+            for start in range(0, len(advertiser_ids), LOAD_BATCH_SIZE):
+                batch = advertiser_ids[start:start + LOAD_BATCH_SIZE]
+                rows.extend(db.session.execute(
+                    _rows_query().where(SpendingData.advertiser_id.in_(batch))
+                ).all())
+
+        values = list(zip(*rows)) or [()] * (3 + len(TEXT_DIMENSIONS) + len(MEASURES))
+        columns = {}
+        for i, dimension in enumerate(NUMERIC_DIMENSIONS):
+            # No assigned user is 0
+            columns[dimension] = np.array([value or 0 for value in values[i]], dtype=np.int64)
+        offset = len(NUMERIC_DIMENSIONS)
+        for i, dimension in enumerate(TEXT_DIMENSIONS):
+            columns[dimension] = self._encode(dimension, values[offset + i])
+        offset += len(TEXT_DIMENSIONS)
+        # NULL spending (left by syncs) counts as 0, like SUM() skipping it
+        columns['measures'] = np.nan_to_num(np.array(
+            values[offset:], dtype=np.float64
+        ).reshape(len(MEASURES), len(rows)).T)
+        return columns
+
+    def _change_log_seq(self):
+        """Current seq of the shared change log, or None when there is none."""
+        if not aggregate_cache.enabled:
+            return None
+        try:
+            return aggregate_cache.changes_since(CHANGE_TAG, 0)[0]
+        except sqlite3.Error as e:
+            current_app.logger.warning(f"Spending cube change log unavailable: {e}")
+            return None
+
+    def rebuild(self):
+        """Reload every spending row."""
+        with self.lock:
+            self._rebuild()
+
+    def _rebuild(self):
+        # Read the log position first: changes committed while loading are applied again later
+        self.seq = self._change_log_seq()
+        self.categories = {dimension: [None] for dimension in TEXT_DIMENSIONS}
+        self.codes = {dimension: {None: 0} for dimension in TEXT_DIMENSIONS}
+        self.columns = self._load()
+        self.advertiser_count = len(np.unique(self.columns['advertiser_id']))
+        self.built_at = self.refreshed_at = datetime.utcnow()
+        self._built_monotonic = time.monotonic()
+        self.full_refreshes += 1
+
+    def _apply(self, advertiser_ids):
+        """Replace the rows of ``advertiser_ids`` with their current spending."""
+        ids = np.fromiter(advertiser_ids, dtype=np.int64)
+        keep = ~np.isin(self.columns['advertiser_id'], ids)
+        fresh = self._load(advertiser_ids)
+        self.columns = {
+            name: np.concatenate([column[keep], fresh[name]])
+            for name, column in self.columns.items()
+        }
+        self.refreshed_at = datetime.utcnow()
+        self.incremental_refreshes += 1
+
+    def refresh(self):
+        """Bring the cube up to date with committed changes.
+
+        Returns (columns, categories, codes) as of now; a later refresh
+        replaces them instead of changing them, so they stay consistent.
+        """
+        with self.lock:
+            if self.columns is None:
+                self._rebuild()
+            elif self.seq is None:
+                # No change log to follow
+                if time.monotonic() - self._built_monotonic > self.app.config.get('SPENDING_CUBE_TTL', 600):
+                    self._rebuild()
+            else:
+                self._catch_up()
+            return self.columns, self.categories, self.codes
+
+    def _catch_up(self):
+        try:
+            seq, advertiser_ids = aggregate_cache.changes_since(CHANGE_TAG, self.seq)
+        except sqlite3.Error as e:
+            current_app.logger.warning(f"Spending cube change log unavailable: {e}")
+            return
+        if advertiser_ids is None or len(advertiser_ids) > FULL_REFRESH_SHARE * self.advertiser_count:
+            self._rebuild()
+        else:
+            if advertiser_ids:
+                self._apply(advertiser_ids)
+            self.seq = seq
+
+    def _filter_mask(self, columns, codes, filters):
+        mask = np.ones(len(columns['year']), dtype=bool)
+        for dimension, values in filters.items():
+            if dimension == 'channel':
+                continue
+            if dimension in TEXT_DIMENSIONS:
+                mask &= np.isin(columns[dimension], [codes[dimension][value] for value in values
+                                                     if value in codes[dimension]])
+            else:
+                mask &= np.isin(columns[dimension], [int(value) for value in values])
+        return mask
+
+    def query(self, group_by=(), measures=('grand_total',), filters=None, sort=None, limit=None):
+        """Sums of ``measures`` per combination of ``group_by`` dimension values.
+
+        ``filters`` maps dimensions to the values to keep (lead statuses,
+        years, user ids; 0 is no assigned user). Grouping or filtering by
+        'channel' returns one 'total' per channel instead of ``measures``.
+        Rows are ordered by ``sort`` (a measure, largest first) or else by
+        their group values. Raises ValueError for unknown names.
+        """
+        group_by = list(group_by)
+        filters = dict(filters or {})
+        unknown = [name for name in (*group_by, *filters) if name not in DIMENSIONS]
+        if unknown:
+            raise ValueError(f"Unknown dimension: {', '.join(unknown)}")
+        by_channel = 'channel' in group_by or 'channel' in filters
+        if by_channel:
+            unknown = [name for name in filters.get('channel', ()) if name not in CHANNELS]
+            if unknown:
+                raise ValueError(f"Unknown channel: {', '.join(unknown)}")
+            channels = [channel for channel in CHANNELS if channel in filters.get('channel', CHANNELS)]
+            measures = ['total']
+        else:
+            measures = list(measures)
+            unknown = [name for name in measures if name not in MEASURES]
+            if unknown or not measures:
+                raise ValueError(f"Unknown measure: {', '.join(unknown) or '(none)'}")
+        if sort is not None and sort not in measures:
+            raise ValueError(f"Can only sort by a measure: {sort}")
+
+        columns, categories, codes = self.refresh()
+        index = np.flatnonzero(self._filter_mask(columns, codes, filters)) if filters else slice(None)
+        if by_channel:
+            values = columns['measures'][index][:, [MEASURES.index(channel) for channel in channels]]
+        else:
+            values = columns['measures'][index][:, [MEASURES.index(measure) for measure in measures]]
+
+        # Mixed-radix int64 key per row: text dimensions are already small codes,
+        # numbers are offset by their minimum
+        dimensions = [dimension for dimension in group_by if dimension != 'channel']
+        keys = np.zeros(len(values), dtype=np.int64)
+        sizes, offsets = [], []
+        for dimension in dimensions:
+            column = columns[dimension][index]
+            if dimension in TEXT_DIMENSIONS:
+                offset, size = 0, len(categories[dimension])
+            else:
+                offset = int(column.min()) if len(column) else 0
+                size = int(column.max()) - offset + 1 if len(column) else 1
+            keys = keys * size + (column - offset)
+            sizes.append(size)
+            offsets.append(offset)
+
+        if not dimensions:
+            groups = np.zeros(1, dtype=np.int64)
+            sums = values.sum(axis=0, keepdims=True)
+        elif np.prod(sizes, dtype=np.float64) <= DENSE_GROUPS:
+            # One bincount per value column over every possible key, no sorting
+            total = int(np.prod(sizes))
+            groups = np.flatnonzero(np.bincount(keys, minlength=total))
+            sums = np.column_stack([np.bincount(keys, weights=values[:, i], minlength=total)[groups]
+                                    for i in range(values.shape[1])])
+        else:
+            groups, inverse = np.unique(keys, return_inverse=True)
+            sums = np.column_stack([np.bincount(inverse, weights=values[:, i], minlength=len(groups))
+                                    for i in range(values.shape[1])])
+
+        labels = []
+        group_codes = np.unravel_index(groups, sizes) if dimensions else ()
+        for dimension, column, offset in zip(dimensions, group_codes, offsets):
+            if dimension in TEXT_DIMENSIONS:
+                labels.append(np.array(categories[dimension], dtype=object)[column])
+            else:
+                labels.append(column + offset)
+
+        expand_channels = by_channel and 'channel' in group_by
+        if sort is not None and not expand_channels:
+            # Rank in NumPy, so only the rows returned become dicts
+            ranked = sums.sum(axis=1) if by_channel else sums[:, measures.index(sort)]
+            order = np.argsort(-ranked, kind='stable')[:limit]
+        else:
+            order = range(len(sums))
+
+        result = []
+        for g in order:
+            base = {dimension: _json_value(labels[i][g]) for i, dimension in enumerate(dimensions)}
+            if expand_channels:
+                for i, channel in enumerate(channels):
+                    result.append(dict(base, channel=channel, total=float(sums[g, i])))
+            elif by_channel:
+                result.append(dict(base, total=float(sums[g].sum())))
+            else:
+                result.append(dict(base, **{measure: float(sums[g, i]) for i, measure in enumerate(measures)}))
+
+        if expand_channels and sort is not None:
+            result.sort(key=lambda row: row[sort], reverse=True)
+        elif sort is None:
+            # Stable, so channels keep report order within a group
+            result.sort(key=lambda row: tuple((row[dimension] is None, row[dimension] or 0)
+                                              for dimension in dimensions))
+        if limit is not None:
+            result = result[:limit]
+        _add_labels(result)
+        return result
+
+    def dimensions(self):
+        """Values of the text dimensions and the spending years, for building filters."""
+        columns, categories, _ = self.refresh()
+        values = {}
+        for dimension in TEXT_DIMENSIONS:
+            present = np.unique(columns[dimension]).tolist()
+            values[dimension] = sorted(categories[dimension][code] for code in present if code)
+        values['year'] = np.unique(columns['year']).tolist()
+        values['channel'] = list(CHANNELS)
+        return values
+
+    def stats(self):
+        return {
+            'rows': 0 if self.columns is None else len(self.columns['year']),
+            'built_at': self.built_at.isoformat() if self.built_at else None,
+            'refreshed_at': self.refreshed_at.isoformat() if self.refreshed_at else None,
+            'change_log': self.seq is not None,
+            'full_refreshes': self.full_refreshes,
+            'incremental_refreshes': self.incremental_refreshes
+        }
+
+spending_cube = SpendingCube()
+
+def _json_value(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+def _add_labels(rows):
+    """Advertiser and user names next to their ids, looked up for the returned rows only."""
+    for column, model, label, name in [('advertiser_id', Advertiser, 'advertiser', Advertiser.name),
+                                       ('assigned_user_id', User, 'assigned_user', User.username)]:
+        ids = {row[column] for row in rows if row.get(column)}
+        if not ids:
+            continue
+        names = {}
+        ids = sorted(ids)
+        for start in range(0, len(ids), LOAD_BATCH_SIZE):
+            names.update(db.session.execute(
+                select(model.id, name).where(model.id.in_(ids[start:start + LOAD_BATCH_SIZE]))
+            ).all())
+        for row in rows:
+            if column in row:
+                row[label] = names.get(row[column])
+
+def invalidate_spending_cube():
+    """Make every worker's cube reload all rows on its next query."""
+    aggregate_cache.record_changes(CHANGE_TAG, None)
+
+def _mark_changed(session, advertiser_ids):
+    """Remember changed advertisers until commit; None means all of them."""
+    if advertiser_ids is None or session.info.get('spending_cube_changes', ()) is None:
+        session.info['spending_cube_changes'] = None
+    elif advertiser_ids:
+        session.info.setdefault('spending_cube_changes', set()).update(advertiser_ids)
+
+def _matching_advertisers(session, advertiser_id, statement, params):
+    """Advertiser ids of the rows a bulk UPDATE/DELETE will touch, or None for all rows.
+
+    Read before the statement runs, on the session's connection (Core
+    statements don't come back through do_orm_execute).
+    """
+    connection = session.connection()
+    model = advertiser_id.class_
+    if isinstance(params, list) and params and all('id' in row for row in params):
+        # Bulk UPDATE by primary key (executemany)
+        ids = sorted(row['id'] for row in params)
+        advertiser_ids = set()
+        for start in range(0, len(ids), LOAD_BATCH_SIZE):
+            advertiser_ids.update(connection.execute(
+                select(advertiser_id).where(model.id.in_(ids[start:start + LOAD_BATCH_SIZE]))
+            ).scalars())
+        return advertiser_ids
+    if statement.whereclause is not None:
+        return set(connection.execute(select(advertiser_id).where(statement.whereclause).distinct()).scalars())
+    return None
+
+@event.listens_for(Session, 'after_flush')
+def collect_cube_changes(session, flush_context):
+    advertiser_ids = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, SpendingData):
+            advertiser_ids.update(inspect(obj).attrs.advertiser_id.history.sum())
+        elif isinstance(obj, Advertiser):
+            state = inspect(obj)
+            if obj in session.dirty and not any(
+                state.attrs[column].history.has_changes() for column in ADVERTISER_COLUMNS
+            ):
+                continue
+            advertiser_ids.add(obj.id)
+        elif isinstance(obj, DiscountRate):
+            # Net spending of every row may change
+            _mark_changed(session, None)
+            return
+    advertiser_ids.discard(None)
+    _mark_changed(session, advertiser_ids)
+
+@event.listens_for(Session, 'do_orm_execute')
+def collect_bulk_cube_changes(orm_execute_state):
+    # insert()/update()/delete() statements (spending imports) bypass the flush
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or not (orm_execute_state.is_insert or orm_execute_state.is_update or
+                              orm_execute_state.is_delete):
+        return
+    session = orm_execute_state.session
+    params = orm_execute_state.parameters
+    statement = orm_execute_state.statement
+    if mapper.class_ is Advertiser:
+        if orm_execute_state.is_delete:
+            _mark_changed(session, None)
+        elif orm_execute_state.is_update:
+            # Lead classification sets statuses in bulk; latest spending refreshes don't matter here.
+            # Update keeps its SET columns private, in _values
+            columns = {getattr(column, 'key', column) for column in (getattr(statement, '_values', None) or {})}
+            if isinstance(params, list):
+                columns.update(key for row in params for key in row)
+            if columns & set(ADVERTISER_COLUMNS):
+                _mark_changed(session, _matching_advertisers(session, Advertiser.id, statement, params))
+        return
+    if mapper.class_ is not SpendingData:
+        return
+
+    if orm_execute_state.is_insert:
+        rows = params if isinstance(params, list) else [params] if params else []
+        if rows and all('advertiser_id' in row for row in rows):
+            _mark_changed(session, {row['advertiser_id'] for row in rows})
+        else:
+            _mark_changed(session, None)
+        return
+
+    _mark_changed(session, _matching_advertisers(session, SpendingData.advertiser_id, statement, params))
+
+@event.listens_for(Session, 'after_commit')
+def log_committed_cube_changes(session):
+    # Only once the change is visible to other workers
+    if 'spending_cube_changes' not in session.info:
+        return
+    advertiser_ids = session.info.pop('spending_cube_changes')
+    if aggregate_cache.app is not None:
+        aggregate_cache.record_changes(CHANGE_TAG, advertiser_ids)
+
+@event.listens_for(Session, 'after_rollback')
+def forget_cube_changes(session):
+    session.info.pop('spending_cube_changes', None)
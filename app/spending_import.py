@@ -0,0 +1,397 @@
+"""
+Set-based spending import engine for CSV uploads.
+Cleans numbers with vectorized pandas string operations and writes advertisers
+and spending data with bulk statements instead of one query per row.
+"""
+
+import codecs
+import csv
+import io
+import pandas as pd
+from sqlalchemy import insert, update
+from app.models import db, Advertiser, SpendingData
+from app.spending_summary import refresh_latest_spending
+
+NUMERIC_COLUMNS = ['cinema', 'billboard', 'indoor_tv', 'internet', 'magazines',
+                   'newspapers', 'outdoor_static', 'radio', 'tv', 'grand_total']
+
+CSV_ENCODINGS = ['utf-8', 'utf-16', 'utf-16-le', 'utf-16-be', 'latin-1', 'cp1252']
+CSV_SEPARATORS = ['\t', ',', ';']
+
+# Keep IN (...) lists well under SQLite's bound parameter limit
+LOOKUP_BATCH_SIZE = 500
+
+# How much of the file to look at when sniffing encoding and delimiter
+SNIFF_BYTES = 64 * 1024
+DEFAULT_CHUNKSIZE = 10000
+
+def read_spending_csv(file_path):
+    """Read a spending CSV trying every supported encoding and separator."""
+    df = None
+
+    for encoding in CSV_ENCODINGS:
+        try:
+            for sep in CSV_SEPARATORS:
+                try:
+                    df = pd.read_csv(file_path, sep=sep, encoding=encoding)
+                    if df.shape[1] > 1:  # Make sure we have multiple columns
+                        break
+                except Exception:
+                    continue
+            if df is not None and df.shape[1] > 1:
+                break
+        except UnicodeDecodeError:
+            continue
+
+    return df
+
+def sniff_csv_format(file_path, sample_size=SNIFF_BYTES):
+    """Detect (encoding, separator) from the first few KB of a spending CSV.
+
+    Returns (None, None) if the sample doesn't decode or has a single column.
+    """
+    with open(file_path, 'rb') as f:
+        sample = f.read(sample_size)
+
+    if sample.startswith(codecs.BOM_UTF8):
+        encodings = ['utf-8-sig']
+    elif sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        encodings = ['utf-16']
+    elif sample[1:200:2].count(0) > 50:
+        encodings = ['utf-16-le']
+    elif sample[0:200:2].count(0) > 50:
+        encodings = ['utf-16-be']
+    else:
+        # latin-1 decodes anything, so it's the last resort like in read_spending_csv
+        encodings = ['utf-8', 'latin-1']
+
+    for encoding in encodings:
+        try:
+            # Incremental decode so a multi-byte char cut off at the end of the sample is fine
+            text = codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+        except UnicodeDecodeError:
+            continue
+
+        header = text.splitlines()[0] if text else ''
+        for sep in CSV_SEPARATORS:
+            fields = next(csv.reader(io.StringIO(header), delimiter=sep), [])
+            if len(fields) > 1:
+                return encoding, sep
+        return None, None
+
+    return None, None
+
+class ImportProgress:
+    """Live counters for a running spending import."""
+
+    def __init__(self):
+        self.rows_read = 0
+        self.rows_written = 0
+        self.advertisers_created = 0
+        self.chunks_committed = 0
+        self.advertiser_count = 0
+        self.rows_inserted = 0
+        self.rows_updated = 0
+        self.rows_unchanged = 0
+        self.rows_deleted = 0
+        self.advertiser_ids = set()  # Advertisers in the file, for post-import classification
+        self.finished = False
+
+    def as_dict(self):
+        return {
+            'rows_read': self.rows_read,
+            'rows_written': self.rows_written,
+            'advertisers_created': self.advertisers_created,
+            'chunks_committed': self.chunks_committed,
+            'advertiser_count': self.advertiser_count,
+            'rows_inserted': self.rows_inserted,
+            'rows_updated': self.rows_updated,
+            'rows_unchanged': self.rows_unchanged,
+            'rows_deleted': self.rows_deleted,
+            'finished': self.finished
+        }
+
+def map_spending_column(column):
+    """Map a raw CSV header to our spending field name (or None)."""
+    col_lower = column.lower().strip()
+    if 'a_adver_e' in col_lower or 'adver' in col_lower:
+        return 'advertiser_name'
+    elif 'year' in col_lower:
+        return 'year'
+    elif 'cinema' in col_lower:
+        return 'cinema'
+    elif 'fillboard' in col_lower or 'billboard' in col_lower:
+        return 'billboard'
+    elif 'indoor' in col_lower:
+        return 'indoor_tv'
+    elif 'internet' in col_lower:
+        return 'internet'
+    elif 'magazine' in col_lower:
+        return 'magazines'
+    elif 'newspaper' in col_lower:
+        return 'newspapers'
+    elif 'outdoor' in col_lower and 'static' in col_lower:
+        return 'outdoor_static'
+    elif 'radio' in col_lower:
+        return 'radio'
+    elif col_lower == 'tv':
+        return 'tv'
+    elif 'grand' in col_lower and 'total' in col_lower:
+        return 'grand_total'
+    return None
+
+def normalize_spending_frame(df):
+    """Rename columns, add missing channels and clean all numeric values in place."""
+    column_mapping = {}
+    for col in df.columns:
+        mapped = map_spending_column(str(col))
+        if mapped:
+            column_mapping[col] = mapped
+    df.rename(columns=column_mapping, inplace=True)
+
+    # Add missing channel columns with default value 0
+    for col in NUMERIC_COLUMNS:
+        if col not in df.columns:
+            df[col] = 0
+
+    df[NUMERIC_COLUMNS] = df[NUMERIC_COLUMNS].fillna(0)
+
+    for col in NUMERIC_COLUMNS:
+        df[col] = clean_number_series(df[col])
+
+    return df
+
+def clean_number_series(series):
+    """Vectorized number cleaning for this CSV format.
+
+    Numbers use spaces as thousands separators (e.g. "14 722"). Anything that
+    is not a digit, dot or comma is stripped; values that still don't parse
+    as a float become 0.
+    """
+    cleaned = series.astype(str).str.replace(r'[^\d.,]', '', regex=True)
+    return pd.to_numeric(cleaned, errors='coerce').fillna(0.0).astype(float)
+
+def _batched(items, size=LOOKUP_BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def resolve_advertiser_ids(names):
+    """Return a {name: id} map for the given names, bulk-creating missing advertisers.
+
+    Returns the map and the number of advertisers created.
+    """
+    name_to_id = {}
+    for batch in _batched(names):
+        rows = db.session.query(Advertiser.name, Advertiser.id).filter(
+            Advertiser.name.in_(batch)
+        ).all()
+        name_to_id.update(rows)
+
+    missing = [name for name in names if name not in name_to_id]
+    if missing:
+        # New advertisers start as non_qualified
+        db.session.execute(
+            insert(Advertiser),
+            [{'name': name, 'lead_status': 'non_qualified'} for name in missing]
+        )
+        for batch in _batched(missing):
+            rows = db.session.query(Advertiser.name, Advertiser.id).filter(
+                Advertiser.name.in_(batch)
+            ).all()
+            name_to_id.update(rows)
+
+    return name_to_id, len(missing)
+
+def import_spending_frame(df, cleared_ids=None, advertiser_ids=None):
+    """Replace spending data for every advertiser in a normalized frame.
+
+    Deletes existing spending rows for those advertisers and bulk inserts the
+    frame. Does not commit. Returns (imported_count, advertiser_count, created_count).
+
+    When importing in chunks pass the same ``cleared_ids`` set for every chunk,
+    so an advertiser's rows from an earlier chunk aren't deleted by a later one.
+    Ids of the advertisers in the frame are added to ``advertiser_ids`` if given.
+    """
+    unique_advertisers = list(df['advertiser_name'].unique())
+    name_to_id, created_count = resolve_advertiser_ids(unique_advertisers)
+    if advertiser_ids is not None:
+        advertiser_ids.update(name_to_id.values())
+
+    # Clean overwrite of all spending data for advertisers in the import
+    clear_ids = list(name_to_id.values())
+    if cleared_ids is not None:
+        clear_ids = [id for id in clear_ids if id not in cleared_ids]
+        cleared_ids.update(clear_ids)
+    for batch in _batched(clear_ids):
+        SpendingData.query.filter(
+            SpendingData.advertiser_id.in_(batch)
+        ).delete(synchronize_session=False)
+
+    records = pd.DataFrame({
+        'advertiser_id': df['advertiser_name'].map(name_to_id),
+        'year': df['year'].astype(int),
+    })
+    for col in NUMERIC_COLUMNS:
+        records[col] = df[col]
+
+    rows = records.to_dict('records')
+    if rows:
+        db.session.execute(insert(SpendingData), rows)
+
+    return len(rows), len(unique_advertisers), created_count
+
+def load_existing_spending(advertiser_ids):
+    """Load stored spending rows for the given advertisers as a DataFrame."""
+    columns = ['id', 'advertiser_id', 'year'] + NUMERIC_COLUMNS
+    rows = []
+    for batch in _batched(advertiser_ids):
+        rows.extend(db.session.query(
+            *[getattr(SpendingData, col) for col in columns]
+        ).filter(SpendingData.advertiser_id.in_(batch)).all())
+
+    existing = pd.DataFrame.from_records(rows, columns=columns)
+    return existing.astype({'id': 'int64', 'advertiser_id': 'int64', 'year': 'int64',
+                            **{col: 'float64' for col in NUMERIC_COLUMNS}})
+
+def upsert_spending_frame(df, seen_keys=None, advertiser_ids=None):
+    """Insert new and update changed spending rows of a normalized frame.
+
+    Rows are matched on (advertiser_id, year), the _advertiser_year_uc key.
+    Only the channel columns and grand_total are compared and written, so a
+    manually entered net_total survives re-imports. Does not commit.
+
+    Returns a dict of inserted/updated/unchanged counts plus advertiser_count
+    and advertisers_created. Keys seen are added to ``seen_keys`` and advertiser
+    ids to ``advertiser_ids`` if given.
+    """
+    unique_advertisers = list(df['advertiser_name'].unique())
+    name_to_id, created_count = resolve_advertiser_ids(unique_advertisers)
+    if advertiser_ids is not None:
+        advertiser_ids.update(name_to_id.values())
+
+    incoming = pd.DataFrame({
+        'advertiser_id': df['advertiser_name'].map(name_to_id).astype('int64'),
+        'year': df['year'].astype('int64'),
+    })
+    for col in NUMERIC_COLUMNS:
+        incoming[col] = df[col]
+    # The same advertiser/year twice in a file: the last row wins
+    incoming = incoming.drop_duplicates(['advertiser_id', 'year'], keep='last')
+
+    existing = load_existing_spending(list(name_to_id.values()))
+    merged = incoming.merge(existing, on=['advertiser_id', 'year'], how='left',
+                            suffixes=('', '_old'), indicator=True)
+
+    new_rows = merged[merged['_merge'] == 'left_only']
+    matched = merged[merged['_merge'] == 'both']
+
+    changed_mask = pd.Series(False, index=matched.index)
+    for col in NUMERIC_COLUMNS:
+        # NULLs stored by syncs compare as changed, so they get filled in
+        changed_mask |= matched[col] != matched[f'{col}_old']
+    changed = matched[changed_mask]
+
+    inserts = new_rows[['advertiser_id', 'year'] + NUMERIC_COLUMNS].to_dict('records')
+    if inserts:
+        db.session.execute(insert(SpendingData), inserts)
+
+    updates = changed[['id'] + NUMERIC_COLUMNS].astype({'id': 'int64'}).to_dict('records')
+    if updates:
+        # ORM bulk UPDATE by primary key (executemany)
+        db.session.execute(update(SpendingData), updates)
+
+    if seen_keys is not None:
+        seen_keys.update(zip(incoming['advertiser_id'].tolist(), incoming['year'].tolist()))
+
+    return {
+        'inserted': len(inserts),
+        'updated': len(updates),
+        'unchanged': len(matched) - len(updates),
+        'advertiser_count': len(unique_advertisers),
+        'advertisers_created': created_count
+    }
+
+def delete_missing_spending(seen_keys):
+    """Delete stored years of imported advertisers that were not in the import."""
+    advertiser_ids = sorted({advertiser_id for advertiser_id, _ in seen_keys})
+    stale_ids = []
+    for batch in _batched(advertiser_ids):
+        rows = db.session.query(
+            SpendingData.id, SpendingData.advertiser_id, SpendingData.year
+        ).filter(SpendingData.advertiser_id.in_(batch)).all()
+        stale_ids.extend(id for id, advertiser_id, year in rows
+                         if (advertiser_id, year) not in seen_keys)
+
+    for batch in _batched(stale_ids):
+        SpendingData.query.filter(
+            SpendingData.id.in_(batch)
+        ).delete(synchronize_session=False)
+    return len(stale_ids)
+
+def run_spending_import(frames, progress=None, on_chunk=None, mode='replace', delete_missing=False):
+    """Import raw spending frames, committing after each one.
+
+    ``mode`` is 'replace' (delete and re-insert every advertiser's data) or
+    'upsert' (write only new and changed rows; with ``delete_missing`` also
+    drop years that are no longer in the file). Returns the progress object.
+    """
+    if mode not in ('replace', 'upsert'):
+        raise ValueError(f"Unknown import mode: {mode}")
+
+    progress = progress or ImportProgress()
+    cleared_ids = set()
+    seen_keys = set()
+
+    for chunk in frames:
+        progress.rows_read += len(chunk)
+        normalize_spending_frame(chunk)
+
+        if mode == 'upsert':
+            summary = upsert_spending_frame(chunk, seen_keys=seen_keys, advertiser_ids=progress.advertiser_ids)
+            written = summary['inserted'] + summary['updated']
+            created = summary['advertisers_created']
+            progress.rows_inserted += summary['inserted']
+            progress.rows_updated += summary['updated']
+            progress.rows_unchanged += summary['unchanged']
+        else:
+            written, _, created = import_spending_frame(chunk, cleared_ids=cleared_ids,
+                                                        advertiser_ids=progress.advertiser_ids)
+            progress.rows_inserted += written
+        db.session.commit()
+
+        progress.rows_written += written
+        progress.advertisers_created += created
+        progress.advertiser_count = len(progress.advertiser_ids)
+        progress.chunks_committed += 1
+        if on_chunk:
+            on_chunk(progress)
+
+    # Only safe once the whole file has been seen: an advertiser's years can span chunks
+    if mode == 'upsert' and delete_missing:
+        progress.rows_deleted = delete_missing_spending(seen_keys)
+
+    refresh_latest_spending(progress.advertiser_ids)
+    db.session.commit()
+
+    progress.finished = True
+    return progress
+
+def stream_spending_csv(file_path, chunksize=DEFAULT_CHUNKSIZE, progress=None, on_chunk=None,
+                        mode='replace', delete_missing=False):
+    """Import a spending CSV in bounded-size chunks, committing each chunk.
+
+    Peak memory depends on ``chunksize``, not on the file size. ``progress`` is
+    updated after every committed chunk and ``on_chunk(progress)`` is called
+    if given. See ``run_spending_import`` for ``mode``. Returns the progress object.
+
+    Raises ValueError if the format can't be sniffed. Chunks committed before
+    an error stay in the database.
+    """
+    encoding, sep = sniff_csv_format(file_path)
+    if encoding is None:
+        raise ValueError("Could not detect CSV encoding and separator")
+
+    reader = pd.read_csv(file_path, sep=sep, encoding=encoding, chunksize=chunksize)
+    with reader:
+        return run_spending_import(reader, progress=progress, on_chunk=on_chunk,
+                                   mode=mode, delete_missing=delete_missing)
@@ -0,0 +1,64 @@
+"""
+Maintains the denormalized latest-year spending columns on Advertiser.
+Call refresh_latest_spending() for the affected advertisers whenever their
+SpendingData rows change (forms, CSV import, TV Planner sync), and for all
+of them when a discount rate changes (set_discount_rate() does).
+"""
+
+from sqlalchemy import func, select, update
+from app.models import db, Advertiser, DiscountRate, SpendingData, DEFAULT_NET_RATES
+
+# Keep IN (...) lists well under SQLite's bound parameter limit
+REFRESH_BATCH_SIZE = 500
+
+def refresh_latest_spending(advertiser_ids=None):
+    """Recompute latest year, gross and net spending for advertisers.
+
+    One UPDATE with correlated subqueries per batch of ids; all advertisers if
+    ``advertiser_ids`` is None. Flushes pending changes but does not commit.
+    """
+    db.session.flush()
+
+    def latest_value(expression):
+        # Served by the (advertiser_id, year) unique index
+        return select(expression).where(
+            SpendingData.advertiser_id == Advertiser.id
+        ).order_by(SpendingData.year.desc()).limit(1).scalar_subquery()
+
+    stmt = update(Advertiser).values(
+        latest_spending_year=latest_value(SpendingData.year),
+        latest_gross_spending=func.coalesce(latest_value(SpendingData.grand_total), 0),
+        latest_net_spending=func.coalesce(latest_value(SpendingData.calculated_net_total), 0),
+        updated_at=Advertiser.updated_at  # Not a user-visible change
+    ).execution_options(synchronize_session=False)
+
+    if advertiser_ids is None:
+        db.session.execute(stmt)
+        return
+
+    advertiser_ids = list(advertiser_ids)
+    for start in range(0, len(advertiser_ids), REFRESH_BATCH_SIZE):
+        batch = advertiser_ids[start:start + REFRESH_BATCH_SIZE]
+        db.session.execute(stmt.where(Advertiser.id.in_(batch)))
+
+def set_discount_rate(media, valid_from_year, rate):
+    """Set the net rate of ``media`` from ``valid_from_year`` on and recompute stored net spending.
+
+    Other processes pick the new rate up for loaded objects within
+    DiscountRate.CACHE_SECONDS. Does not commit.
+    """
+    if media not in DEFAULT_NET_RATES:
+        raise ValueError(f"Unknown media: {media}")
+    if not 0 <= rate <= 1:
+        raise ValueError("Rate must be between 0 and 1")
+
+    discount_rate = DiscountRate.query.filter_by(media=media, valid_from_year=valid_from_year).first()
+    if discount_rate is None:
+        discount_rate = DiscountRate(media=media, valid_from_year=valid_from_year)
+        db.session.add(discount_rate)
+    discount_rate.rate = rate
+    DiscountRate.clear_cache()
+
+    # One bulk UPDATE over all advertisers
+    refresh_latest_spending()
+    return discount_rate
@@ -0,0 +1,195 @@
+"""
+Periodic Agency CRM and TV Planner syncs.
+With AUTO_SYNC_ENABLED in integration_config.py every source is pulled once
+per SYNC_INTERVAL_MINUTES. Runs are pinned to fixed slots of that interval,
+the sources offset evenly within it (TV Planner half an interval after
+Agency CRM with the two of them), plus up to SYNC_JITTER_SECONDS of random
+delay, so the load arrives at predictable, spread-out times. Every run is
+recorded in sync_run, which doubles as the lock: a source is only started
+when it has no running row, so the web process and run_worker.py never
+overlap. Like background jobs it runs in-process or in run_worker.py.
+"""
+
+import math
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import and_, exists, insert, literal, or_, select
+from app.models import db, SyncRun
+from app.agency_crm_sync import sync_agency_crm
+from app.tv_planner_sync import sync_tv_planner
+
+# source -> (integration_config.py prefix, sync function taking api_url, api_key)
+SYNC_SOURCES = {
+    'agency-crm': ('AGENCY_CRM', sync_agency_crm),
+    'tv-planner': ('TV_PLANNER', sync_tv_planner)
+}
+
+EPOCH = datetime(1970, 1, 1)
+
+def load_integration_config():
+    """The integration_config.py module written by setup_integration.py, or None."""
+    try:
+        import integration_config
+    except ImportError:
+        return None
+    return integration_config
+
+def source_settings(source):
+    """(api_url, api_key) of a source from integration_config.py; (None, None) if not set up."""
+    config = load_integration_config()
+    prefix = SYNC_SOURCES[source][0]
+    return getattr(config, f'{prefix}_API_URL', None), getattr(config, f'{prefix}_API_KEY', None)
+
+def claim_sync_run(source, trigger, min_interval=None):
+    """Atomically start a sync_run for ``source``. Returns it, or None if the source is busy.
+
+    With ``min_interval`` a run started less than that long ago also counts as busy.
+    """
+    now = datetime.utcnow()
+    stale = now - timedelta(minutes=current_app.config.get('SYNC_STALE_MINUTES', 60))
+    busy = and_(SyncRun.status == 'running', SyncRun.started_at > stale)
+    if min_interval is not None:
+        busy = or_(busy, SyncRun.started_at > now - min_interval)
+
+    # One INSERT ... SELECT WHERE NOT EXISTS, so two processes can't both claim
+    claimed = db.session.execute(insert(SyncRun).from_select(
+        ['source', 'trigger', 'status', 'started_at'],
+        select(literal(source), literal(trigger), literal('running'), literal(now, SyncRun.started_at.type))
+        .where(~exists().where(SyncRun.source == source, busy))
+    )).rowcount
+    db.session.commit()
+    if not claimed:
+        return None
+    return SyncRun.query.filter_by(source=source, status='running', started_at=now) \
+        .order_by(SyncRun.id.desc()).first()
+
+def run_sync(source, trigger='scheduled', min_interval=None, api_url=None, api_key=None, **kwargs):
+    """Run one sync of ``source`` and record it. Returns the SyncRun, or None if it was busy.
+
+    ``api_url`` and ``api_key`` override the ones in integration_config.py
+    (manual syncs pass their own). Failures are recorded on the run rather
+    than raised.
+    """
+    configured_url, configured_key = source_settings(source)
+    api_url, api_key = api_url or configured_url, api_key or configured_key
+    if not api_url or not api_key:
+        raise ValueError(f"{source} is not configured (integration_config.py)")
+
+    run = claim_sync_run(source, trigger, min_interval)
+    if run is None:
+        return None
+
+    run_id = run.id
+    started = time.monotonic()
+    try:
+        counts = SYNC_SOURCES[source][1](api_url, api_key, **kwargs)
+        run = db.session.get(SyncRun, run_id)
+        run.counts = counts
+        run.status = 'completed'
+    except Exception as e:
+        db.session.rollback()
+        run = db.session.get(SyncRun, run_id)
+        run.status = 'failed'
+        run.error = str(e)
+        current_app.logger.error(f"{source} sync failed: {str(e)}")
+
+    run.finished_at = datetime.utcnow()
+    run.duration_ms = round((time.monotonic() - started) * 1000)
+    db.session.commit()
+    return run
+
+def fail_stale_sync_runs(max_age_minutes):
+    """Mark runs left 'running' by a crashed process as failed."""
+    cutoff = datetime.utcnow() - timedelta(minutes=max_age_minutes)
+    count = SyncRun.query.filter(
+        SyncRun.status == 'running',
+        SyncRun.started_at < cutoff
+    ).update({'status': 'failed', 'error': 'Abandoned'}, synchronize_session=False)
+    db.session.commit()
+    return count
+
+def next_slot(after, interval_seconds, offset_seconds):
+    """The first time after ``after`` that is ``offset_seconds`` into an interval slot."""
+    elapsed = (after - EPOCH).total_seconds() - offset_seconds
+    slot = math.floor(elapsed / interval_seconds) + 1
+    return EPOCH + timedelta(seconds=slot * interval_seconds + offset_seconds)
+
+class SyncScheduler:
+    """Run the integration syncs on the interval from integration_config.py."""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.thread = None
+        self.lock = threading.Lock()
+        self.next_run = {}  # source -> datetime of its next scheduled run
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['sync_scheduler'] = self
+
+    def start(self):
+        """Run the scheduler loop on a daemon thread (once per process)."""
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.work, name='sync-scheduler', daemon=True)
+                self.thread.start()
+
+    def work(self, once=False):
+        """Scheduler loop: run the due syncs, then sleep until the next one."""
+        with self.app.app_context():
+            fail_stale_sync_runs(self.app.config.get('SYNC_STALE_MINUTES', 60))
+
+        while True:
+            with self.app.app_context():
+                try:
+                    wait = self.run_due()
+                except Exception as e:
+                    # A bad config or a database error must not stop scheduled syncs for good
+                    current_app.logger.error(f"Sync scheduler iteration failed: {e}")
+                    db.session.rollback()
+                    wait = self.app.config.get('SYNC_POLL_SECONDS', 60)
+            if once:
+                return
+            time.sleep(wait)
+
+    def run_due(self):
+        """Run every source whose time has come. Returns seconds until the next check."""
+        poll_seconds = self.app.config.get('SYNC_POLL_SECONDS', 60)
+        config = load_integration_config()
+        if not getattr(config, 'AUTO_SYNC_ENABLED', False):
+            self.next_run.clear()
+            return poll_seconds
+
+        interval = timedelta(minutes=getattr(config, 'SYNC_INTERVAL_MINUTES', 30))
+        waits = [poll_seconds]
+        for source in SYNC_SOURCES:
+            if not all(source_settings(source)):
+                continue
+            if source not in self.next_run:
+                self.schedule(source, interval)
+            if self.next_run[source] <= datetime.utcnow():
+                # Half an interval is enough to tell this slot's run (maybe another process's) from the last one
+                run_sync(source, 'scheduled', min_interval=interval / 2)
+                self.schedule(source, interval)
+            waits.append((self.next_run[source] - datetime.utcnow()).total_seconds())
+        return max(1, min(waits))
+
+    def schedule(self, source, interval):
+        """Set the next run of ``source``: its next slot after the latest run (or now), plus jitter."""
+        offset = interval * list(SYNC_SOURCES).index(source) / len(SYNC_SOURCES)
+        latest = db.session.query(db.func.max(SyncRun.started_at)).filter(SyncRun.source == source).scalar()
+        after = max(latest or datetime.min, datetime.utcnow())
+        jitter = random.uniform(0, self.app.config.get('SYNC_JITTER_SECONDS', 60))
+        self.next_run[source] = next_slot(after, interval.total_seconds(), offset.total_seconds()) \
+            + timedelta(seconds=jitter)
+        return self.next_run[source]
+
+    def stats(self):
+        return {source: due.isoformat() for source, due in self.next_run.items()}
+
+sync_scheduler = SyncScheduler()
@@ -0,0 +1,106 @@
+"""
+Concurrent TV Planner campaign sync.
+The per-campaign GET /campaigns/{id}/spending calls run on a bounded thread
+pool (TV_PLANNER_SYNC_CONCURRENCY) with retries; worker threads only do
+HTTP. All database writes happen on the calling thread, which applies the
+results in campaign order and commits every TV_PLANNER_SYNC_BATCH_SIZE.
+"""
+
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+import requests
+from app.http_client import http_client
+from app.models import db
+from app.spending_summary import refresh_latest_spending
+
+# Responses worth retrying; anything else (404, 401, ...) is final
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+def fetch_with_retry(url, headers, retries, backoff_seconds):
+    """GET ``url``, retrying connection errors and RETRY_STATUSES. Returns the JSON or None."""
+    for attempt in range(retries + 1):
+        try:
+            response = http_client.get(url, headers=headers)
+            if response.status_code == 200:
+                return response.json()
+            if response.status_code not in RETRY_STATUSES:
+                return None
+        except requests.RequestException:
+            pass
+        if attempt < retries:
+            time.sleep(backoff_seconds * 2 ** attempt * random.uniform(0.5, 1.0))
+    return None
+
+def fetch_campaign_spending(api_url, headers, campaigns, concurrency=None, retries=None):
+    """Yield (campaign, spending) in campaign order, fetching up to ``concurrency`` at once.
+
+    ``spending`` is the decoded /spending response, or None if it could not be fetched.
+    """
+    config = current_app.config
+    concurrency = concurrency or config.get('TV_PLANNER_SYNC_CONCURRENCY', 8)
+    retries = config.get('TV_PLANNER_SYNC_RETRIES', 3) if retries is None else retries
+    backoff = config.get('TV_PLANNER_SYNC_RETRY_SECONDS', 0.5)
+
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='tv-planner-sync')
+    try:
+        futures = [
+            executor.submit(fetch_with_retry, f"{api_url}/campaigns/{campaign['id']}/spending",
+                            headers, retries, backoff)
+            for campaign in campaigns
+        ]
+        for campaign, future in zip(campaigns, futures):
+            yield campaign, future.result()
+    finally:
+        # Don't keep fetching if the caller stopped early (e.g. a write failed)
+        executor.shutdown(cancel_futures=True)
+
+def sync_campaigns(api_url, headers, campaigns, apply_campaign, concurrency=None, batch_size=None):
+    """Fetch every campaign's spending concurrently and apply it in committed batches.
+
+    ``apply_campaign(campaign, spending)`` runs on this thread, must not commit
+    and returns the affected advertiser id (or None). Campaigns whose spending
+    could not be fetched are skipped, so they keep their last synced spending.
+    Latest spending is refreshed once per batch. Returns (campaigns synced,
+    spending fetches failed).
+    """
+    batch_size = batch_size or current_app.config.get('TV_PLANNER_SYNC_BATCH_SIZE', 200)
+    advertiser_ids = set()
+    synced = failed = 0
+
+    for campaign, spending in fetch_campaign_spending(api_url, headers, campaigns, concurrency):
+        if spending is None:
+            # Not "0 EUR": the campaign keeps its last synced spending and activity
+            failed += 1
+            continue
+        advertiser_id = apply_campaign(campaign, spending)
+        if advertiser_id is not None:
+            advertiser_ids.add(advertiser_id)
+        synced += 1
+
+        if synced % batch_size == 0:
+            refresh_latest_spending(advertiser_ids)
+            db.session.commit()
+            advertiser_ids.clear()
+
+    if advertiser_ids:
+        refresh_latest_spending(advertiser_ids)
+    db.session.commit()
+    return synced, failed
+
+def sync_tv_planner(api_url, api_key):
+    """Pull all campaigns with their spending. Returns {'campaigns': counts}."""
+    from app.integrations.routes import apply_campaign_spending
+
+    headers = {'X-API-Key': api_key}
+    response = http_client.get(f"{api_url}/campaigns", headers=headers)
+    response.raise_for_status()
+    campaigns = response.json()
+
+    def apply_campaign(campaign, spending):
+        campaign['total_spending'] = spending.get('total_spending', 0)
+        return apply_campaign_spending(campaign)
+
+    synced, failed = sync_campaigns(api_url, headers, campaigns, apply_campaign)
+    return {'campaigns': {'fetched': len(campaigns), 'synced': synced, 'spending_failures': failed}}
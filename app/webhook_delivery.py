@@ -0,0 +1,244 @@
+"""
+Outgoing webhook delivery from the webhook_delivery outbox table.
+trigger_webhooks() adds one row per subscriber in the caller's transaction;
+the dispatcher claims due rows and posts them on a small thread pool,
+retrying failures with exponential backoff until they are delivered or
+dead-lettered after WEBHOOK_MAX_ATTEMPTS. Rows left 'delivering' by a
+crashed dispatcher are put back every STALE_CHECK_SECONDS. Like background
+jobs it runs in-process or in run_worker.py, depending on JOB_EXECUTOR.
+"""
+
+import hashlib
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+import requests
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.http_client import http_client
+from app.models import db, WebhookDelivery, WebhookLog
+
+# Seconds between checks for deliveries abandoned by a crashed dispatcher
+STALE_CHECK_SECONDS = 60
+
+def sign_payload(secret, payload):
+    """Signature sent in X-Webhook-Signature: sha256 of secret + body."""
+    return hashlib.sha256(f"{secret}{payload}".encode()).hexdigest()
+
+def retry_delay(attempts, base_seconds, max_seconds):
+    """Seconds to wait after the given number of failed attempts (with jitter)."""
+    delay = min(max_seconds, base_seconds * 2 ** (attempts - 1))
+    return delay * random.uniform(0.8, 1.0)
+
+class WebhookDispatcher:
+    """Deliver queued webhook events with the app context of the owning app."""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.executor = None
+        self.thread = None
+        self.wakeup = threading.Event()
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['webhook_dispatcher'] = self
+
+    def _get_executor(self):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(
+                max_workers=self.app.config.get('WEBHOOK_WORKERS', 4),
+                thread_name_prefix='webhook-worker'
+            )
+        return self.executor
+
+    def start(self):
+        """Run the dispatcher loop on a daemon thread (once per process)."""
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.work, name='webhook-dispatcher', daemon=True)
+                self.thread.start()
+
+    def wake(self):
+        """Deliver newly queued events now instead of at the next poll."""
+        # With JOB_EXECUTOR = 'worker' the run_worker.py process delivers them
+        if self.app.config.get('JOB_EXECUTOR', 'thread') == 'thread':
+            self.start()
+        self.wakeup.set()
+
+    def work(self, once=False):
+        """Dispatcher loop: deliver due events, then sleep until woken or the next poll."""
+        poll_interval = self.app.config.get('WEBHOOK_POLL_INTERVAL', 5)
+        next_stale_check = 0
+        while True:
+            self.wakeup.clear()
+            try:
+                if time.monotonic() >= next_stale_check:
+                    next_stale_check = time.monotonic() + STALE_CHECK_SECONDS
+                    with self.app.app_context():
+                        requeue_stale_deliveries(self.app.config.get('WEBHOOK_STALE_MINUTES', 10))
+                if self.dispatch_due():
+                    continue
+            except Exception as e:
+                # A database error must not stop deliveries for good; try again at the next poll
+                self.app.logger.error(f"Webhook dispatcher iteration failed: {e}")
+            if once:
+                return
+            self.wakeup.wait(poll_interval)
+
+    def dispatch_due(self):
+        """Claim one batch of due deliveries and send them concurrently. Returns the batch size."""
+        with self.app.app_context():
+            delivery_ids = claim_due_deliveries(self.app.config.get('WEBHOOK_BATCH_SIZE', 50))
+        if delivery_ids:
+            executor = self._get_executor()
+            wait([executor.submit(self.deliver, delivery_id) for delivery_id in delivery_ids])
+        return len(delivery_ids)
+
+    def deliver(self, delivery_id):
+        """Make one delivery attempt and record the outcome."""
+        with self.app.app_context():
+            try:
+                self.attempt(delivery_id)
+            except Exception as e:
+                # Not a failed request but a bug or database error: retry later all the same
+                db.session.rollback()
+                self.app.logger.error(f"Webhook delivery {delivery_id} failed: {e}")
+                try:
+                    delivery = db.session.get(WebhookDelivery, delivery_id)
+                    delivery.attempts += 1
+                    delivery.last_error = f"Error: {str(e)}"
+                    delivery.locked_at = None
+                    schedule_retry(delivery, self.app.config, datetime.utcnow())
+                    db.session.commit()
+                except Exception as e:
+                    # Left 'delivering'; requeue_stale_deliveries() picks it up again
+                    db.session.rollback()
+                    self.app.logger.error(f"Could not reschedule webhook delivery {delivery_id}: {e}")
+
+    def attempt(self, delivery_id):
+        """POST one delivery and update its row. Does not catch non-HTTP errors."""
+        config = self.app.config
+        delivery = db.session.get(WebhookDelivery, delivery_id)
+        webhook = delivery.webhook
+        now = datetime.utcnow()
+
+        if not webhook.is_active:
+            delivery.status = 'dead'
+            delivery.last_error = 'Webhook is no longer active'
+            db.session.commit()
+            return
+
+        payload = json.dumps(delivery.payload)
+        status, body, error = 0, None, None
+        try:
+            response = http_client.post(
+                webhook.url,
+                data=payload,
+                headers={
+                    'Content-Type': 'application/json',
+                    'X-Webhook-Event': delivery.event,
+                    'X-Webhook-Signature': sign_payload(webhook.secret, payload),
+                    'X-Webhook-Delivery': str(delivery.id)
+                },
+                timeout=config.get('WEBHOOK_TIMEOUT', 10)
+            )
+            status, body = response.status_code, response.text[:1000]
+            if not 200 <= status < 300:
+                error = f"HTTP {status}"
+        except requests.RequestException as e:
+            error = f"Error: {str(e)}"
+            body = error
+
+        delivery.attempts += 1
+        delivery.last_status = status
+        delivery.last_error = error
+        delivery.locked_at = None
+        if error is None:
+            delivery.status = 'delivered'
+            delivery.delivered_at = now
+        else:
+            schedule_retry(delivery, config, now)
+
+        # Keep the per-attempt log the webhook admin already reads
+        db.session.add(WebhookLog(
+            webhook_id=webhook.id,
+            event=delivery.event,
+            payload=delivery.payload,
+            response_status=status,
+            response_body=body,
+            triggered_at=now
+        ))
+        db.session.commit()
+
+def schedule_retry(delivery, config, now):
+    """Put a failed delivery back to pending with backoff, or dead-letter it after WEBHOOK_MAX_ATTEMPTS."""
+    if delivery.attempts >= config.get('WEBHOOK_MAX_ATTEMPTS', 8):
+        delivery.status = 'dead'
+    else:
+        delivery.status = 'pending'
+        delivery.next_attempt_at = now + timedelta(seconds=retry_delay(
+            delivery.attempts,
+            config.get('WEBHOOK_RETRY_BASE_SECONDS', 30),
+            config.get('WEBHOOK_RETRY_MAX_SECONDS', 3600)
+        ))
+
+def claim_due_deliveries(limit):
+    """Atomically move up to ``limit`` due deliveries to 'delivering'. Returns their ids."""
+    now = datetime.utcnow()
+    due_ids = [id for (id,) in db.session.query(WebhookDelivery.id).filter(
+        WebhookDelivery.status == 'pending',
+        WebhookDelivery.next_attempt_at <= now
+    ).order_by(WebhookDelivery.next_attempt_at, WebhookDelivery.id).limit(limit)]
+
+    claimed = []
+    for delivery_id in due_ids:
+        # Another dispatcher (web process or run_worker.py) may have got it first
+        if WebhookDelivery.query.filter_by(id=delivery_id, status='pending').update(
+            {'status': 'delivering', 'locked_at': now}, synchronize_session=False
+        ):
+            claimed.append(delivery_id)
+    db.session.commit()
+    return claimed
+
+def requeue_stale_deliveries(max_age_minutes):
+    """Put deliveries left 'delivering' by a crashed process back on the queue."""
+    cutoff = datetime.utcnow() - timedelta(minutes=max_age_minutes)
+    count = WebhookDelivery.query.filter(
+        WebhookDelivery.status == 'delivering',
+        WebhookDelivery.locked_at < cutoff
+    ).update({'status': 'pending', 'locked_at': None}, synchronize_session=False)
+    db.session.commit()
+    return count
+
+def retry_dead_deliveries(webhook_id=None):
+    """Give dead-lettered deliveries a fresh set of attempts. Returns how many."""
+    query = WebhookDelivery.query.filter(WebhookDelivery.status == 'dead')
+    if webhook_id is not None:
+        query = query.filter(WebhookDelivery.webhook_id == webhook_id)
+    count = query.update({
+        'status': 'pending',
+        'attempts': 0,
+        'next_attempt_at': datetime.utcnow()
+    }, synchronize_session=False)
+    db.session.commit()
+    if count:
+        webhook_dispatcher.wake()
+    return count
+
+webhook_dispatcher = WebhookDispatcher()
+
+@event.listens_for(Session, 'after_commit')
+def wake_dispatcher_after_commit(session):
+    # trigger_webhooks() flags the session; deliver once the rows are committed
+    if session.info.pop('webhooks_queued', False) and webhook_dispatcher.app is not None:
+        webhook_dispatcher.wake()
+
+@event.listens_for(Session, 'after_rollback')
+def forget_queued_webhooks(session):
+    session.info.pop('webhooks_queued', None)
@@ -3,8 +3,6 @@ Webhook helper functions for NewBusiness
 Sends notifications to other applications when data changes
 """
 
-import requests
-import json
 from datetime import datetime
 
 def notify_contact_updated(contact):
@@ -37,9 +35,13 @@ def notify_contact_updated(contact):
     trigger_webhooks('contact.updated', webhook_data)
 
 def trigger_webhooks(event, data):
-    """Trigger webhooks for a specific event"""
-    from app.models import Webhook, WebhookLog
-    import hashlib
+    """Queue a webhook event for every active subscriber.
+    
+    Deliveries are added to the current session, so they are committed (or
+    rolled back) together with the change that caused them. The dispatcher in
+    app.webhook_delivery sends them after the commit and retries failures.
+    """
+    from app.models import db, Webhook, WebhookDelivery
     
     print(f"🔍 TRIGGER WEBHOOKS: Event '{event}' triggered")
     
@@ -50,54 +52,11 @@ def trigger_webhooks(event, data):
         if event in webhook.events:
             webhooks.append(webhook)
     
-    print(f"📋 Found {len(webhooks)} active webhooks for event '{event}'")
+    print(f"📋 Queued {len(webhooks)} deliveries for event '{event}'")
     
     for webhook in webhooks:
-        print(f"📡 Calling webhook: {webhook.url}")
-        try:
-            payload = json.dumps(data)
-            signature = hashlib.sha256(
-                f"{webhook.secret}{payload}".encode()
-            ).hexdigest()
-            
-            response = requests.post(
-                webhook.url,
-                json=data,
-                headers={
-                    'X-Webhook-Event': event,
-                    'X-Webhook-Signature': signature
-                },
-                timeout=10
-            )
-            
-            print(f"✅ Webhook response: {response.status_code} - {response.text[:200]}")
-            
-            # Log the webhook call
-            log = WebhookLog(
-                webhook_id=webhook.id,
-                event=event,
-                payload=data,
-                response_status=response.status_code,
-                response_body=response.text[:1000],  # Limit response body size
-                triggered_at=datetime.utcnow()
-            )
-            
-            from app import db
-            db.session.add(log)
-            db.session.commit()
-            
-        except Exception as e:
-            print(f"❌ Webhook error: {str(e)}")
-            # Log the error
-            log = WebhookLog(
-                webhook_id=webhook.id,
-                event=event,
-                payload=data,
-                response_status=0,
-                response_body=f"Error: {str(e)}",
-                triggered_at=datetime.utcnow()
-            )
-            
-            from app import db
-            db.session.add(log)
-            db.session.commit()
\ No newline at end of file
+        db.session.add(WebhookDelivery(webhook_id=webhook.id, event=event, payload=data))
+    
+    if webhooks:
+        db.session.info['webhooks_queued'] = True
+    return len(webhooks)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Benchmark the set-based CSV spending import against the old row-by-row path.
+
+Generates a synthetic media-monitoring export, imports it into a fresh SQLite
+database per engine (row-by-row, set-based, streaming) and checks they all end
+up with identical data.
+
+Usage: python benchmark_csv_import.py [rows] [advertisers]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+from app import create_app, db
+from app.models import Advertiser, SpendingData
+from app.spending_import import read_spending_csv, normalize_spending_frame, import_spending_frame, stream_spending_csv
+from config import Config
+
+HEADERS = ['A_ADVER_E', 'Year of date', 'CINEMA', 'FILLBOARD', 'INDOOR TV', 'INTERNET',
+           'MAGAZINES', 'NEWSPAPERS', 'OUTDOOR STATIC', 'RADIO', 'TV', 'Grand Total']
+
+def write_sample_csv(path, rows, advertisers):
+    """Write a tab-separated export with space thousands separators and blanks."""
+    rng = random.Random(42)
+    years = list(range(2024 - rows // advertisers - 1, 2025))
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\t'.join(HEADERS) + '\n')
+        written = 0
+        for i in range(advertisers):
+            for year in years:
+                if written >= rows:
+                    break
+                values = []
+                for _ in range(10):
+                    roll = rng.random()
+                    if roll < 0.3:
+                        values.append('')
+                    else:
+                        values.append(f"{rng.randint(0, 900000):,}".replace(',', ' '))
+                f.write('\t'.join([f"Advertiser {i:06d} UAB", str(year)] + values) + '\n')
+                written += 1
+    return written
+
+def legacy_import(file_path):
+    """The previous process_csv_upload import loop (iterrows + per-row queries)."""
+    import re
+    df = read_spending_csv(file_path)
+    df.rename(columns={'A_ADVER_E': 'advertiser_name', 'Year of date': 'year'}, inplace=True)
+    normalize_columns = {h: h.lower().replace(' ', '_') for h in HEADERS[2:]}
+    normalize_columns.update({'FILLBOARD': 'billboard', 'INDOOR TV': 'indoor_tv', 'Grand Total': 'grand_total'})
+    df.rename(columns=normalize_columns, inplace=True)
+
+    numeric_columns = ['cinema', 'billboard', 'indoor_tv', 'internet', 'magazines',
+                       'newspapers', 'outdoor_static', 'radio', 'tv', 'grand_total']
+    df[numeric_columns] = df[numeric_columns].fillna(0)
+
+    def clean_number(value):
+        value = str(value).strip()
+        if not value or value in ['nan', '', '0.0', 'None']:
+            return 0.0
+        value = re.sub(r'[^\d.,]', '', value.replace(' ', ''))
+        if not value:
+            return 0.0
+        try:
+            return float(value)
+        except ValueError:
+            return 0.0
+
+    for col in numeric_columns:
+        df[col] = df[col].astype(str).apply(clean_number)
+
+    for advertiser_name in df['advertiser_name'].unique():
+        advertiser = Advertiser.query.filter_by(name=advertiser_name).first()
+        if advertiser:
+            SpendingData.query.filter_by(advertiser_id=advertiser.id).delete()
+    db.session.flush()
+
+    for _, row in df.iterrows():
+        advertiser = Advertiser.query.filter_by(name=row['advertiser_name']).first()
+        if not advertiser:
+            advertiser = Advertiser(name=row['advertiser_name'], lead_status='non_qualified')
+            db.session.add(advertiser)
+            db.session.flush()
+        db.session.add(SpendingData(
+            advertiser_id=advertiser.id,
+            year=int(row['year']),
+            **{col: row[col] for col in numeric_columns}
+        ))
+    db.session.commit()
+
+def bulk_import(file_path):
+    df = read_spending_csv(file_path)
+    normalize_spending_frame(df)
+    import_spending_frame(df)
+    db.session.commit()
+
+def streaming_import(file_path):
+    stream_spending_csv(file_path, chunksize=Config.CSV_IMPORT_CHUNKSIZE)
+
+def snapshot():
+    """Return the imported data keyed by (advertiser name, year)."""
+    rows = db.session.query(Advertiser.name, SpendingData).join(SpendingData).all()
+    return {
+        (name, s.year): (s.cinema, s.billboard, s.indoor_tv, s.internet, s.magazines,
+                         s.newspapers, s.outdoor_static, s.radio, s.tv, s.grand_total)
+        for name, s in rows
+    }
+
+def run(engine, csv_path, workdir):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(workdir, f'{engine.__name__}.db')
+        UPLOAD_FOLDER = workdir
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.create_all()
+        start = time.perf_counter()
+        engine(csv_path)
+        elapsed = time.perf_counter() - start
+        return elapsed, snapshot()
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    advertisers = int(sys.argv[2]) if len(sys.argv) > 2 else max(rows // 5, 1)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        csv_path = os.path.join(workdir, 'spending.csv')
+        written = write_sample_csv(csv_path, rows, advertisers)
+        print(f"Generated {written} rows for {advertisers} advertisers")
+
+        legacy_time, legacy_data = run(legacy_import, csv_path, workdir)
+        print(f"Row-by-row import: {legacy_time:8.2f}s")
+
+        bulk_time, bulk_data = run(bulk_import, csv_path, workdir)
+        print(f"Set-based import:  {bulk_time:8.2f}s")
+
+        stream_time, stream_data = run(streaming_import, csv_path, workdir)
+        print(f"Streaming import:  {stream_time:8.2f}s (chunks of {Config.CSV_IMPORT_CHUNKSIZE})")
+
+        print(f"Speedup: {legacy_time / bulk_time:.1f}x")
+        if legacy_data == bulk_data == stream_data:
+            print(f"✓ All engines imported identical data ({len(bulk_data)} rows)")
+        else:
+            print("✗ Imported data differs between engines")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
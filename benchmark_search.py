@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark the FTS5 activity search against the old LIKE search.
+
+Fills a fresh SQLite database with synthetic activities (1M by default),
+then times the activity feed query (match count and first page) for a few
+search terms through both paths.
+
+Usage: python benchmark_search.py [activities] [advertisers]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, or_
+from app import create_app, db
+from app.models import Activity, Advertiser, Contact, User
+from app.search import activity_search_filter, create_search_index
+from config import Config
+
+WORDS = ['budget', 'meeting', 'proposal', 'campaign', 'television', 'radio', 'outdoor',
+         'digital', 'followed', 'up', 'sent', 'offer', 'discussed', 'plan', 'next', 'year',
+         'media', 'agency', 'tender', 'called', 'no', 'answer', 'interested', 'price']
+RARE_WORDS = ['sponsorship', 'programmatic', 'cinema']
+SURNAMES = ['Kazlauskas', 'Jankauskas', 'Petrauskas', 'Stankevičius', 'Vasiliauskas']
+
+SEARCH_TERMS = ['budget', 'programmatic', 'stankev', 'Advertiser 004', 'nonexistent']
+
+def populate(activities, advertisers):
+    rng = random.Random(42)
+    user = User(username='bench', email='bench@example.com', role='admin')
+    user.set_password('bench')
+    db.session.add(user)
+    db.session.flush()
+
+    db.session.execute(insert(Advertiser), [
+        {'name': f'Advertiser {i:05d} UAB', 'lead_status': 'non_qualified'} for i in range(advertisers)
+    ])
+    db.session.execute(insert(Contact), [
+        {'first_name': f'Contact{i}', 'last_name': rng.choice(SURNAMES),
+         'advertiser_id': i % advertisers + 1, 'added_by_id': user.id}
+        for i in range(advertisers)
+    ])
+
+    start = datetime(2020, 1, 1)
+    batch = []
+    for i in range(activities):
+        words = rng.choices(WORDS, k=rng.randint(4, 12))
+        if rng.random() < 0.001:
+            words.append(rng.choice(RARE_WORDS))
+        batch.append({
+            'advertiser_id': rng.randint(1, advertisers),
+            'user_id': user.id,
+            'contact_id': rng.randint(1, advertisers) if rng.random() < 0.3 else None,
+            'activity_type': 'call',
+            'description': ' '.join(words),
+            'outcome': rng.choice(['positive', 'neutral', 'negative', None]),
+            'created_at': start + timedelta(seconds=i * 60)
+        })
+        if len(batch) == 50000:
+            db.session.execute(insert(Activity), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(Activity), batch)
+    db.session.commit()
+
+def like_filter(search):
+    """The previous activity feed filter (five LIKE columns over an outer join)."""
+    return or_(
+        Activity.description.contains(search),
+        Activity.outcome.contains(search),
+        Advertiser.name.contains(search),
+        Contact.first_name.contains(search),
+        Contact.last_name.contains(search)
+    )
+
+def like_query(search):
+    return Activity.query.join(Advertiser).filter(like_filter(search)).outerjoin(
+        Contact, Activity.contact_id == Contact.id
+    )
+
+def fts_query(search):
+    return Activity.query.join(Advertiser).filter(activity_search_filter(search))
+
+def timed(f):
+    start = time.perf_counter()
+    result = f()
+    return time.perf_counter() - start, result
+
+def run_term(build, search):
+    count_time, count = timed(lambda: build(search).with_entities(func.count(Activity.id)).scalar())
+    page_time, _ = timed(lambda: build(search).order_by(
+        Activity.created_at.desc(), Activity.id.desc()
+    ).limit(50).all())
+    return count, count_time, page_time
+
+def main():
+    activities = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    advertisers = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+
+    with tempfile.TemporaryDirectory() as workdir:
+        class BenchConfig(Config):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(workdir, 'search.db')
+            UPLOAD_FOLDER = workdir
+
+        app = create_app(BenchConfig)
+        with app.app_context():
+            db.create_all()
+            create_search_index()
+
+            load_time, _ = timed(lambda: populate(activities, advertisers))
+            print(f"Loaded {activities} activities for {advertisers} advertisers in {load_time:.1f}s "
+                  f"(indexed by triggers)")
+
+            print(f"{'search':<16}{'matches':>10}{'LIKE count':>12}{'FTS count':>11}"
+                  f"{'LIKE page':>11}{'FTS page':>10}")
+            for search in SEARCH_TERMS:
+                like_count, like_count_time, like_page_time = run_term(like_query, search)
+                fts_count, fts_count_time, fts_page_time = run_term(fts_query, search)
+                print(f"{search:<16}{fts_count:>10}{like_count_time:>11.3f}s{fts_count_time:>10.3f}s"
+                      f"{like_page_time:>10.3f}s{fts_page_time:>9.3f}s"
+                      + ("" if like_count == fts_count else f"  (LIKE matched {like_count})"))
+
+if __name__ == '__main__':
+    main()
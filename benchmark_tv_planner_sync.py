@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Benchmark the TV Planner campaign sync against a local fake TV Planner.
+
+Starts a fake API that serves N campaigns and answers each
+/campaigns/{id}/spending call after a fixed latency (failing a fraction of
+them with 503 to exercise retries), then runs the sync into a fresh SQLite
+database serially (concurrency 1, the old behaviour) and concurrently.
+
+Usage: python benchmark_tv_planner_sync.py [campaigns] [latency_ms] [concurrency] [fail_rate]
+"""
+
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sqlalchemy import insert
+from app import create_app, db
+from app.http_client import http_client
+from app.integrations.routes import apply_campaign_spending
+from app.models import Activity, Advertiser, SpendingData, User
+from app.tv_planner_sync import sync_campaigns
+from config import Config
+
+def make_fake_tv_planner(campaigns, latency, fail_rate):
+    rng = random.Random(1)
+    lock = threading.Lock()
+
+    class FakeTVPlanner(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # Keep-alive, like the real API
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            status, body = 200, None
+            if self.path == '/api/campaigns':
+                body = [{'id': i, 'name': f'Advertiser {i:05d} - Spring'} for i in range(campaigns)]
+            elif self.path.startswith('/api/campaigns/') and self.path.endswith('/spending'):
+                time.sleep(latency)
+                with lock:
+                    failed = rng.random() < fail_rate
+                if failed:
+                    status, body = 503, {'error': 'busy'}
+                else:
+                    body = {'total_spending': int(self.path.split('/')[3]) * 10}
+            else:
+                status, body = 404, {'error': 'not found'}
+
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return FakeTVPlanner
+
+def run_sync(app, api_url, concurrency):
+    with app.app_context():
+        db.session.query(Activity).delete()
+        db.session.query(SpendingData).delete()
+        db.session.commit()
+        http_client.close()
+
+        def apply_campaign(campaign, spending):
+            campaign['total_spending'] = spending.get('total_spending', 0)
+            return apply_campaign_spending(campaign)
+
+        start = time.perf_counter()
+        campaigns = http_client.get(f"{api_url}/campaigns").json()
+        synced, failed = sync_campaigns(api_url, {}, campaigns, apply_campaign, concurrency=concurrency)
+        elapsed = time.perf_counter() - start
+
+        metrics = http_client.get_metrics()[api_url.rsplit('/', 1)[0]]
+        spending_rows = SpendingData.query.count()
+        print(f"  concurrency {concurrency:>3}: {elapsed:7.2f}s  {synced} campaigns, {failed} failed, "
+              f"{spending_rows} spending rows, {metrics['requests']} requests "
+              f"over {metrics['connections_opened']} connections")
+        return elapsed
+
+def main():
+    campaigns = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    latency = (int(sys.argv[2]) if len(sys.argv) > 2 else 20) / 1000
+    concurrency = int(sys.argv[3]) if len(sys.argv) > 3 else 16
+    fail_rate = float(sys.argv[4]) if len(sys.argv) > 4 else 0.02
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_fake_tv_planner(campaigns, latency, fail_rate))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api_url = f"http://127.0.0.1:{server.server_address[1]}/api"
+
+    with tempfile.TemporaryDirectory() as workdir:
+        class BenchConfig(Config):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+            UPLOAD_FOLDER = workdir
+            HTTP_POOL_MAXSIZE = concurrency
+            TV_PLANNER_SYNC_RETRY_SECONDS = 0.05
+
+        app = create_app(BenchConfig)
+        with app.app_context():
+            db.create_all()
+            user = User(id=1, username='bench', email='bench@example.com', role='admin')
+            user.set_password('bench')
+            db.session.add(user)
+            db.session.execute(insert(Advertiser), [
+                {'name': f'Advertiser {i:05d}', 'lead_status': 'non_qualified'} for i in range(campaigns)
+            ])
+            db.session.commit()
+
+        print(f"{campaigns} campaigns, {latency * 1000:.0f} ms per spending call, {fail_rate:.0%} answered 503")
+        serial = run_sync(app, api_url, 1)
+        concurrent = run_sync(app, api_url, concurrency)
+        print(f"  speedup: {serial / concurrent:.1f}x")
+
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Compare advertiser.last_activity_at with the newest row in the activity table.
+Fails (exit code 1) if any advertiser is out of date, which means activities
+were written without going through the ORM flush (raw SQL, bulk statements).
+
+Usage: python check_last_activity.py [--fix]
+"""
+
+import sys
+
+from app import create_app, db
+from app.activity_summary import find_last_activity_mismatches, refresh_last_activity
+
+def check_last_activity(fix=False, show=20):
+    """Print mismatched advertisers; with ``fix`` recompute them. Returns the mismatch count."""
+    mismatches = find_last_activity_mismatches()
+    for advertiser_id, stored, actual in mismatches[:show]:
+        print(f"✗ advertiser {advertiser_id}: last_activity_at {stored} but newest activity {actual}")
+    if len(mismatches) > show:
+        print(f"  ... and {len(mismatches) - show} more")
+
+    if fix and mismatches:
+        refresh_last_activity([advertiser_id for advertiser_id, _, _ in mismatches])
+        db.session.commit()
+        print(f"✓ Recomputed last_activity_at for {len(mismatches)} advertisers")
+    return len(mismatches)
+
+if __name__ == '__main__':
+    app = create_app()
+    with app.app_context():
+        fix = '--fix' in sys.argv
+        count = check_last_activity(fix=fix)
+    if count and not fix:
+        print(f"✗ {count} advertisers have a stale last_activity_at (run with --fix)")
+        sys.exit(1)
+    print("✓ last_activity_at matches the activity table" if not count else "✓ Fixed")
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Render the main pages against a seeded database and count the SQL statements
+each one runs. Fails (exit code 1) if a page goes over its budget, which
+usually means a template started lazy-loading a relationship per row.
+
+Usage: python check_query_budgets.py [-v]
+"""
+
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+from app import create_app, db
+from app.models import Activity, Advertiser, Attachment, Contact, SpendingData, User
+from app.search import create_search_index
+from config import Config
+
+# url -> maximum number of SQL statements for one render.
+# Budgets don't depend on page size: lists must load their rows in a
+# fixed number of queries.
+QUERY_BUDGETS = {
+    '/': 8,
+    '/?format=json': 8,
+    '/advertisers/': 5,
+    '/advertisers/?sort=name': 5,
+    '/advertisers/?search=advertiser': 5,
+    '/advertisers/{advertiser_id}': 12,
+    '/contacts/': 6,
+    '/activities/feed': 7,
+    '/activities/feed?search=budget': 7,
+    '/reports/dashboard': 6,
+    '/reports/spending_analysis': 4
+}
+
+def seed(rng):
+    """Fill the database with enough rows that every list shows a full page."""
+    users = []
+    for i, role in enumerate(['admin', 'team_lead'] + ['account_executive'] * 18):
+        user = User(username=f'user{i}', email=f'user{i}@example.com', role=role)
+        user.set_password('password')
+        users.append(user)
+    db.session.add_all(users)
+    db.session.flush()
+
+    statuses = ['non_qualified', 'cold', 'warm', 'hot', 'get_info', 'ours']
+    advertisers = [
+        Advertiser(name=f'Advertiser {i:03d}', lead_status=rng.choice(statuses),
+                   assigned_user_id=rng.choice(users).id,
+                   latest_gross_spending=rng.randint(0, 100000),
+                   latest_net_spending=rng.randint(0, 50000))
+        for i in range(150)
+    ]
+    db.session.add_all(advertisers)
+    db.session.flush()
+
+    for advertiser in advertisers[:30]:
+        for year in (2023, 2024):
+            db.session.add(SpendingData(advertiser_id=advertiser.id, year=year, tv=1000, grand_total=1000))
+
+    contacts = []
+    for i in range(150):
+        contact = Contact(first_name=f'First{i}', last_name=f'Last{i % 40}',
+                          advertiser_id=advertisers[i].id, added_by_id=rng.choice(users).id)
+        db.session.add(contact)
+        contacts.append(contact)
+    db.session.flush()
+    for contact in contacts[:50]:
+        contact.linked_advertisers = rng.sample(advertisers, 2)
+
+    start = datetime.utcnow() - timedelta(days=30)
+    for i in range(300):
+        advertiser = advertisers[i % 60]
+        activity = Activity(advertiser_id=advertiser.id, user_id=rng.choice(users).id,
+                            contact_id=rng.choice(contacts).id if i % 3 == 0 else None,
+                            activity_type=rng.choice(['call', 'email', 'meeting', 'note']),
+                            description=f'Discussed budget {i}', outcome='ok',
+                            created_at=start + timedelta(minutes=i))
+        db.session.add(activity)
+        if i % 10 == 0:
+            db.session.flush()
+            db.session.add(Attachment(advertiser_id=advertiser.id, activity_id=activity.id,
+                                      filename=f'file{i}.pdf', file_path=f'/tmp/file{i}.pdf',
+                                      uploaded_by_id=users[0].id))
+    db.session.commit()
+    return advertisers[0].id
+
+def check_query_budgets(verbose=False):
+    """Render every page in QUERY_BUDGETS. Returns a list of (url, count, budget) over budget."""
+    with tempfile.TemporaryDirectory() as workdir:
+        class BudgetConfig(Config):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(workdir, 'budget.db')
+            UPLOAD_FOLDER = workdir
+            WTF_CSRF_ENABLED = False
+            JOB_EXECUTOR = 'worker'
+
+        app = create_app(BudgetConfig)
+        with app.app_context():
+            db.create_all()
+            create_search_index()
+            advertiser_id = seed(random.Random(7))
+            engine = db.engine
+
+        statements = []
+
+        def count_statement(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        client = app.test_client()
+        client.post('/auth/login', data={'username': 'user0', 'password': 'password'})
+
+        failures = []
+        event.listen(engine, 'before_cursor_execute', count_statement)
+        try:
+            for url, budget in QUERY_BUDGETS.items():
+                url = url.format(advertiser_id=advertiser_id)
+                statements.clear()
+                response = client.get(url)
+                count = len(statements)
+                ok = response.status_code == 200 and count <= budget
+                print(f"{'✓' if ok else '✗'} {url:<40} {count:>4} queries (budget {budget})"
+                      + ("" if response.status_code == 200 else f" - HTTP {response.status_code}"))
+                if verbose and not ok:
+                    for statement in statements:
+                        print('    ' + ' '.join(statement.split())[:160])
+                if not ok:
+                    failures.append((url, count, budget))
+        finally:
+            event.remove(engine, 'before_cursor_execute', count_statement)
+
+        return failures
+
+if __name__ == '__main__':
+    failures = check_query_budgets(verbose='-v' in sys.argv)
+    if failures:
+        print(f"✗ {len(failures)} pages over their query budget")
+        sys.exit(1)
+    print("✓ All pages within their query budgets")
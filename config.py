@@ -10,5 +10,49 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     UPLOAD_FOLDER = os.path.join(basedir, 'uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
+    CSV_IMPORT_CHUNKSIZE = 10000  # Rows per committed chunk when streaming CSV imports
+    # Background jobs: 'thread' runs them in-process, 'worker' leaves them for run_worker.py
+    JOB_EXECUTOR = os.environ.get('JOB_EXECUTOR') or 'thread'
+    JOB_WORKERS = 2
+    JOB_STALE_MINUTES = 60  # Running jobs older than this are requeued by run_worker.py
+    # Report exports run as jobs, written to UPLOAD_FOLDER/exports
+    EXPORT_TTL_HOURS = 24  # Files and download links expire after this
+    EXPORT_DEDUP_MINUTES = 10  # Identical requests this recent reuse the same export
+    EXPORT_MAX_CONCURRENT = 2  # Queued or running exports per user
+    # Outgoing webhooks: delivered from the webhook_delivery outbox with retries
+    WEBHOOK_WORKERS = 4  # Concurrent deliveries
+    WEBHOOK_TIMEOUT = 10  # Seconds per request
+    WEBHOOK_MAX_ATTEMPTS = 8  # Then the delivery is dead-lettered
+    WEBHOOK_RETRY_BASE_SECONDS = 30  # Backoff doubles per attempt: 30s, 1m, 2m, ...
+    WEBHOOK_RETRY_MAX_SECONDS = 3600
+    WEBHOOK_POLL_INTERVAL = 5  # Seconds between checks for due retries
+    WEBHOOK_BATCH_SIZE = 50
+    WEBHOOK_STALE_MINUTES = 10
+    # Incoming webhooks: concurrent single events are applied in shared transactions
+    WEBHOOK_INGEST_BATCHING = True
+    WEBHOOK_INGEST_BATCH_SIZE = 100  # Flush when this many events are waiting...
+    WEBHOOK_INGEST_MAX_WAIT_MS = 20  # ...or this long after the first one
+    WEBHOOK_INGEST_TIMEOUT = 30  # Seconds a request waits for its batch before answering 503
+    WEBHOOK_INGEST_MAX_BATCH = 1000  # Events accepted by the /batch endpoints
+    ADVERTISER_RESOLVER_TTL = 300  # Seconds before the integration name index is reloaded
+    # Dashboard aggregates, shared by all workers in <database>-aggregates.db
+    AGGREGATE_CACHE_ENABLED = True
+    AGGREGATE_CACHE_TTL = 300  # Seconds; writes through the ORM invalidate entries sooner
+    AGGREGATE_CACHE_PATH = None  # Defaults to a file next to the SQLite database
+    SPENDING_CUBE_TTL = 600  # Seconds between spending cube rebuilds when there is no aggregate cache
+    # Outgoing HTTP (integrations and webhooks): one keep-alive pool per host
+    HTTP_POOL_MAXSIZE = 10  # Connections kept open per host
+    HTTP_POOL_BLOCK = False  # True: wait for a free connection instead of opening an extra one
+    HTTP_CONNECT_TIMEOUT = 5  # Seconds
+    HTTP_READ_TIMEOUT = 30  # Seconds
+    # TV Planner sync: per-campaign spending requests run concurrently
+    TV_PLANNER_SYNC_CONCURRENCY = 8  # Keep <= HTTP_POOL_MAXSIZE so connections are reused
+    TV_PLANNER_SYNC_RETRIES = 3  # Per request, for connection errors and 429/5xx
+    TV_PLANNER_SYNC_RETRY_SECONDS = 0.5  # Backoff base, doubles per retry
+    TV_PLANNER_SYNC_BATCH_SIZE = 200  # Campaigns per committed write batch
+    # Scheduled syncs: enabled and timed by integration_config.py
+    SYNC_JITTER_SECONDS = 60  # Random delay added to each scheduled integration sync
+    SYNC_POLL_SECONDS = 60  # How often the scheduler rechecks integration_config.py
+    SYNC_STALE_MINUTES = 60  # Runs 'running' longer than this no longer block their source
     # CSRF configuration
     WTF_CSRF_TIME_LIMIT = None
\ No newline at end of file
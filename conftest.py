@@ -0,0 +1,50 @@
+"""Fixtures for the pytest suites: an app on a throwaway SQLite database."""
+
+import pytest
+from config import Config
+from app import create_app, db
+from app.models import User
+from app.name_resolver import advertiser_name_resolver
+
+
+@pytest.fixture
+def app(tmp_path):
+    class TestConfig(Config):
+        TESTING = True
+        WTF_CSRF_ENABLED = False
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / 'test.db')
+        UPLOAD_FOLDER = str(tmp_path / 'uploads')
+        # Jobs and webhooks stay queued for the tests to inspect
+        JOB_EXECUTOR = 'worker'
+
+    app = create_app(TestConfig)
+    advertiser_name_resolver.invalidate()  # Built from another test's database
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def make_user(app):
+    """Create a user and return their id."""
+    def make_user(username, role='account_executive'):
+        with app.app_context():
+            user = User(username=username, email=f'{username}@example.com', role=role)
+            user.set_password('password')
+            db.session.add(user)
+            db.session.commit()
+            return user.id
+    return make_user
+
+
+@pytest.fixture
+def login(app):
+    """A test client logged in as ``username``."""
+    def login(username):
+        client = app.test_client()
+        client.post('/auth/login', data={'username': username, 'password': 'password'})
+        return client
+    return login
@@ -1,6 +1,7 @@
 import os
 from app import create_app, db
 from app.models import User
+from app.search import create_search_index
 
 app = create_app()
 
@@ -11,6 +12,10 @@ with app.app_context():
     # Create all tables
     db.create_all()
     
+    # Full-text search index (SQLite only)
+    if db.engine.dialect.name == 'sqlite':
+        create_search_index()
+    
     # Create admin user if it doesn't exist
     admin = User.query.filter_by(username='admin').first()
     if not admin:
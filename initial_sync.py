@@ -10,8 +10,13 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from app import create_app, db
 from app.models import Advertiser, SpendingData, Contact, Activity, User
+from app.http_client import http_client
+from app.tv_planner_sync import sync_campaigns
+from app.name_resolver import resolve_advertiser
+from app.external_refs import find_local, link_external
+from app.agency_crm_sync import sync_agency_crm
+from app.integrations.routes import brand_advertiser, rename_advertiser
 from datetime import datetime
-import requests
 import json
 
 # Import configuration
@@ -42,42 +47,20 @@ def sync_all_from_agency_crm():
         print("✓ Created system user")
     
     try:
-        # Sync Companies
-        print("Syncing companies...")
-        response = requests.get(f"{base_url}/companies", headers=headers)
-        if response.status_code == 200:
-            companies = response.json()
-            for company in companies:
-                sync_company_to_advertiser(company, system_user.id)
-            print(f"✓ Synced {len(companies)} companies")
-        else:
-            print(f"✗ Failed to get companies: {response.status_code}")
-        
-        # Sync Brands
-        print("Syncing brands...")
-        response = requests.get(f"{base_url}/brands", headers=headers)
-        if response.status_code == 200:
-            brands = response.json()
-            for brand in brands:
-                sync_brand_to_advertiser(brand, system_user.id)
-            print(f"✓ Synced {len(brands)} brands")
-        else:
-            print(f"✗ Failed to get brands: {response.status_code}")
-        
-        # Sync Contacts
-        print("Syncing contacts...")
-        response = requests.get(f"{base_url}/contacts", headers=headers)
-        if response.status_code == 200:
-            contacts = response.json()
-            for contact in contacts:
-                sync_contact_from_crm(contact, system_user.id)
-            print(f"✓ Synced {len(contacts)} contacts")
-        else:
-            print(f"✗ Failed to get contacts: {response.status_code}")
+        # Companies, brands and contacts changed since the last run (all of them the first time)
+        print("Syncing companies, brands and contacts...")
+        counts = sync_agency_crm(base_url, config.AGENCY_CRM_API_KEY, full='--full' in sys.argv, handlers={
+            'companies': lambda company: sync_company_to_advertiser(company, system_user.id),
+            'brands': lambda brand: sync_brand_to_advertiser(brand, system_user.id),
+            'contacts': lambda contact: sync_contact_from_crm(contact, system_user.id)
+        })
+        for resource, resource_counts in counts.items():
+            print(f"✓ {resource}: {resource_counts['changed']} synced, "
+                  f"{resource_counts['unchanged']} unchanged")
         
         # Sync Recent Invoices
         print("Syncing recent invoices...")
-        response = requests.get(f"{base_url}/invoices", headers=headers)
+        response = http_client.get(f"{base_url}/invoices", headers=headers)
         if response.status_code == 200:
             invoices = response.json()
             for invoice in invoices[:50]:  # Limit to 50 most recent
@@ -88,7 +71,7 @@ def sync_all_from_agency_crm():
         
         # Sync Recent Status Updates
         print("Syncing recent status updates...")
-        response = requests.get(f"{base_url}/status-updates?limit=100", headers=headers)
+        response = http_client.get(f"{base_url}/status-updates?limit=100", headers=headers)
         if response.status_code == 200:
             updates = response.json()
             for update in updates:
@@ -112,26 +95,23 @@ def sync_all_from_tv_planner():
     try:
         # Sync Campaigns
         print("Syncing campaigns...")
-        response = requests.get(f"{base_url}/campaigns", headers=headers)
+        response = http_client.get(f"{base_url}/campaigns", headers=headers)
         if response.status_code == 200:
-            campaigns = response.json()
-            for campaign in campaigns:
-                # Get spending data for each campaign
-                spending_response = requests.get(
-                    f"{base_url}/campaigns/{campaign['id']}/spending",
-                    headers=headers
-                )
-                if spending_response.status_code == 200:
-                    spending_data = spending_response.json()
-                    campaign.update(spending_data)
-                sync_campaign_spending_data(campaign, system_user.id)
-            print(f"✓ Synced {len(campaigns)} campaigns")
+            def apply_campaign(campaign, spending):
+                campaign.update(spending)
+                return sync_campaign_spending_data(campaign, system_user.id)
+            
+            # Spending is fetched concurrently; writes are committed in batches
+            synced, failed = sync_campaigns(base_url, headers, response.json(), apply_campaign)
+            print(f"✓ Synced {synced} campaigns")
+            if failed:
+                print(f"⚠ Could not fetch spending for {failed} campaigns")
         else:
             print(f"✗ Failed to get campaigns: {response.status_code}")
         
         # Sync Contacts from TV Planner
         print("Syncing TV planner contacts...")
-        response = requests.get(f"{base_url}/contacts", headers=headers)
+        response = http_client.get(f"{base_url}/contacts", headers=headers)
         if response.status_code == 200:
             contacts = response.json()
             for contact in contacts:
@@ -145,7 +125,11 @@ def sync_all_from_tv_planner():
 
 def sync_company_to_advertiser(company_data, user_id):
     """Sync company from agency-crm to advertiser"""
-    advertiser = Advertiser.query.filter_by(name=company_data['name']).first()
+    advertiser = find_local('agency-crm', 'company', company_data.get('id'))
+    if advertiser:
+        rename_advertiser(advertiser, company_data.get('name'))
+    else:
+        advertiser = resolve_advertiser(company_data['name'], partial=False)
     
     if not advertiser:
         advertiser = Advertiser(
@@ -170,11 +154,16 @@ def sync_company_to_advertiser(company_data, user_id):
     else:
         # Update existing
         advertiser.lead_status = 'ours'
+    link_external('agency-crm', 'company', company_data.get('id'), advertiser)
 
 def sync_brand_to_advertiser(brand_data, user_id):
     """Sync brand from agency-crm to advertiser"""
     advertiser_name = f"{brand_data.get('company_name', 'Unknown')} - {brand_data['name']}"
-    advertiser = Advertiser.query.filter_by(name=advertiser_name).first()
+    advertiser = find_local('agency-crm', 'brand', brand_data.get('id'))
+    if advertiser:
+        rename_advertiser(advertiser, advertiser_name)
+    else:
+        advertiser = resolve_advertiser(advertiser_name, partial=False)
     
     if not advertiser:
         advertiser = Advertiser(
@@ -196,52 +185,62 @@ def sync_brand_to_advertiser(brand_data, user_id):
             created_at=datetime.utcnow()
         )
         db.session.add(activity)
+    link_external('agency-crm', 'brand', brand_data.get('id'), advertiser)
 
 def sync_contact_from_crm(contact_data, user_id):
-    """Sync contact from agency-crm"""
+    """Sync contact from agency-crm: one contact, linked to the advertisers of all its brands"""
     if not contact_data.get('email'):
         return  # Skip contacts without email
     
+    advertisers = []
     for brand in contact_data.get('brands', []):
-        advertiser = Advertiser.query.filter(
-            Advertiser.name.contains(brand['name'])
+        advertiser = brand_advertiser(brand.get('id'), brand['name'])
+        if advertiser and advertiser not in advertisers:
+            advertisers.append(advertiser)
+    if not advertisers:
+        return
+    
+    contact = find_local('agency-crm', 'contact', contact_data.get('id'))
+    if not contact:
+        contact = Contact.query.filter_by(
+            advertiser_id=advertisers[0].id,
+            email=contact_data['email']
         ).first()
-        
-        if advertiser:
-            existing_contact = Contact.query.filter_by(
-                advertiser_id=advertiser.id,
-                email=contact_data['email']
-            ).first()
-            
-            if not existing_contact:
-                contact = Contact(
-                    advertiser_id=advertiser.id,
-                    first_name=contact_data.get('first_name', ''),
-                    last_name=contact_data.get('last_name', ''),
-                    email=contact_data['email'],
-                    phone=contact_data.get('phone'),
-                    linkedin_url=contact_data.get('linkedin_url'),
-                    added_by_id=user_id,
-                    created_at=datetime.utcnow()
-                )
-                db.session.add(contact)
+    
+    if not contact:
+        contact = Contact(
+            advertiser_id=advertisers[0].id,
+            agency_crm_id=contact_data.get('id'),
+            first_name=contact_data.get('first_name', ''),
+            last_name=contact_data.get('last_name', ''),
+            email=contact_data['email'],
+            phone=contact_data.get('phone'),
+            linkedin_url=contact_data.get('linkedin_url'),
+            added_by_id=user_id,
+            created_at=datetime.utcnow()
+        )
+        db.session.add(contact)
+        db.session.flush()
+    link_external('agency-crm', 'contact', contact_data.get('id'), contact)
+    contact.set_related_advertisers([advertiser.id for advertiser in advertisers[1:]], user_id=user_id)
 
 def sync_contact_from_tv(contact_data, user_id):
     """Sync contact from tv-planner"""
     if not contact_data.get('email'):
         return
     
+    if find_local('tv-planner', 'contact', contact_data.get('id')):
+        return  # Already synced
+    
     # Try to find a matching advertiser by company name
     advertiser = None
     if contact_data.get('company'):
-        advertiser = Advertiser.query.filter(
-            Advertiser.name.contains(contact_data['company'])
-        ).first()
+        advertiser = resolve_advertiser(contact_data['company'])
     
     # If no match found, create a generic advertiser
     if not advertiser:
         company_name = contact_data.get('company', 'TV Planner Contact')
-        advertiser = Advertiser.query.filter_by(name=company_name).first()
+        advertiser = resolve_advertiser(company_name, partial=False)
         
         if not advertiser:
             advertiser = Advertiser(
@@ -254,12 +253,12 @@ def sync_contact_from_tv(contact_data, user_id):
             db.session.flush()
     
     # Add contact if not exists
-    existing_contact = Contact.query.filter_by(
+    contact = Contact.query.filter_by(
         advertiser_id=advertiser.id,
         email=contact_data['email']
     ).first()
     
-    if not existing_contact:
+    if not contact:
         contact = Contact(
             advertiser_id=advertiser.id,
             first_name=contact_data.get('name', '').split(' ')[0] if contact_data.get('name') else '',
@@ -270,39 +269,34 @@ def sync_contact_from_tv(contact_data, user_id):
             created_at=datetime.utcnow()
         )
         db.session.add(contact)
+    link_external('tv-planner', 'contact', contact_data.get('id'), contact)
 
 def create_invoice_activity_sync(invoice_data, user_id):
     """Create activity for invoice from sync"""
-    advertiser = Advertiser.query.filter(
-        Advertiser.name.contains(invoice_data.get('brand_name', ''))
-    ).first()
+    if find_local('agency-crm', 'invoice', invoice_data.get('id')):
+        return  # Already synced
+    
+    advertiser = brand_advertiser(invoice_data.get('brand_id'), invoice_data.get('brand_name', ''))
     
     if advertiser:
-        # Check if we already have this invoice activity
-        existing = Activity.query.filter_by(
+        activity = Activity(
             advertiser_id=advertiser.id,
-            activity_type='note'
-        ).filter(
-            Activity.description.contains(f"Invoice: {invoice_data.get('invoice_date')}")
-        ).first()
-        
-        if not existing:
-            activity = Activity(
-                advertiser_id=advertiser.id,
-                user_id=user_id,
-                activity_type='note',
-                description=f"Invoice: {invoice_data.get('invoice_date')} - "
-                           f"Amount: {invoice_data.get('total_amount')} EUR",
-                outcome='Invoice from Agency CRM',
-                created_at=datetime.utcnow()
-            )
-            db.session.add(activity)
+            user_id=user_id,
+            activity_type='note',
+            description=f"Invoice: {invoice_data.get('invoice_date')} - "
+                       f"Amount: {invoice_data.get('total_amount')} EUR",
+            outcome='Invoice from Agency CRM',
+            created_at=datetime.utcnow()
+        )
+        db.session.add(activity)
+        link_external('agency-crm', 'invoice', invoice_data.get('id'), activity)
 
 def create_status_activity_sync(update_data, user_id):
     """Create activity for status update from sync"""
-    advertiser = Advertiser.query.filter(
-        Advertiser.name.contains(update_data.get('brand_name', ''))
-    ).first()
+    if find_local('agency-crm', 'status_update', update_data.get('id')):
+        return  # Already synced
+    
+    advertiser = brand_advertiser(update_data.get('brand_id'), update_data.get('brand_name', ''))
     
     if advertiser:
         activity = Activity(
@@ -314,20 +308,23 @@ def create_status_activity_sync(update_data, user_id):
             created_at=datetime.utcnow()
         )
         db.session.add(activity)
+        link_external('agency-crm', 'status_update', update_data.get('id'), activity)
 
 def sync_campaign_spending_data(campaign_data, user_id):
-    """Sync campaign spending from tv-planner"""
+    """Sync campaign spending from tv-planner (no commit). Returns the advertiser id."""
     # Try to match campaign name to advertiser
     campaign_name = campaign_data.get('name', '')
     advertiser_name = campaign_name.split('-')[0].strip() if campaign_name else ''
     
-    if not advertiser_name:
+    # A campaign synced before keeps its advertiser
+    activity = find_local('tv-planner', 'campaign', campaign_data.get('id'))
+    if activity:
+        advertiser = activity.advertiser
+    elif advertiser_name:
+        advertiser = resolve_advertiser(advertiser_name)
+    else:
         return
     
-    advertiser = Advertiser.query.filter(
-        Advertiser.name.contains(advertiser_name)
-    ).first()
-    
     if not advertiser:
         # Create new advertiser from campaign
         advertiser = Advertiser(
@@ -358,16 +355,22 @@ def sync_campaign_spending_data(campaign_data, user_id):
     if total_spending > 0:
         spending.tv = max(spending.tv or 0, total_spending)
     
-    # Add activity
-    activity = Activity(
-        advertiser_id=advertiser.id,
-        user_id=user_id,
-        activity_type='note',
-        description=f"Initial sync: TV Campaign '{campaign_name}'",
-        outcome=f"Spending: {total_spending} EUR" if total_spending else "Campaign data synchronized",
-        created_at=datetime.utcnow()
-    )
-    db.session.add(activity)
+    # Add activity, or update the one from the last sync
+    outcome = f"Spending: {total_spending} EUR" if total_spending else "Campaign data synchronized"
+    if activity:
+        activity.outcome = outcome
+    else:
+        activity = Activity(
+            advertiser_id=advertiser.id,
+            user_id=user_id,
+            activity_type='note',
+            description=f"Initial sync: TV Campaign '{campaign_name}'",
+            outcome=outcome,
+            created_at=datetime.utcnow()
+        )
+        db.session.add(activity)
+        link_external('tv-planner', 'campaign', campaign_data.get('id'), activity)
+    return advertiser.id
 
 def main():
     print("=" * 60)
@@ -394,6 +397,11 @@ def main():
             db.session.rollback()
             print(f"\n✗ Error committing data: {e}")
             return
+        
+        for host, metrics in http_client.get_metrics().items():
+            print(f"  {host}: {metrics['requests']} requests, "
+                  f"{metrics['connections_opened']} connections, "
+                  f"avg {metrics['avg_latency_ms']} ms")
     
     print("\n" + "=" * 60)
     print("Initial Sync Complete!")
@@ -1,3 +1,4 @@
+import os
 from app import create_app, db
 from app.models import User, Advertiser, SpendingData, Activity, LeadStatusHistory, Attachment
 
@@ -16,4 +17,13 @@ def make_shell_context():
     }
 
 if __name__ == '__main__':
+    # Scheduled syncs, queued jobs and webhook deliveries run here unless run_worker.py takes them
+    # (JOB_EXECUTOR=worker); with the reloader only the serving child process starts them
+    if app.config.get('JOB_EXECUTOR', 'thread') == 'thread' and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        from app.jobs import job_queue
+        from app.sync_scheduler import sync_scheduler
+        from app.webhook_delivery import webhook_dispatcher
+        job_queue.start()
+        webhook_dispatcher.start()
+        sync_scheduler.start()
     app.run(host='0.0.0.0', port=5001, debug=True)
\ No newline at end of file
@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+"""
+Background job worker.
+Runs queued jobs (CSV imports), delivers outgoing webhooks and runs the
+scheduled integration syncs outside the web server. Use it with
+JOB_EXECUTOR=worker, or alongside the default in-process thread pool to pick
+up work left behind by a restart.
+"""
+
+from app import create_app
+from app.jobs import job_queue
+from app.webhook_delivery import webhook_dispatcher
+from app.sync_scheduler import sync_scheduler
+
+app = create_app()
+
+if __name__ == '__main__':
+    print("Job worker started, waiting for jobs...")
+    webhook_dispatcher.start()
+    sync_scheduler.start()
+    job_queue.work()
@@ -16,6 +16,7 @@ def sync_advertiser_names():
         sys.path.append(os.path.dirname(__file__))
         from app import create_app, db
         from app.models import Advertiser
+        from app.http_client import http_client
         
         app = create_app()
         
@@ -24,7 +25,7 @@ def sync_advertiser_names():
             
             # Get all brands from Agency CRM API
             try:
-                response = requests.get('http://localhost:5000/api/brands', timeout=10)
+                response = http_client.get('http://localhost:5000/api/brands', timeout=10)
                 if response.status_code != 200:
                     print(f"❌ Failed to fetch brands from Agency CRM: {response.status_code}")
                     return False
@@ -0,0 +1,25 @@
+from app import db
+from app.models import Advertiser, Contact, Webhook, WebhookDelivery
+
+
+def test_contact_updated_payload_follows_primary_change(app, make_user, login):
+    lead_id = make_user('lead', role='team_lead')
+    with app.app_context():
+        alpha, beta, gamma = (Advertiser(name=name) for name in ('Alpha', 'Beta', 'Gamma'))
+        db.session.add_all([alpha, beta, gamma])
+        db.session.add(Webhook(url='http://crm.example.com/hook', events=['contact.updated'], secret='s'))
+        db.session.flush()
+        contact = Contact(first_name='Ann', last_name='Lee', advertiser_id=alpha.id, added_by_id=lead_id)
+        db.session.add(contact)
+        contact.set_related_advertisers([alpha.id, gamma.id], lead_id)
+        db.session.commit()
+        contact_id, beta_id, gamma_id = contact.id, beta.id, gamma.id
+
+    response = login('lead').post(f'/contacts/{contact_id}/edit', data={
+        'first_name': 'Ann', 'last_name': 'Lee', 'advertisers': [beta_id, gamma_id]
+    })
+    assert response.status_code == 302
+
+    with app.app_context():
+        delivery = WebhookDelivery.query.filter_by(event='contact.updated').one()
+        assert [brand['name'] for brand in delivery.payload['brands']] == ['Beta', 'Gamma']
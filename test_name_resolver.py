@@ -0,0 +1,71 @@
+from sqlalchemy import insert
+from app import db
+from app.models import Advertiser
+from app.name_resolver import advertiser_name_resolver, resolve_advertiser
+
+
+def resolve_elsewhere(app, name):
+    """Resolve ``name`` from another session (another request or thread)."""
+    with app.app_context():
+        advertiser = resolve_advertiser(name)
+        return advertiser.name if advertiser else None
+
+
+def test_uncommitted_advertisers_are_only_seen_by_their_session(app):
+    with app.app_context():
+        db.session.add(Advertiser(name='Alpha UAB'))
+        db.session.commit()
+        assert resolve_advertiser('Alpha').name == 'Alpha UAB'  # Index built
+
+        db.session.add(Advertiser(name='Alpha Media'))
+        db.session.flush()
+        assert resolve_advertiser('Alpha Media').name == 'Alpha Media'
+        # Not yet an ambiguous match for the others
+        assert resolve_elsewhere(app, 'Alpha') == 'Alpha UAB'
+        assert resolve_elsewhere(app, 'Alpha Media') is None
+
+        db.session.commit()
+        assert resolve_elsewhere(app, 'Alpha Media') == 'Alpha Media'
+
+
+def test_rolled_back_changes_are_discarded(app):
+    with app.app_context():
+        beta = Advertiser(name='Beta')
+        db.session.add(beta)
+        db.session.commit()
+        assert resolve_advertiser('Beta') is not None
+        index = advertiser_name_resolver.index
+
+        savepoint = db.session.begin_nested()
+        db.session.add(Advertiser(name='Gamma'))
+        savepoint.commit()
+        savepoint = db.session.begin_nested()
+        beta.name = 'Delta'
+        db.session.add(Advertiser(name='Epsilon'))
+        db.session.flush()
+        assert resolve_advertiser('Delta') is not None and resolve_advertiser('Beta') is None
+        savepoint.rollback()
+        assert resolve_advertiser('Beta') is not None and resolve_advertiser('Epsilon') is None
+        db.session.commit()
+
+        db.session.add(Advertiser(name='Zeta'))
+        db.session.flush()
+        db.session.rollback()
+
+        assert advertiser_name_resolver.index is index  # Kept, not rebuilt
+        assert [resolve_elsewhere(app, name) for name in ('Beta', 'Gamma', 'Delta', 'Epsilon', 'Zeta')] == \
+            ['Beta', 'Gamma', None, None, None]
+
+
+def test_bulk_inserts_reach_the_index_on_commit(app):
+    with app.app_context():
+        db.session.add(Advertiser(name='Alpha'))
+        db.session.commit()
+        assert resolve_advertiser('Alpha') is not None
+
+        db.session.execute(insert(Advertiser), [{'name': 'Beta'}])
+        assert resolve_advertiser('Beta').name == 'Beta'
+        assert resolve_elsewhere(app, 'Beta') is None
+
+        db.session.commit()
+        assert resolve_elsewhere(app, 'Beta') == 'Beta'
@@ -0,0 +1,18 @@
+def test_identical_export_of_another_team_lead_is_not_reused(app, make_user, login):
+    make_user('lead1', role='team_lead')
+    make_user('lead2', role='team_lead')
+    params = {'type': 'advertisers', 'format': 'csv'}
+    headers = {'Accept': 'application/json'}
+
+    first = login('lead1').post('/reports/exports', data=params, headers=headers)
+    assert first.status_code == 202
+
+    lead2 = login('lead2')
+    second = lead2.post('/reports/exports', data=params, headers=headers)
+    assert second.status_code == 202
+    assert second.json['id'] != first.json['id']
+    assert lead2.get(second.json['status_url'], headers=headers).status_code == 200
+
+    again = lead2.post('/reports/exports', data=params, headers=headers)
+    assert again.status_code == 200
+    assert again.json['id'] == second.json['id']
@@ -0,0 +1,7 @@
+def test_spending_cube_api_is_for_team_leads(make_user, login):
+    make_user('lead', role='team_lead')
+    make_user('rep')
+
+    for url in ('/reports/api/cube?group_by=year', '/reports/api/cube/dimensions'):
+        assert login('rep').get(url).status_code == 403
+        assert login('lead').get(url).status_code == 200
@@ -0,0 +1,39 @@
+from datetime import datetime
+from app import db
+from app import tv_planner_sync
+from app.models import Activity, Advertiser, SpendingData
+from app.tv_planner_sync import sync_tv_planner
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.data
+
+
+def test_failed_spending_fetch_keeps_the_last_spending(app, make_user, monkeypatch):
+    make_user('system')
+    campaigns = [{'id': 1, 'name': 'Alpha - Spring'}, {'id': 2, 'name': 'Beta - Spring'}]
+    monkeypatch.setattr(tv_planner_sync.http_client, 'get', lambda url, **kwargs: FakeResponse(campaigns))
+    # Campaign 2's spending can't be fetched, even after retries
+    monkeypatch.setattr(tv_planner_sync, 'fetch_with_retry',
+                        lambda url, *args: {'total_spending': 100} if '/campaigns/1/' in url else None)
+
+    with app.app_context():
+        alpha, beta = Advertiser(name='Alpha'), Advertiser(name='Beta')
+        db.session.add_all([alpha, beta])
+        db.session.flush()
+        db.session.add(SpendingData(advertiser_id=beta.id, year=datetime.now().year, tv=500))
+        db.session.commit()
+
+        counts = sync_tv_planner('http://tv-planner.test/api', 'key')['campaigns']
+
+        assert counts == {'fetched': 2, 'synced': 1, 'spending_failures': 1}
+        assert SpendingData.query.filter_by(advertiser_id=alpha.id).one().tv == 100
+        assert SpendingData.query.filter_by(advertiser_id=beta.id).one().tv == 500
+        assert Activity.query.filter_by(advertiser_id=beta.id).count() == 0
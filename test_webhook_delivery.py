@@ -0,0 +1,99 @@
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from app import db
+from app.models import Webhook, WebhookDelivery
+from app.webhook_delivery import retry_dead_deliveries, webhook_dispatcher
+
+
+@pytest.fixture
+def stub_server():
+    """Local webhook receiver answering with the statuses queued in ``server.statuses`` (then 200)."""
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            server.received.append(self.headers.get('X-Webhook-Delivery'))
+            self.send_response(server.statuses.pop(0) if server.statuses else 200)
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.statuses, server.received = [], []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def delivery(app, stub_server):
+    """Id of a pending delivery to the stub server."""
+    with app.app_context():
+        webhook = Webhook(url=f'http://127.0.0.1:{stub_server.server_port}/', events=['contact.updated'], secret='s')
+        db.session.add(webhook)
+        db.session.flush()
+        delivery = WebhookDelivery(webhook_id=webhook.id, event='contact.updated', payload={'id': 1})
+        db.session.add(delivery)
+        db.session.commit()
+        return delivery.id
+
+
+def dispatch(app, delivery_id):
+    """Run the dispatcher once and return the delivery as it left it."""
+    webhook_dispatcher.work(once=True)
+    with app.app_context():
+        return db.session.get(WebhookDelivery, delivery_id)
+
+
+def make_due(app, delivery_id):
+    with app.app_context():
+        db.session.get(WebhookDelivery, delivery_id).next_attempt_at = datetime.utcnow()
+        db.session.commit()
+
+
+def test_failed_deliveries_back_off_then_succeed(app, stub_server, delivery):
+    stub_server.statuses = [500, 503]
+
+    started = datetime.utcnow()
+    first = dispatch(app, delivery)
+    assert (first.status, first.attempts, first.last_status) == ('pending', 1, 500)
+    assert started + timedelta(seconds=24) <= first.next_attempt_at <= datetime.utcnow() + timedelta(seconds=30)
+
+    make_due(app, delivery)
+    started = datetime.utcnow()
+    second = dispatch(app, delivery)
+    assert (second.status, second.attempts, second.last_status) == ('pending', 2, 503)
+    assert started + timedelta(seconds=48) <= second.next_attempt_at <= datetime.utcnow() + timedelta(seconds=60)
+
+    make_due(app, delivery)
+    third = dispatch(app, delivery)
+    assert (third.status, third.attempts, third.last_status) == ('delivered', 3, 200)
+    assert third.delivered_at is not None
+    assert stub_server.received == [str(delivery)] * 3
+
+
+def test_dead_lettered_deliveries_can_be_retried(app, stub_server, delivery):
+    app.config['WEBHOOK_MAX_ATTEMPTS'] = 2
+    stub_server.statuses = [500, 500]
+
+    dispatch(app, delivery)
+    make_due(app, delivery)
+    assert dispatch(app, delivery).status == 'dead'
+
+    with app.app_context():
+        assert retry_dead_deliveries() == 1
+    retried = dispatch(app, delivery)
+    assert (retried.status, retried.attempts) == ('delivered', 1)
+
+
+def test_stale_deliveries_are_requeued(app, stub_server, delivery):
+    with app.app_context():
+        stuck = db.session.get(WebhookDelivery, delivery)
+        stuck.status = 'delivering'
+        stuck.locked_at = datetime.utcnow() - timedelta(minutes=app.config['WEBHOOK_STALE_MINUTES'] + 1)
+        db.session.commit()
+
+    assert dispatch(app, delivery).status == 'delivered'
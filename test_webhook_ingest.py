@@ -0,0 +1,69 @@
+import queue
+from app import db
+from app.integrations import routes
+from app.integrations.batcher import webhook_ingest_batcher
+from app.integrations.routes import apply_webhook_events
+from app.models import Advertiser
+
+
+def test_failing_events_roll_back_alone(app, monkeypatch):
+    calls = []
+
+    def add_advertiser(data):
+        calls.append(data['name'])
+        db.session.add(Advertiser(name=data['name']))
+
+    def fail(data):
+        calls.append('fail')
+        db.session.add(Advertiser(name='Half done'))
+        raise ValueError('bad event')
+
+    monkeypatch.setitem(routes.WEBHOOK_HANDLERS, 'test', {'add': add_advertiser, 'fail': fail})
+    events = [('test', 'add', {'name': 'Alpha'}), ('test', 'fail', {}),
+              ('test', 'add', {'name': 'Alpha'}),  # Duplicate name: fails on flush
+              ('test', 'add', {'name': 'Beta'}), ('test', 'unknown', {})]
+
+    with app.app_context():
+        results = apply_webhook_events(events)
+
+        assert [r['status'] for r in results] == ['applied', 'error', 'error', 'applied', 'ignored']
+        assert calls == ['Alpha', 'fail', 'Alpha', 'Beta']  # Each handler ran once
+        db.session.remove()
+        assert sorted(a.name for a in Advertiser.query) == ['Alpha', 'Beta']
+
+
+def post_company(client, company_id, name):
+    return client.post('/integrations/webhook/agency-crm', json={'id': company_id, 'name': name},
+                       headers={'X-Webhook-Event': 'company.created'})
+
+
+def test_webhook_times_out_when_no_batch_applies_it(app, monkeypatch):
+    app.config['WEBHOOK_INGEST_TIMEOUT'] = 0.1
+    # A queue no flusher reads
+    monkeypatch.setattr(webhook_ingest_batcher, 'queue', queue.Queue())
+    monkeypatch.setattr(webhook_ingest_batcher, 'start', lambda: None)
+
+    response = post_company(app.test_client(), 1, 'Alpha')
+    assert response.status_code == 503
+
+    # The abandoned event is dropped instead of applied by a later flush
+    items = [webhook_ingest_batcher.queue.get_nowait()]
+    webhook_ingest_batcher.flush(items)
+    assert items == []
+
+
+def test_flusher_survives_a_failed_batch(app, monkeypatch):
+    collect = webhook_ingest_batcher.collect
+
+    def collect_then_fail(items):
+        monkeypatch.setattr(webhook_ingest_batcher, 'collect', collect)
+        collect(items)
+        raise RuntimeError('collect failed')
+
+    monkeypatch.setattr(webhook_ingest_batcher, 'collect', collect_then_fail)
+    client = app.test_client()
+
+    response = post_company(client, 1, 'Alpha')
+    assert response.status_code == 500
+    assert response.json['error'] == 'collect failed'
+    assert post_company(client, 2, 'Beta').status_code == 200
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Local stub webhook receiver for testing outgoing webhook delivery.
+
+Prints every request it gets and can be told to be slow or to fail, so
+retries, backoff and dead-lettering can be watched end to end. Point a
+Webhook row's url at http://127.0.0.1:<port>/.
+
+Usage: python webhook_stub_server.py [--port 8099] [--delay 0] [--fail-rate 0] [--status 500]
+"""
+
+import argparse
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def make_handler(delay, fail_rate, fail_status):
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            if delay:
+                time.sleep(delay)
+
+            status = fail_status if random.random() < fail_rate else 200
+            print(f"{'✅' if status == 200 else '❌'} {status} "
+                  f"delivery={self.headers.get('X-Webhook-Delivery')} "
+                  f"event={self.headers.get('X-Webhook-Event')} {body[:200].decode(errors='replace')}")
+
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(b'{"ok": true}' if status == 200 else b'{"ok": false}')
+
+        def log_message(self, format, *args):
+            pass  # Already printed above
+
+    return StubHandler
+
+def main():
+    parser = argparse.ArgumentParser(description='Stub webhook receiver')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--delay', type=float, default=0, help='Seconds to wait before answering')
+    parser.add_argument('--fail-rate', type=float, default=0, help='Fraction of requests to fail (0-1)')
+    parser.add_argument('--status', type=int, default=500, help='Status code for failed requests')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(args.delay, args.fail_rate, args.status))
+    print(f"Stub webhook receiver listening on http://127.0.0.1:{args.port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()